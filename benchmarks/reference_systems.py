@@ -0,0 +1,418 @@
+"""
+Runtime benchmark of reference energy systems of increasing size.
+
+Every configuration of the ladder is built, solved with HiGHS and
+postprocessed with `model.EnergySystem` in a fresh process, so that the peak
+resident set size of each configuration can be measured. The heat load is
+taken from the bundled input database (Flensburg and Sonderburg). If the
+economic time series are not part of the input database, deterministic
+synthetic price and emission series are used instead.
+
+The results are written as JSON. Passing the JSON file of a previous run as
+baseline reports runtime regressions and changed objective values and
+returns a non-zero exit code if there are any.
+
+Usage::
+
+    python benchmarks/reference_systems.py -o benchmark.json
+    python benchmarks/reference_systems.py --cases gb_week mixed_month \\
+        --baseline benchmark.json
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+
+from owp_milp_optimization.database import INPUT_PATH, read_table
+from owp_milp_optimization.model import EnergySystem
+from owp_milp_optimization.profiling import allow_peak_reset
+
+YEAR = 2018
+
+# Phases of the profiler that make up the build, solve and postprocessing
+BUILD_PHASES = [
+    'generate_buses', 'generate_sources', 'generate_sinks',
+    'generate_components', 'build_model'
+    ]
+SOLVE_PHASES = ['solve']
+POSTPROCESSING_PHASES = ['get_results', 'calc_econ_params', 'calc_ecol_params']
+
+LADDER = {
+    'gb_week': {
+        'description': 'Gas boiler, one week',
+        'heat_load': 'Flensburg', 'start': '01-07', 'end': '01-13',
+        'units': {'gb1': {'cap_N': 400}}
+        },
+    'mixed_month': {
+        'description': (
+            'Heat pump, combined cycle plant, gas boiler and storage, '
+            + 'one month'
+            ),
+        'heat_load': 'Flensburg', 'start': '01-01', 'end': '01-31',
+        'units': {
+            'hp1': {'cap_N': 60}, 'ccet1': {'cap_N': 80},
+            'gb1': {'cap_N': 200}, 'tes1': {'Q_N': 1500}
+            }
+        },
+    'numbered_units_month': {
+        'description': 'Several numbered units of each category, one month',
+        'heat_load': 'Sonderburg', 'start': '02-01', 'end': '02-28',
+        'units': {
+            'hp1': {'cap_N': 10}, 'hp2': {'cap_N': 15}, 'ice1': {'cap_N': 8},
+            'ice2': {'cap_N': 8}, 'gb1': {'cap_N': 40}, 'gb2': {'cap_N': 40},
+            'tes1': {'Q_N': 200}, 'tes2': {'Q_N': 300}
+            }
+        },
+    'invest_year_all': {
+        'description': (
+            'Capacity optimization of every unit category, one year'
+            ),
+        'heat_load': 'Flensburg', 'start': '01-01', 'end': '12-31',
+        'units': {
+            unit: {'invest_mode': True}
+            for unit in [
+                'hp1', 'ccet1', 'ice1', 'sol1', 'gb1', 'eb1', 'exhs1', 'tes1'
+                ]
+            }
+        }
+    }
+
+
+def _synthetic_eco_data(index):
+    # Reproducible price, emission and solar series with daily and seasonal
+    # patterns, used if the economic data is not in the input database
+    rng = np.random.default_rng(42)
+    hour = index.hour.to_numpy()
+    day = index.dayofyear.to_numpy()
+    daily = np.sin((hour - 6) / 24 * 2 * np.pi)
+    seasonal = np.cos((day - 172) / 365 * 2 * np.pi)
+
+    return pd.DataFrame({
+        'el_spot_price': (
+            80 + 35 * daily + 15 * rng.standard_normal(len(index))
+            ),
+        'ef_om': 420 - 80 * seasonal + 30 * daily,
+        'gas_price': 45 - 10 * seasonal,
+        'co2_price': np.full(len(index), 80.0),
+        'solar_heat_flow': (
+            np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+            * (0.45 + 0.35 * seasonal) * 1e-3
+            )
+        }, index=index)
+
+
+def load_data(case, year=YEAR):
+    """Input time series of a configuration of the ladder."""
+    start = pd.Timestamp(f'{year}-{case["start"]} 00:00')
+    end = pd.Timestamp(f'{year}-{case["end"]} 23:00')
+
+    heat_load = read_table(
+        'heat_load', columns=[case['heat_load']], years=[year]
+        )
+    data = heat_load.loc[start:end].rename(
+        columns={case['heat_load']: 'heat_demand'}
+        )
+
+    try:
+        eco_data = read_table('eco_data', years=[year]).loc[start:end]
+    except FileNotFoundError:
+        eco_data = _synthetic_eco_data(data.index)
+    else:
+        eco_data = eco_data.rename(
+            columns={'solar_heat_flow_schleswig': 'solar_heat_flow'}
+            )
+    columns = ['el_spot_price', 'ef_om', 'gas_price', 'co2_price']
+    if any(u.rstrip('0123456789') == 'sol' for u in case['units']):
+        columns += ['solar_heat_flow']
+
+    return pd.concat([data, eco_data[columns]], axis=1)
+
+
+def load_parameters(case, time_limit=None, mip_gap=None):
+    """Unit and optimization parameters of a configuration of the ladder."""
+    with open(os.path.join(INPUT_PATH, 'param_units.json'), 'r',
+              encoding='utf-8') as file:
+        default_units = json.load(file)
+    with open(os.path.join(INPUT_PATH, 'param_opt.json'), 'r',
+              encoding='utf-8') as file:
+        param_opt = json.load(file)
+
+    param_units = {}
+    for unit, params in case['units'].items():
+        param_units[unit] = deepcopy(default_units[unit.rstrip('0123456789')])
+        param_units[unit].update(params)
+
+    param_opt.update({
+        'Solver': 'HiGHS', 'TimeLimit': time_limit, 'profile_memory': 'rss'
+        })
+    if mip_gap is not None:
+        param_opt['MIPGap'] = mip_gap
+
+    return param_units, param_opt
+
+
+def _peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(name, time_limit=None, mip_gap=None, year=YEAR):
+    """Build, solve and postprocess a configuration and return measurements."""
+    # Each configuration is run in a process of its own
+    allow_peak_reset()
+    case = LADDER[name]
+    data = load_data(case, year=year)
+    param_units, param_opt = load_parameters(
+        case, time_limit=time_limit, mip_gap=mip_gap
+        )
+
+    start = time.perf_counter()
+    energy_system = EnergySystem(data, param_units, param_opt)
+    solver_status = energy_system.run_model()
+    if solver_status == 'ok':
+        energy_system.run_postprocessing()
+    total_time = time.perf_counter() - start
+    energy_system.remove_workdir()
+
+    # Phases also run in nested solves (e.g. of the LP relaxation) are
+    # summed up over all nesting levels
+    profile = energy_system.profiler.to_frame().groupby(
+        'phase', sort=False
+        ).agg({'wall_time': 'sum', 'peak_memory': 'max'})
+    wall_times = profile['wall_time']
+
+    result = {
+        'name': name,
+        'description': case['description'],
+        'periods': len(data.index),
+        'units': sorted(param_units),
+        'status': solver_status,
+        'build_time': float(wall_times.reindex(BUILD_PHASES).sum()),
+        'solve_time': float(wall_times.reindex(SOLVE_PHASES).sum()),
+        'postprocessing_time': float(
+            wall_times.reindex(POSTPROCESSING_PHASES).sum()
+            ),
+        'total_time': total_time,
+        'peak_rss': _peak_rss(),
+        'objective': None,
+        'LCOH': None,
+        'phases': {
+            phase: {
+                'wall_time': float(row['wall_time']),
+                'peak_memory': (
+                    None if pd.isna(row['peak_memory'])
+                    else float(row['peak_memory'])
+                    )
+                }
+            for phase, row in profile.iterrows()
+            }
+        }
+    if solver_status == 'ok':
+        result['objective'] = float(po.value(energy_system.model.objective))
+        result['LCOH'] = float(energy_system.key_params['LCOH'])
+
+    return result
+
+
+def run_benchmark(names, time_limit=None, mip_gap=None, repeat=1,
+                  year=YEAR):
+    """
+    Run configurations of the ladder, each in a fresh process.
+
+    With several repetitions the fastest run of each configuration is kept.
+    """
+    results = []
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(
+                    max_workers=1, mp_context=get_context('spawn')
+                    ) as executor:
+                runs += [
+                    executor.submit(
+                        run_case, name, time_limit, mip_gap, year
+                        ).result()
+                    ]
+        result = min(runs, key=lambda r: r['total_time'])
+        result['repeat'] = repeat
+        results += [result]
+        print(
+            f'{name:>22}: {result["status"]:>6}, '
+            + f'build {result["build_time"]:7.2f} s, '
+            + f'solve {result["solve_time"]:7.2f} s, '
+            + f'post {result["postprocessing_time"]:7.2f} s, '
+            + f'peak RSS {(result["peak_rss"] or 0) / 1024**2:7.1f} MiB'
+            )
+
+    return results
+
+
+def _version(package):
+    try:
+        from importlib.metadata import version
+        return version(package)
+    except Exception:
+        return None
+
+
+def metadata(time_limit, mip_gap, year):
+    return {
+        'created': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'owp_milp_optimization': _version('owp_milp_optimization'),
+        'oemof.solph': _version('oemof.solph'),
+        'highspy': _version('highspy'),
+        'solver': 'HiGHS',
+        'time_limit': time_limit,
+        'mip_gap': mip_gap,
+        'year': year
+        }
+
+
+def compare(results, baseline, tolerance=0.2, min_difference=0.1,
+            objective_tolerance=None):
+    """
+    Regressions of the results with respect to a baseline.
+
+    Parameters
+    ----------
+
+    results : list(dict)
+        Results as returned by `run_benchmark`.
+
+    baseline : dict
+        Content of the JSON file of a previous run.
+
+    tolerance : float
+        Relative runtime increase reported as regression.
+
+    min_difference : float
+        Runtime increase in seconds below which no regression is reported,
+        so that the noise of very short phases is ignored.
+
+    objective_tolerance : float
+        Relative deviation of the objective value reported as regression.
+        Defaults to the MIP gap of the baseline, as the solver may return
+        any solution within the gap.
+
+    Returns
+    -------
+
+    list(str)
+        Descriptions of the regressions.
+    """
+    if objective_tolerance is None:
+        objective_tolerance = baseline['metadata'].get('mip_gap') or 1e-4
+    baseline = {r['name']: r for r in baseline['cases']}
+    regressions = []
+    for result in results:
+        reference = baseline.get(result['name'])
+        if reference is None:
+            continue
+        name = result['name']
+        if result['status'] != reference['status']:
+            regressions += [
+                f'{name}: status {reference["status"]} -> {result["status"]}'
+                ]
+        for key in ['build_time', 'solve_time', 'postprocessing_time']:
+            increase = result[key] - reference[key]
+            if (increase > reference[key] * tolerance
+                    and increase > min_difference):
+                regressions += [
+                    f'{name}: {key} {reference[key]:.2f} s -> '
+                    + f'{result[key]:.2f} s'
+                    ]
+        if result['objective'] is not None and reference['objective']:
+            deviation = (
+                abs(result['objective'] - reference['objective'])
+                / abs(reference['objective'])
+                )
+            if deviation > objective_tolerance:
+                regressions += [
+                    f'{name}: objective {reference["objective"]:.6g} -> '
+                    + f'{result["objective"]:.6g}'
+                    ]
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        '--cases', nargs='+', choices=list(LADDER), default=list(LADDER),
+        help='Configurations to run (default: all).'
+        )
+    parser.add_argument(
+        '-o', '--output', default='benchmark.json',
+        help='JSON file to write the results to.'
+        )
+    parser.add_argument(
+        '--time-limit', type=float, default=600,
+        help='Time limit of the solver per configuration in seconds.'
+        )
+    parser.add_argument(
+        '--mip-gap', type=float, default=0.02,
+        help='Relative MIP gap of the solver.'
+        )
+    parser.add_argument(
+        '--repeat', type=int, default=1,
+        help='Number of runs per configuration, the fastest is kept.'
+        )
+    parser.add_argument('--year', type=int, default=YEAR)
+    parser.add_argument(
+        '--baseline', help='JSON file of a previous run to compare with.'
+        )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='Relative runtime increase reported as regression.'
+        )
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.cases, time_limit=args.time_limit, mip_gap=args.mip_gap,
+        repeat=args.repeat, year=args.year
+        )
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'metadata': metadata(args.time_limit, args.mip_gap, args.year),
+                'cases': results
+                },
+            file, indent=4
+            )
+    print(f'Results written to {args.output}.')
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            return 1
+        print('No regressions compared to the baseline.')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Memory used per additional dashboard session for the input database.
+
+Compares the former per-session copies (`st.cache_data` returns a copy of
+the cached frames on every call and the derived frames were created per
+session) with references to the process-wide store (`st.cache_resource`).
+
+Usage::
+
+    python benchmarks/session_memory.py --sessions 30
+"""
+
+import argparse
+import pickle
+import tracemalloc
+
+from owp_milp_optimization.database import load_input_database, read_table
+
+
+def load_frames():
+    try:
+        return load_input_database()
+    except FileNotFoundError:
+        # Economic data is not available, benchmark the heat load only
+        return {'all_heat_load': read_table('heat_load')}
+
+
+def session_copy(frames):
+    """Session state contents as with `st.cache_data`."""
+    return pickle.loads(pickle.dumps(frames))
+
+
+def session_reference(frames):
+    """Session state contents as with `st.cache_resource`."""
+    return dict(frames)
+
+
+def measure(create_session, frames, nr_sessions):
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    sessions = [create_session(frames) for _ in range(nr_sessions)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+
+    return (end - start) / nr_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sessions', type=int, default=30)
+    args = parser.parse_args()
+
+    frames = load_frames()
+    database_size = sum(f.memory_usage(deep=True).sum() for f in frames.values())
+    print(f'Input database: {", ".join(frames)}')
+    print(f'Size of the loaded frames: {database_size / 1024**2:.2f} MiB')
+
+    for label, create_session in [
+            ('copy per session', session_copy),
+            ('shared reference', session_reference)
+            ]:
+        per_session = measure(create_session, frames, args.sessions)
+        print(
+            f'{label:>18}: {per_session / 1024**2:8.3f} MiB per session, '
+            + f'{per_session * args.sessions / 1024**2:8.2f} MiB for '
+            + f'{args.sessions} sessions'
+            )
+
+
+if __name__ == '__main__':
+    main()
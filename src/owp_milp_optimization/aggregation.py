@@ -0,0 +1,196 @@
+"""Time series aggregation into representative (typical) periods."""
+
+import numpy as np
+import pandas as pd
+
+
+class TypicalPeriods():
+    """
+    Cluster time series data into representative periods.
+
+    The data is split into periods of `period_length` hours (e.g. 24 for
+    typical days or 168 for typical weeks), which are clustered with k-means
+    on the min-max normalized time series. Each cluster is represented by its
+    medoid, i.e. the real period closest to the cluster center, so that the
+    representative time series keep realistic profiles. The period with the
+    highest heat demand is kept as a cluster of its own, so that the sizing
+    of the units is still driven by the peak load.
+
+    Parameters
+    ----------
+
+    data : pandas.DataFrame
+        Hourly time series data as used by `EnergySystem`.
+
+    nr_periods : int
+        Number of representative periods.
+
+    period_length : int
+        Number of hours per period.
+
+    include_peak : bool
+        Keep the period with the peak heat demand as separate cluster.
+
+    seed : int
+        Seed of the k-means initialization.
+    """
+
+    def __init__(self, data, nr_periods, period_length=24, include_peak=True,
+                 seed=0):
+        self.original = data
+        self.period_length = period_length
+
+        nr_full = len(data.index) // period_length
+        if not 1 <= nr_periods <= nr_full:
+            raise ValueError(
+                f'The number of typical periods has to be between 1 and '
+                + f'{nr_full} for the given data.'
+                )
+
+        # Feature matrix with one row per (possibly incomplete) period
+        values = data.to_numpy(dtype=float)
+        span = values.max(axis=0) - values.min(axis=0)
+        span[span == 0] = 1
+        normed = (values - values.min(axis=0)) / span
+        nr_all = -(-len(data.index) // period_length)
+        padded = np.full((nr_all * period_length, values.shape[1]), np.nan)
+        padded[:len(data.index)] = normed
+        features = padded.reshape(nr_all, -1)
+
+        # Cluster the complete periods only
+        candidates = np.arange(nr_full)
+        medoids = []
+        if include_peak and 'heat_demand' in data.columns and nr_periods > 1:
+            peak = int(np.nanargmax(
+                data['heat_demand'].to_numpy()[:nr_full * period_length]
+                )) // period_length
+            medoids += [peak]
+            candidates = candidates[candidates != peak]
+        medoids += list(candidates[
+            _kmeans_medoids(
+                features[candidates], nr_periods - len(medoids), seed
+                )
+            ])
+        self.medoids = np.array(medoids)
+
+        # Assign every period to its closest representative
+        self.assignment = np.array([
+            np.nanargmin(np.nansum(
+                (features[self.medoids] - features[p])**2, axis=1
+                ))
+            for p in range(nr_all)
+            ])
+        self.assignment[self.medoids] = np.arange(len(self.medoids))
+
+        # Representative time series with continuous hourly time index
+        positions = (
+            self.medoids[:, None] * period_length
+            + np.arange(period_length)[None, :]
+            ).ravel()
+        self.data = pd.DataFrame(
+            values[positions], columns=data.columns,
+            index=pd.date_range(
+                data.index[0], periods=len(positions), freq='h'
+                )
+            )
+
+        # Map every original hour to its representative hour
+        hours = np.arange(len(data.index))
+        self.positions = (
+            self.assignment[hours // period_length] * period_length
+            + hours % period_length
+            )
+
+        self.weights = pd.Series(
+            np.bincount(self.positions, minlength=len(positions)),
+            index=self.data.index, dtype=float
+            )
+
+    def disaggregate(self, df):
+        """Map results of the representative periods back to the data index."""
+        df = df.iloc[:len(self.data.index)]
+        df = df.iloc[self.positions].copy()
+        df.index = self.original.index
+        return df
+
+    def errors(self):
+        """
+        Error of the representative time series compared to the original.
+
+        Returns
+        -------
+
+        pandas.DataFrame
+            Relative error of the total sum, relative error of the heat
+            demand weighted mean and RMSE (normalized with the mean) of the
+            disaggregated profile per time series.
+        """
+        expanded = self.disaggregate(self.data)
+        errors = pd.DataFrame(
+            index=self.original.columns,
+            columns=['sum_rel', 'demand_weighted_mean_rel', 'nrmse']
+            )
+        for col in self.original.columns:
+            original_sum = self.original[col].sum()
+            expanded_sum = expanded[col].sum()
+            errors.loc[col, 'sum_rel'] = _rel_error(expanded_sum, original_sum)
+
+            if 'heat_demand' in self.original.columns:
+                weight = self.original['heat_demand']
+                errors.loc[col, 'demand_weighted_mean_rel'] = _rel_error(
+                    (expanded[col] * expanded['heat_demand']).sum()
+                    / expanded['heat_demand'].sum(),
+                    (self.original[col] * weight).sum() / weight.sum()
+                    )
+
+            mean = self.original[col].abs().mean()
+            rmse = np.sqrt(((expanded[col] - self.original[col])**2).mean())
+            errors.loc[col, 'nrmse'] = rmse / mean if mean else 0.0
+
+        return errors.astype(float)
+
+
+def _rel_error(value, reference):
+    if reference == 0:
+        return 0.0 if value == 0 else np.inf
+    return abs(value - reference) / abs(reference)
+
+
+def _kmeans_medoids(features, nr_clusters, seed, max_iter=100):
+    """Indices of the medoids of a k-means clustering of the features."""
+    features = np.nan_to_num(features)
+    rng = np.random.default_rng(seed)
+
+    # k-means++ initialization
+    centers = [features[rng.integers(len(features))]]
+    for _ in range(1, nr_clusters):
+        dist = np.min(
+            [((features - c)**2).sum(axis=1) for c in centers], axis=0
+            )
+        if dist.sum() == 0:
+            centers += [features[rng.integers(len(features))]]
+        else:
+            centers += [features[rng.choice(len(features), p=dist/dist.sum())]]
+    centers = np.array(centers)
+
+    for _ in range(max_iter):
+        dist = ((features[:, None, :] - centers[None, :, :])**2).sum(axis=2)
+        labels = dist.argmin(axis=1)
+        new_centers = np.array([
+            features[labels == k].mean(axis=0) if (labels == k).any()
+            else centers[k]
+            for k in range(nr_clusters)
+            ])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+
+    dist = ((features[:, None, :] - centers[None, :, :])**2).sum(axis=2)
+    medoids = []
+    for k in range(nr_clusters):
+        members = np.flatnonzero(labels == k)
+        if len(members) == 0:
+            members = np.setdiff1d(np.arange(len(features)), medoids)
+        medoids += [int(members[dist[members, k].argmin()])]
+
+    return np.array(medoids)
@@ -0,0 +1,353 @@
+"""Headless batch runner for saved energy systems."""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import zipfile
+
+import pandas as pd
+
+from owp_milp_optimization.cache import (
+    ResultCache, config_hash, restore_results, structure_hash
+    )
+from owp_milp_optimization.model import EnergySystem
+from owp_milp_optimization.profiling import allow_peak_reset
+from owp_milp_optimization.racing import RACE_MODES, SOLVERS
+
+logger = logging.getLogger(__name__)
+
+
+def load_energy_system(source):
+    """
+    Load a saved energy system as produced by `download_energy_system`.
+
+    Parameters
+    ----------
+
+    source : str or file-like
+        Path to a zip archive or directory containing `data_input.csv`,
+        `param_opt.json` and `param_units.json`. Open binary file objects
+        of a zip archive (e.g. a streamlit upload) are accepted as well.
+
+    Returns
+    -------
+
+    tuple(pandas.DataFrame, dict, dict)
+        Time series data, unit parameters and optimization parameters.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+        with open(os.path.join(source, 'data_input.csv'), 'rb') as file:
+            data = _read_data_input(file)
+        with open(os.path.join(source, 'param_opt.json'), 'rb') as file:
+            param_opt = json.load(file)
+        with open(os.path.join(source, 'param_units.json'), 'rb') as file:
+            param_units = json.load(file)
+        return data, param_units, param_opt
+
+    if not zipfile.is_zipfile(source):
+        raise ValueError(
+            f'"{source}" is neither a directory nor a zip archive.'
+            )
+
+    with zipfile.ZipFile(source, 'r') as z:
+        # Archives may contain the files at top level or in a subdirectory
+        members = {os.path.basename(n): n for n in z.namelist()}
+        missing = [
+            f for f in ['data_input.csv', 'param_opt.json', 'param_units.json']
+            if f not in members
+            ]
+        if missing:
+            raise ValueError(
+                f'Energy system archive is missing {", ".join(missing)}.'
+                )
+        with z.open(members['data_input.csv']) as file:
+            data = _read_data_input(file)
+        with z.open(members['param_opt.json']) as file:
+            param_opt = json.load(file)
+        with z.open(members['param_units.json']) as file:
+            param_units = json.load(file)
+
+    return data, param_units, param_opt
+
+
+def _read_data_input(file):
+    return pd.read_csv(file, sep=';', index_col=0, parse_dates=True)
+
+
+def run_energy_system(data, param_units, param_opt, cache=None,
+                      logpath=None, reuse=None):
+    """
+    Build, solve and postprocess an energy system.
+
+    Parameters
+    ----------
+
+    data, param_units, param_opt :
+        Input data of the energy system as used by `EnergySystem`.
+
+    cache : ResultCache
+        If given, cached results of identical input data are used instead of
+        solving the energy system and new results are added to the cache.
+        The 'previous' warm start uses the latest solution of a similar
+        energy system from the cache.
+
+    logpath : str
+        Solver log file (see `EnergySystem.logpath`). Without a log file, the
+        solve gets its own work directory, which is removed once the energy
+        system is solved and only its log is kept (see
+        `EnergySystem.remove_workdir`).
+
+    reuse : EnergySystem
+        Previously solved energy system. If only cost parameters changed,
+        its built model is updated and solved again instead of building a
+        new one (see `EnergySystem.update_parameters`).
+
+    Returns
+    -------
+
+    tuple(EnergySystem, str)
+        The energy system and the solver status as returned by
+        `EnergySystem.solve_model`. Results are only available if the status
+        is 'ok'. Infeasible energy systems are diagnosed unless the
+        'diagnose_infeasibility' option is disabled (see
+        `EnergySystem.diagnose_infeasibility`).
+    """
+    if cache is not None:
+        key = config_hash(data, param_units, param_opt)
+        entry = cache.get(key)
+        if entry is not None:
+            logger.info('Using cached results.')
+            energy_system = EnergySystem(
+                data, param_units, param_opt, prepare=False
+                )
+            restore_results(energy_system, entry)
+            return energy_system, 'ok'
+
+    if (reuse is not None
+            and reuse.update_parameters(data, param_units, param_opt)):
+        logger.info('Solving the updated model again.')
+        energy_system = reuse
+        energy_system.logpath = logpath
+        energy_system.infeasibility = None
+        solver_status = energy_system.solve_model()
+    else:
+        energy_system = EnergySystem(data, param_units, param_opt)
+        energy_system.logpath = logpath
+        if cache is not None and param_opt.get('warm_start') == 'previous':
+            energy_system.start_values = cache.get_solution(
+                structure_hash(data, param_units, param_opt)
+                )
+        solver_status = energy_system.run_model()
+    if solver_status == 'ok':
+        energy_system.run_postprocessing()
+        if cache is not None:
+            cache.put(key, energy_system)
+    elif (solver_status == 'infeasable'
+            and param_opt.get('diagnose_infeasibility', True)):
+        energy_system.diagnose_infeasibility()
+    energy_system.remove_workdir()
+
+    return energy_system, solver_status
+
+
+def save_results(energy_system, outpath):
+    """Write the results of a solved energy system into a directory."""
+    os.makedirs(outpath, exist_ok=True)
+
+    energy_system.data_all.to_csv(
+        os.path.join(outpath, 'data_all.csv'), sep=';'
+        )
+    energy_system.data_caps.to_csv(
+        os.path.join(outpath, 'data_caps.csv'), sep=';', index=False
+        )
+    energy_system.cost_df.to_csv(
+        os.path.join(outpath, 'cost_df.csv'), sep=';'
+        )
+    with open(
+            os.path.join(outpath, 'key_params.json'), 'w', encoding='utf-8'
+            ) as file:
+        json.dump(
+            energy_system.key_params, file, indent=4, sort_keys=True,
+            default=float
+            )
+    energy_system.profiler.to_frame().to_csv(
+        os.path.join(outpath, 'profile.csv'), sep=';', index=False
+        )
+
+
+def save_infeasibility(energy_system, outpath):
+    """Write the hours with slacks of an infeasible energy system."""
+    os.makedirs(outpath, exist_ok=True)
+
+    report = energy_system.infeasibility
+    report[(report > 0).any(axis=1)].to_csv(
+        os.path.join(outpath, 'infeasibility.csv'), sep=';'
+        )
+
+
+def run_batch(sources, outpath, param_opt_overrides=None, cache=None):
+    """
+    Solve a number of saved energy systems one after another.
+
+    Parameters
+    ----------
+
+    sources : list(str)
+        Paths of saved energy systems (zip archives or directories).
+
+    outpath : str
+        Directory in which a result subdirectory per energy system and a
+        `summary.csv` are written.
+
+    param_opt_overrides : dict
+        Optimization parameters (e.g. 'Solver', 'MIPGap') that replace the
+        saved ones in every energy system.
+
+    cache : ResultCache
+        Result cache used for all energy systems (see `run_energy_system`).
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Summary with the solver status and key parameters of every run.
+        For infeasible energy systems, it contains the unmet heat and its
+        peak of the diagnosis instead.
+    """
+    summary = []
+    for source in sources:
+        name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+        row = {'name': name, 'source': source}
+        try:
+            data, param_units, param_opt = load_energy_system(source)
+            if param_opt_overrides:
+                param_opt.update(param_opt_overrides)
+
+            logger.info(f'Solving energy system "{name}".')
+            energy_system, solver_status = run_energy_system(
+                data, param_units, param_opt, cache=cache
+                )
+            row['status'] = solver_status
+            if solver_status == 'ok':
+                save_results(energy_system, os.path.join(outpath, name))
+                row.update(energy_system.key_params)
+            elif energy_system.infeasibility is not None:
+                save_infeasibility(
+                    energy_system, os.path.join(outpath, name)
+                    )
+                row['unmet_heat'] = (
+                    energy_system.infeasibility['unmet_heat'].sum()
+                    )
+                row['unmet_heat_peak'] = (
+                    energy_system.infeasibility['unmet_heat'].max()
+                    )
+        except Exception:
+            logger.exception(f'Energy system "{name}" failed.')
+            row['status'] = 'error'
+
+        logger.info(f'Energy system "{name}" finished: {row["status"]}.')
+        summary += [row]
+
+    summary = pd.DataFrame(summary)
+    os.makedirs(outpath, exist_ok=True)
+    summary.to_csv(os.path.join(outpath, 'summary.csv'), sep=';', index=False)
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=(
+            'Solve saved energy systems without starting the dashboard.'
+            )
+        )
+    parser.add_argument(
+        'sources', nargs='+',
+        help='Saved energy systems (zip archives or directories).'
+        )
+    parser.add_argument(
+        '-o', '--output', default='results',
+        help='Output directory for the results (default: "results").'
+        )
+    parser.add_argument(
+        '--solver', choices=SOLVERS + RACE_MODES,
+        help='Override the solver of the saved energy systems.'
+        )
+    parser.add_argument(
+        '--mip-gap', type=float,
+        help='Override the relative MIP gap (e.g. 0.02 for 2 %%).'
+        )
+    parser.add_argument(
+        '--time-limit', type=float,
+        help='Override the solver time limit in seconds.'
+        )
+    parser.add_argument(
+        '--threads', type=int,
+        help='Override the number of solver threads.'
+        )
+    parser.add_argument(
+        '--memory-limit', type=float,
+        help='Override the solver memory limit in GB.'
+        )
+    parser.add_argument(
+        '--solve-slots', type=int,
+        help=(
+            'Maximum number of simultaneous solves on this host, shared with '
+            + 'all other runs.'
+            )
+        )
+    parser.add_argument(
+        '--stall-improvement', type=float,
+        help=(
+            'Stop a solve with its incumbent once the MIP gap improves by '
+            + 'less than this many percentage points per minute.'
+            )
+        )
+    parser.add_argument(
+        '--stall-window', type=float,
+        help='Minutes over which the gap improvement is measured.'
+        )
+    parser.add_argument(
+        '--cache-dir',
+        help='Directory of the result cache (default: user cache directory).'
+        )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='Solve all energy systems without using the result cache.'
+        )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s'
+        )
+    # The energy systems are solved one after another in this process
+    allow_peak_reset()
+
+    overrides = {}
+    if args.solver is not None:
+        overrides['Solver'] = args.solver
+    if args.mip_gap is not None:
+        overrides['MIPGap'] = args.mip_gap
+    if args.time_limit is not None:
+        overrides['TimeLimit'] = args.time_limit
+    if args.threads is not None:
+        overrides['Threads'] = args.threads
+    if args.memory_limit is not None:
+        overrides['MemoryLimit'] = args.memory_limit
+    if args.solve_slots is not None:
+        overrides['SolveSlots'] = args.solve_slots
+    if args.stall_improvement is not None:
+        overrides['stall_improvement'] = args.stall_improvement
+    if args.stall_window is not None:
+        overrides['stall_window'] = args.stall_window
+
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    summary = run_batch(args.sources, args.output, overrides, cache=cache)
+
+    return 0 if (summary['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
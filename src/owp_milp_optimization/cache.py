@@ -0,0 +1,230 @@
+"""Content-addressed cache for the results of solved energy systems."""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+from owp_milp_optimization.warmstart import results_start
+from owp_milp_optimization.workdir import user_cache_dir
+
+# Increase to invalidate existing entries when the model or results change
+CACHE_VERSION = 5
+
+# Optimization parameters that do not change the results of a solve
+IGNORED_PARAM_OPT = [
+    'TimeLimit', 'Threads', 'MemoryLimit', 'SolveSlots', 'profile_memory',
+    'warm_start', 'tighten_bounds', 'identical_units', 'stall_improvement',
+    'stall_window', 'diagnose_infeasibility', 'check_feasibility'
+    ]
+
+RESULT_ATTRIBUTES = [
+    'data_all', 'data_caps', 'cost_df', 'key_params', 'progress', 'profiler',
+    'tightened_bounds'
+    ]
+
+
+def config_hash(data, param_units, param_opt):
+    """
+    Stable hash of the input data of an energy system.
+
+    Parameters
+    ----------
+
+    data, param_units, param_opt :
+        Input data of the energy system as used by `EnergySystem`. The
+        optimization parameters in `IGNORED_PARAM_OPT` are not considered.
+
+    Returns
+    -------
+
+    str
+        Hexadecimal SHA-256 digest.
+    """
+    param_opt = {
+        k: v for k, v in param_opt.items() if k not in IGNORED_PARAM_OPT
+        }
+
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_VERSION).encode())
+    digest.update(json.dumps(list(map(str, data.columns))).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy())
+    digest.update(
+        json.dumps(param_units, sort_keys=True, default=str).encode()
+        )
+    digest.update(json.dumps(param_opt, sort_keys=True, default=str).encode())
+
+    return digest.hexdigest()
+
+
+def structure_hash(data, param_units, param_opt):
+    """
+    Hash of the units and time steps of an energy system.
+
+    Energy systems with the same structure hash only differ in costs, time
+    series values or unit sizes, so that the solution of one is a suitable
+    start for the other (see `ResultCache.get_solution`).
+    """
+    digest = hashlib.sha256()
+    digest.update(str(CACHE_VERSION).encode())
+    digest.update(pd.util.hash_pandas_object(data.index).to_numpy())
+    digest.update(json.dumps(sorted(param_units)).encode())
+    digest.update(json.dumps([
+        param_opt.get('typical_periods'), param_opt.get('period_length')
+        ]).encode())
+
+    return digest.hexdigest()
+
+
+class ResultCache():
+    """
+    Size-bounded result cache on the local disk.
+
+    Each entry is a pickle file named after the hash of the input data.
+    Additionally, the latest solution of every structure hash is kept as
+    start for similar energy systems. The modification time of an entry is
+    updated on every hit, so that the least recently used entries are
+    removed first once the total size exceeds `max_size`.
+
+    Parameters
+    ----------
+
+    path : str
+        Cache directory. Defaults to `resultcache` in the cache directory of
+        the user (see `workdir.user_cache_dir`). Entries are unpickled, so
+        the directory must not be writable by other users.
+
+    max_size : int
+        Maximum total size of all entries in bytes.
+    """
+
+    def __init__(self, path=None, max_size=500*1024**2):
+        if path is None:
+            path = user_cache_dir('resultcache')
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, f'{key}.pkl')
+
+    def get(self, key):
+        """Return the cached results of `key` or None if there are none."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as file:
+                entry = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+
+        return entry
+
+    def put(self, key, energy_system):
+        """Store the results of a solved and postprocessed energy system."""
+        self._write(key, result_entry(energy_system))
+
+        results = getattr(energy_system, 'results', None)
+        if results is not None:
+            self._write(
+                self._solution_key(structure_hash(
+                    energy_system.data, energy_system.param_units,
+                    energy_system.param_opt
+                    )),
+                results_start(results)
+                )
+
+        self.evict()
+
+    def get_solution(self, key):
+        """
+        Return the latest solution of the structure hash `key` or None.
+
+        The solution is given as start values as returned by
+        `warmstart.results_start`.
+        """
+        return self.get(self._solution_key(key))
+
+    def _solution_key(self, key):
+        return f'solution_{key}'
+
+    def _write(self, key, obj):
+        os.makedirs(self.path, exist_ok=True)
+        # Write atomically, as several processes may share the cache
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._entry_path(key))
+
+    def evict(self):
+        """Remove the least recently used entries exceeding `max_size`."""
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.pkl'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            entries += [(stat.st_mtime, stat.st_size, name)]
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        """Remove all entries."""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.path, name))
+
+
+def result_entry(energy_system):
+    """Results and solver log of a solved and postprocessed energy system."""
+    entry = {
+        attr: getattr(energy_system, attr) for attr in RESULT_ATTRIBUTES
+        }
+    logpath = getattr(energy_system, 'logpath', None)
+    if logpath is not None and os.path.exists(logpath):
+        with open(logpath, 'r', encoding='utf-8') as file:
+            entry['solver_log'] = file.read()
+    elif getattr(energy_system, 'solver_log', None) is not None:
+        entry['solver_log'] = energy_system.solver_log
+
+    return entry
+
+
+def restore_results(energy_system, entry, cached=True):
+    """
+    Set stored results as results of an (unsolved) energy system.
+
+    Parameters
+    ----------
+
+    energy_system : EnergySystem
+        Energy system with the same input data as the stored results.
+
+    entry : dict
+        Results as returned by `result_entry` or `ResultCache.get`.
+
+    cached : bool
+        Whether the results were taken from the result cache.
+    """
+    for attr in RESULT_ATTRIBUTES:
+        setattr(energy_system, attr, entry[attr])
+    energy_system.solver_log = entry.get('solver_log')
+    energy_system.cached = cached
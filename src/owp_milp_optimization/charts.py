@@ -381,3 +381,78 @@ def create_tes_content_chart(
         ),
         x=alt.X('Date', title='Datum')
     ).properties(width=600)
+
+
+PHASE_LABELS = {
+    'check_feasibility': 'Zulässigkeitsprüfung',
+    'generate_buses': 'Busse erzeugen',
+    'generate_sources': 'Quellen erzeugen',
+    'generate_sinks': 'Senken erzeugen',
+    'generate_components': 'Anlagen erzeugen',
+    'size_units_relaxed': 'Anlagenauslegung (LP)',
+    'solve_relaxation': 'LP-Relaxierung',
+    'diagnose_infeasibility': 'Analyse der Unzulässigkeit',
+    'solve_rolling_horizon': 'Rollierende Optimierung',
+    'update_parameters': 'Modell aktualisieren',
+    'solve_model': 'Optimierung',
+    'build_model': 'Modellaufbau',
+    'solve': 'Solver',
+    'get_results': 'Ergebnisse auslesen',
+    'processing_results': 'Ergebnisverarbeitung (oemof)',
+    'calc_econ_params': 'Ökonomische Kennzahlen',
+    'calc_ecol_params': 'Ökologische Kennzahlen'
+}
+
+
+def create_profile_overview(profiler) -> pd.DataFrame:
+    """
+    Create table of the wall time and peak memory of the run phases.
+
+    Parameters
+    ----------
+    profiler : PhaseProfiler
+        Profiler of the energy system
+
+    Returns
+    -------
+    pd.DataFrame
+        Phases indented by their nesting level with their number of calls,
+        wall time, share of the total wall time and peak memory
+    """
+    profile = profiler.to_frame()
+    total_time = profile.loc[profile['level'] == 0, 'wall_time'].sum()
+
+    return pd.DataFrame({
+        'Phase': [
+            ' ' * level + PHASE_LABELS.get(phase, phase)
+            for phase, level in zip(profile['phase'], profile['level'])
+            ],
+        'Aufrufe': profile['calls'],
+        'Laufzeit in s': profile['wall_time'],
+        'Anteil in %': profile['wall_time'] / total_time * 100,
+        'Spitzenspeicher in MB': profile['peak_memory'] / 1024**2
+    })
+
+
+def create_profile_chart(profiler) -> alt.Chart:
+    """
+    Create bar chart of the wall time of the top level run phases.
+
+    Parameters
+    ----------
+    profiler : PhaseProfiler
+        Profiler of the energy system
+
+    Returns
+    -------
+    alt.Chart
+        Altair bar chart
+    """
+    profile = profiler.to_frame()
+    profile = profile.loc[profile['level'] == 0].copy()
+    profile['phase'] = profile['phase'].map(lambda p: PHASE_LABELS.get(p, p))
+
+    return alt.Chart(profile).mark_bar(color='#00395B').encode(
+        y=alt.Y('phase', title=None, sort=None),
+        x=alt.X('wall_time', title='Laufzeit in s')
+    ).properties(width=800)
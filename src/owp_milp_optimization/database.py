@@ -0,0 +1,184 @@
+"""Bundled input database (heat load and economic time series)."""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+INPUT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'input'))
+
+TABLES = ['heat_load', 'eco_data']
+
+# Name of the time index column inside the parquet files
+INDEX_NAME = 'Date'
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def read_table(name, columns=None, years=None, inputpath=INPUT_PATH):
+    """
+    Read a table of the input database.
+
+    The columnar parquet file is used if available, so that only the
+    requested columns and the row groups of the requested years are read
+    from disk. Otherwise the semicolon separated csv file is parsed.
+
+    Parameters
+    ----------
+
+    name : str
+        Name of the table (e.g. 'heat_load' or 'eco_data').
+
+    columns : list(str)
+        Columns to read. Defaults to all columns.
+
+    years : list(int)
+        Years to read. Defaults to all years.
+
+    inputpath : str
+        Directory of the input database.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Table with hourly time index.
+    """
+    parquetpath = os.path.join(inputpath, f'{name}.parquet')
+    if os.path.exists(parquetpath) and _has_pyarrow():
+        filters = None
+        if years is not None:
+            filters = [
+                [
+                    (INDEX_NAME, '>=', pd.Timestamp(year=year, month=1, day=1)),
+                    (INDEX_NAME, '<', pd.Timestamp(year=year+1, month=1, day=1))
+                    ]
+                for year in years
+                ]
+        table = pd.read_parquet(parquetpath, columns=columns, filters=filters)
+        # Unnamed time index as in the csv files
+        table.index.name = None
+        return table
+
+    table = pd.read_csv(
+        os.path.join(inputpath, f'{name}.csv'),
+        sep=';', index_col=0, parse_dates=True
+        )
+    if columns is not None:
+        table = table[columns]
+    if years is not None:
+        table = table.loc[table.index.year.isin(years)]
+
+    return table
+
+
+def load_input_database(inputpath=INPUT_PATH):
+    """
+    Load the complete input database used by the dashboard.
+
+    Besides the tables themselves, the frames of the single economic time
+    series are derived once, so that they can be shared instead of being
+    derived per user session. The frames must not be modified in place.
+
+    Returns
+    -------
+
+    dict(str, pandas.DataFrame)
+        Frames by their session state names ('all_heat_load', 'eco_data',
+        'all_el_prices', 'all_el_emissions', 'all_gas_prices',
+        'all_co2_prices' and 'all_solar_heat_flow').
+    """
+    eco_data = read_table('eco_data', inputpath=inputpath)
+
+    return {
+        'all_heat_load': read_table('heat_load', inputpath=inputpath),
+        'eco_data': eco_data,
+        'all_el_prices': eco_data['el_spot_price'].to_frame(),
+        'all_el_emissions': eco_data['ef_om'].to_frame(),
+        'all_gas_prices': eco_data['gas_price'].to_frame(),
+        'all_co2_prices': eco_data['co2_price'].to_frame(),
+        'all_solar_heat_flow': eco_data[[
+            'solar_heat_flow_schleswig',
+            'solar_heat_flow_chemnitz',
+            'solar_heat_flow_stuttgart'
+            ]]
+        }
+
+
+def table_columns(name, inputpath=INPUT_PATH):
+    """Column names of a table without reading its data."""
+    parquetpath = os.path.join(inputpath, f'{name}.parquet')
+    if os.path.exists(parquetpath) and _has_pyarrow():
+        import pyarrow.parquet as pq
+        return [
+            col for col in pq.read_schema(parquetpath).names
+            if col != INDEX_NAME
+            ]
+
+    return list(pd.read_csv(
+        os.path.join(inputpath, f'{name}.csv'), sep=';', index_col=0, nrows=0
+        ).columns)
+
+
+def write_parquet(name, inputpath=INPUT_PATH):
+    """Convert the csv file of a table into a parquet file."""
+    table = pd.read_csv(
+        os.path.join(inputpath, f'{name}.csv'),
+        sep=';', index_col=0, parse_dates=True
+        )
+    table.index.name = INDEX_NAME
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # One row group per calendar year, so that reading a single year only
+    # touches its own row group
+    schema = pa.Schema.from_pandas(table)
+    with pq.ParquetWriter(
+            os.path.join(inputpath, f'{name}.parquet'), schema,
+            compression='zstd'
+            ) as writer:
+        for _, year_table in table.groupby(table.index.year):
+            writer.write_table(
+                pa.Table.from_pandas(year_table, schema=schema),
+                row_group_size=len(year_table)
+                )
+
+
+def export_csv(name, path, inputpath=INPUT_PATH):
+    """Export a table of the input database as semicolon separated csv."""
+    read_table(name, inputpath=inputpath).to_csv(path, sep=';')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert the csv files of the input database to parquet.'
+        )
+    parser.add_argument(
+        'tables', nargs='*', default=TABLES,
+        help=f'Tables to convert (default: {", ".join(TABLES)}).'
+        )
+    parser.add_argument(
+        '--inputpath', default=INPUT_PATH,
+        help='Directory of the input database.'
+        )
+    args = parser.parse_args(argv)
+
+    for name in args.tables:
+        if not os.path.exists(os.path.join(args.inputpath, f'{name}.csv')):
+            print(f'Skipping "{name}", as there is no csv file.')
+            continue
+        write_parquet(name, inputpath=args.inputpath)
+        print(f'Converted "{name}".')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Diagnosis of infeasible energy systems with an elastic model."""
+
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+
+# Penalty of the slacks in €/MWh, far above all cost coefficients of the model
+SLACK_PENALTY = 1e6
+
+# Storage slacks are penalized higher, so that missing heat is reported as
+# unmet heat and storage slacks only remain for inconsistent storages
+STORAGE_SLACK_PENALTY = 10 * SLACK_PENALTY
+
+# Slacks below this value in MWh are regarded as numerical noise
+SLACK_TOLERANCE = 1e-4
+
+
+def add_elastic_slacks(model, heat_bus, storages):
+    """
+    Relax the heat and storage balances of a built model.
+
+    Every balance of the heat network and every storage balance gets a
+    positive and a negative slack variable, which are penalized with
+    `SLACK_PENALTY` or `STORAGE_SLACK_PENALTY` in the objective. The elastic
+    model is feasible whenever only these balances can not be met, and its
+    slacks show in which hours and by how much. The peak of the unmet heat is
+    penalized as well, so that it is the heat capacity missing to meet the
+    demand.
+
+    Parameters
+    ----------
+
+    model : oemof.solph.Model
+        Built model of the energy system.
+
+    heat_bus : oemof.solph.Bus
+        Heat network supplying the heat demand.
+
+    storages : dict
+        oemof storage components by their unit name.
+
+    Returns
+    -------
+
+    dict
+        Slack variables by the column of the report (see `slack_report`).
+        'unmet_heat' is heat missing in the heat network, 'excess_heat' heat
+        that can not be used and 'storage_<unit>' the deviation from the
+        balance of a storage.
+    """
+    slacks = {}
+    slack_positive, slack_negative = _add_slacks(
+        model, 'heat', model.BusBlock.balance, [heat_bus]
+        )
+    slacks['unmet_heat'] = [slack_positive]
+    slacks['excess_heat'] = [slack_negative]
+
+    model.elastic_unmet_peak = po.Var(within=po.NonNegativeReals)
+    model.elastic_unmet_peak_bound = po.Constraint(
+        slack_positive.index_set(),
+        rule=lambda m, *i: slack_positive[i] <= m.elastic_unmet_peak
+        )
+
+    for block_name in ['GenericStorageBlock', 'GenericInvestmentStorageBlock']:
+        block = model.component(block_name)
+        if block is None or block.component('balance') is None:
+            continue
+        for unit, storage in storages.items():
+            variables = _add_slacks(model, unit, block.balance, [storage])
+            if len(variables[0]):
+                slacks[f'storage_{unit}'] = list(variables)
+
+    penalty = SLACK_PENALTY * model.elastic_unmet_peak
+    for column, variables in slacks.items():
+        weight = (
+            STORAGE_SLACK_PENALTY if column.startswith('storage_')
+            else SLACK_PENALTY
+            )
+        penalty += weight * sum(
+            var_data for var in variables for var_data in var.values()
+            )
+    model.objective.set_value(model.objective.expr + penalty)
+
+    return slacks
+
+
+def _add_slacks(model, name, constraint, nodes):
+    index = [i for i in constraint if i[0] in nodes]
+    slack_positive = po.Var(index, within=po.NonNegativeReals)
+    slack_negative = po.Var(index, within=po.NonNegativeReals)
+    model.add_component(f'elastic_{name}_positive', slack_positive)
+    model.add_component(f'elastic_{name}_negative', slack_negative)
+    for i in index:
+        con = constraint[i]
+        con.set_value((
+            con.lower, con.body + slack_positive[i] - slack_negative[i],
+            con.upper
+            ))
+
+    return slack_positive, slack_negative
+
+
+def slack_report(slacks, index):
+    """
+    Time series of the slacks of a solved elastic model.
+
+    Parameters
+    ----------
+
+    slacks : dict
+        Slack variables as returned by `add_elastic_slacks`.
+
+    index : pandas.DatetimeIndex
+        Time steps of the model.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Slacks in MWh with one column per entry of `slacks`. Values below
+        `SLACK_TOLERANCE` are set to zero.
+    """
+    report = pd.DataFrame(index=index)
+    for column, variables in slacks.items():
+        values = np.zeros(len(index))
+        for var in variables:
+            for i, var_data in var.items():
+                # The time step is the last element of all indices
+                values[i[-1]] += var_data.value or 0
+        report[column] = np.where(values > SLACK_TOLERANCE, values, 0.0)
+
+    return report
+
+
+def summarize(report):
+    """
+    Hours, total and peak of every slack of a report.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Number of affected hours, sum in MWh and maximum in MW per column of
+        `report` with nonzero slacks.
+    """
+    summary = pd.DataFrame({
+        'hours': (report > 0).sum(),
+        'total': report.sum(),
+        'peak': report.max()
+        })
+
+    return summary[summary['hours'] > 0]
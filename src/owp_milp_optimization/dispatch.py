@@ -0,0 +1,445 @@
+"""Merit-order heat dispatch of an energy system without solving a model."""
+
+import numpy as np
+import pandas as pd
+
+# Units dispatched by their marginal heat cost
+DISPATCHABLE = ['ccet', 'ice', 'hp', 'gb', 'eb', 'exhs']
+
+# Time steps of the moving average marginal cost that decides whether
+# storages are charged or discharged
+STORAGE_WINDOW = 24
+
+
+def marginal_heat_cost(energy_system):
+    """
+    Marginal cost of one MWh of heat of all dispatchable units.
+
+    The costs are derived from the same cost terms as the variable costs of
+    the model (`generate_sources` and `generate_components`). Electricity of
+    combined heat and power units is credited with the spot market price and
+    the avoided grid charges.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Marginal heat cost in €/MWh of every time step (rows) and
+        dispatchable unit (columns).
+    """
+    data = energy_system.model_data
+    param_opt = energy_system.param_opt
+    gas_cost = (
+        data['gas_price'] + data['co2_price'] * param_opt['ef_gas']
+        ).to_numpy()
+    el_cost = (
+        param_opt['elec_consumer_charges_grid']
+        - param_opt['elec_consumer_charges_self']
+        + data['el_spot_price']
+        ).to_numpy()
+
+    costs = {}
+    for unit, unit_params in energy_system.param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        if unit_cat not in DISPATCHABLE or _is_must_run(unit, unit_params):
+            continue
+        op_cost_var = (
+            unit_params['op_cost_var'] * (1 - unit_params['op_cost_bonus_rel'])
+            )
+        if unit_cat in ['ccet', 'ice']:
+            el_ratio = unit_params['eta_el'] / unit_params['eta_th']
+            costs[unit] = (
+                gas_cost / unit_params['eta_th']
+                + el_ratio * (
+                    op_cost_var - data['el_spot_price'].to_numpy()
+                    - param_opt['vNNE']
+                    )
+                )
+        elif unit_cat == 'gb':
+            costs[unit] = (
+                gas_cost / unit_params['eta'] + op_cost_var
+                + param_opt['energy_tax']
+                )
+        elif unit_cat in ['hp', 'eb']:
+            eff = unit_params['cop' if unit_cat == 'hp' else 'eta']
+            costs[unit] = (
+                el_cost / eff + op_cost_var
+                + param_opt['elec_consumer_charges_self']
+                )
+        else:
+            costs[unit] = np.full(len(data.index), op_cost_var)
+
+    return pd.DataFrame(costs, index=data.index)
+
+
+def heat_capacities(energy_system, nominal=False):
+    """
+    Heat output capacities used by the merit-order dispatch.
+
+    Parameters
+    ----------
+
+    nominal : bool
+        Use the nominal capacities of all units. Otherwise, units in invest
+        mode are available up to their maximum capacity, except for the
+        must-run units, which are assumed at their minimum size.
+
+    Returns
+    -------
+
+    pandas.Series
+        Capacity in MW (area in m² for solar thermal units) of every heat
+        producing unit.
+    """
+    capacities = {}
+    for unit, unit_params in energy_system.param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        if unit_cat == 'sol':
+            capacities[unit] = (
+                unit_params['A_min']
+                if unit_params['invest_mode'] and not nominal
+                else unit_params['A_N']
+                )
+        elif unit_cat in DISPATCHABLE:
+            if not unit_params['invest_mode'] or nominal:
+                capacities[unit] = unit_params['cap_N']
+            elif _is_must_run(unit, unit_params):
+                capacities[unit] = unit_params['cap_min']
+            else:
+                capacities[unit] = unit_params['cap_max']
+
+    return pd.Series(capacities, dtype=float)
+
+
+def merit_order_dispatch(energy_system, nominal=False, storages=False):
+    """
+    Hourly heat output of all units by ascending marginal heat cost.
+
+    Must-run units produce their fixed profile first. The residual heat
+    demand is then covered by the dispatchable units in the order of their
+    marginal heat cost in every time step. Units that would run below their
+    minimum load are switched off and the residual demand passes on to the
+    next unit.
+
+    Parameters
+    ----------
+
+    nominal : bool
+        Dispatch the nominal capacities (see `heat_capacities`).
+
+    storages : bool
+        Dispatch the thermal energy storages with their nominal capacity
+        (see `storage_dispatch`). Otherwise, storages are not used.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Heat output in MW of every time step (rows) and heat producing unit
+        (columns). Storages are given by their discharge (positive) or charge
+        (negative) and their content at the start of every time step in the
+        columns 'storage_content_<unit>'. Demand that can not be covered is
+        returned in the column 'unmet'.
+    """
+    data = energy_system.model_data
+    capacities = heat_capacities(energy_system, nominal=nominal)
+    dispatch = pd.DataFrame(index=data.index)
+
+    residual = data['heat_demand'].to_numpy(dtype=float).copy()
+    for unit, unit_params in energy_system.param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        if unit_cat == 'sol':
+            dispatch[unit] = (
+                capacities[unit] * unit_params['eta_col']
+                * data['solar_heat_flow'].to_numpy()
+                )
+        elif unit_cat == 'exhs' and _is_must_run(unit, unit_params):
+            dispatch[unit] = capacities[unit]
+        else:
+            continue
+        residual -= dispatch[unit].to_numpy()
+
+    costs = marginal_heat_cost(energy_system)
+    heat, marginal_cost = _dispatch_by_cost(
+        energy_system, costs, capacities, np.clip(residual, 0, None)
+        )
+
+    if storages:
+        # Spare capacity of the units up to the marginal heat cost
+        max_load = _max_load(energy_system, costs.columns, capacities)
+        min_residual = min(
+            _min_load(energy_system, costs.columns, capacities), default=0
+            )
+        spare = (
+            (max_load - heat)
+            * (costs.to_numpy() <= marginal_cost[:, None])
+            ).sum(axis=1)
+        for unit, unit_params in energy_system.param_units.items():
+            if unit.rstrip('0123456789') != 'tes':
+                continue
+            flow, content = storage_dispatch(
+                unit_params, residual, marginal_cost, spare,
+                min_residual=min_residual
+                )
+            dispatch[unit] = flow
+            dispatch[f'storage_content_{unit}'] = content
+            residual -= flow
+            spare = np.clip(spare + np.clip(flow, None, 0), 0, None)
+        heat, _ = _dispatch_by_cost(
+            energy_system, costs, capacities, np.clip(residual, 0, None)
+            )
+
+    for i, unit in enumerate(costs.columns):
+        dispatch[unit] = heat[:, i]
+    dispatch['unmet'] = np.clip(residual - heat.sum(axis=1), 0, None)
+
+    return dispatch
+
+
+def storage_dispatch(unit_params, residual, marginal_cost, spare,
+                     min_residual=0):
+    """
+    Charge and discharge of a storage following the marginal heat cost.
+
+    The storage is charged with surplus heat of the must-run units and with
+    spare capacity in time steps with a marginal heat cost below its moving
+    average over `STORAGE_WINDOW` time steps. It is discharged in time steps
+    above the average, leaving either no demand or at least `min_residual`
+    to the other units.
+
+    Parameters
+    ----------
+
+    unit_params : dict
+        Parameters of the storage. Its nominal capacity `Q_N` is used.
+
+    residual : numpy.ndarray
+        Heat demand not covered by the must-run units (negative for surplus
+        heat).
+
+    marginal_cost : numpy.ndarray
+        Marginal heat cost of the dispatch without storages.
+
+    spare : numpy.ndarray
+        Spare capacity of the units up to the marginal heat cost.
+
+    min_residual : float
+        Smallest minimum load of the units covering the remaining demand.
+
+    Returns
+    -------
+
+    tuple(numpy.ndarray, numpy.ndarray)
+        Heat flow out of the storage (negative when charging) and storage
+        content at the start of every time step.
+    """
+    capacity = unit_params['Q_N']
+    max_in = capacity * unit_params['Q_in_to_cap']
+    max_out = capacity * unit_params['Q_out_to_cap']
+    retention = 1 - unit_params['Q_rel_loss']
+
+    average = pd.Series(marginal_cost).rolling(
+        STORAGE_WINDOW, center=True, min_periods=1
+        ).mean().to_numpy()
+    surplus = np.clip(-residual, 0, None)
+    demand = np.clip(residual, 0, None)
+    cheap = marginal_cost < average
+    expensive = marginal_cost > average
+
+    flow = np.zeros(len(residual))
+    content = np.zeros(len(residual))
+    level = capacity * unit_params['init_storage']
+    # The storage content depends on the previous time step, so this loop
+    # can not be vectorized
+    for t in range(len(residual)):
+        content[t] = level
+        level *= retention
+        if surplus[t] > 0 or cheap[t]:
+            charge = surplus[t] + (spare[t] if cheap[t] else 0)
+            charge = min(charge, max_in, capacity - level)
+            flow[t] = -charge
+            level += charge
+        elif expensive[t]:
+            discharge = min(demand[t], max_out, level)
+            if 0 < demand[t] - discharge < min_residual:
+                discharge = max(demand[t] - min_residual, 0)
+            flow[t] = discharge
+            level -= discharge
+
+    return flow, content
+
+
+def dispatch_results(energy_system, dispatch):
+    """
+    Flows of the generated energy system resulting from a dispatch.
+
+    Input and electricity flows follow from the heat output of the units and
+    their efficiencies. Electricity of combined heat and power units covers
+    the demand of heat pumps and electrode boilers first, the remainder is
+    sold at the spot market.
+
+    Parameters
+    ----------
+
+    energy_system : EnergySystem
+        Energy system with generated oemof nodes.
+
+    dispatch : pandas.DataFrame
+        Dispatch as returned by `merit_order_dispatch`.
+
+    Returns
+    -------
+
+    dict
+        Results in the format of `oemof.solph.processing.results`, which can
+        be passed to `EnergySystem.get_results`.
+    """
+    buses = energy_system.buses
+    comps = energy_system.comps
+    index = dispatch.index
+    zeros = np.zeros(len(index))
+    gas = zeros.copy()
+    el_demand = zeros.copy()
+    chp_el = zeros.copy()
+
+    flows = {}
+    for unit, unit_params in energy_system.param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        flow = dispatch[unit].to_numpy() if unit in dispatch else zeros
+        if unit_cat == 'tes':
+            flows[(buses['hnw'], comps[unit])] = np.clip(-flow, 0, None)
+            flows[(comps[unit], buses['hnw'])] = np.clip(flow, 0, None)
+            continue
+        flows[(comps[unit], buses['hnw'])] = flow
+        if unit_cat in ['ccet', 'ice']:
+            el = flow * unit_params['eta_el'] / unit_params['eta_th']
+            flows[(buses['gnw'], comps[unit])] = flow / unit_params['eta_th']
+            flows[(comps[unit], buses['chp_node'])] = el
+            gas += flow / unit_params['eta_th']
+            chp_el += el
+        elif unit_cat == 'gb':
+            flows[(buses['gnw'], comps[unit])] = flow / unit_params['eta']
+            gas += flow / unit_params['eta']
+        elif unit_cat in ['hp', 'eb']:
+            eff = unit_params['cop' if unit_cat == 'hp' else 'eta']
+            flows[(buses['enw'], comps[unit])] = flow / eff
+            el_demand += flow / eff
+
+    flows[(buses['hnw'], comps['heat_sink'])] = (
+        energy_system.model_data['heat_demand'].to_numpy()
+        )
+    internal = np.minimum(chp_el, el_demand)
+    if energy_system.gas_used:
+        flows[(comps['gas_source'], buses['gnw'])] = gas
+    if energy_system.el_used:
+        flows[(comps['elec_source'], buses['enw'])] = el_demand - internal
+    if energy_system.chp_used:
+        flows[(buses['chp_node'], comps['chp_internal'])] = internal
+        flows[(comps['chp_internal'], buses['enw'])] = internal
+        flows[(buses['chp_node'], comps['elec_sink'])] = chp_el - internal
+
+    results = {
+        nodes: {
+            'sequences': pd.DataFrame({'flow': flow}, index=index),
+            'scalars': pd.Series(dtype=float)
+            }
+        for nodes, flow in flows.items()
+        }
+    for unit, unit_params in energy_system.param_units.items():
+        if unit.rstrip('0123456789') != 'tes':
+            continue
+        content = dispatch[f'storage_content_{unit}'].to_numpy()
+        results[(comps[unit], None)] = {
+            'sequences': pd.DataFrame({
+                'storage_content': content,
+                'storage_losses': content * unit_params['Q_rel_loss']
+                }, index=index),
+            'scalars': pd.Series(dtype=float)
+            }
+
+    return results
+
+
+def _max_load(energy_system, units, capacities):
+    return np.array([
+        capacities[u] * energy_system.param_units[u].get('Q_rel_max', 1)
+        for u in units
+        ])
+
+
+def _min_load(energy_system, units, capacities):
+    return np.array([
+        capacities[u] * energy_system.param_units[u].get('Q_rel_min', 0)
+        for u in units
+        ])
+
+
+def _dispatch_by_cost(energy_system, costs, capacities, residual):
+    # Heat output of the dispatchable units and the marginal heat cost
+    heat = np.zeros(costs.shape)
+    if costs.empty:
+        return heat, np.zeros(len(residual))
+
+    cost = costs.to_numpy()
+    units = costs.columns
+    max_load = _max_load(energy_system, units, capacities)
+    min_load = _min_load(energy_system, units, capacities)
+    residual = residual.copy()
+    marginal_cost = np.full(len(residual), np.nan)
+    steps = np.arange(len(residual))
+    order = np.argsort(cost, axis=1, kind='stable')
+    for rank in range(len(units)):
+        idx = order[:, rank]
+        load = np.minimum(residual, max_load[idx])
+        load[(load < min_load[idx]) | (load <= 0)] = 0
+        heat[steps, idx] = load
+        residual -= load
+
+    # Demand below the minimum load of the next unit is covered by raising
+    # running units or by switching on a unit at minimum load, while the
+    # running units are lowered towards their minimum load
+    for rank in range(len(units)):
+        idx = order[:, rank]
+        running = heat[steps, idx] > 0
+        load = np.where(
+            running, np.minimum(residual, max_load[idx] - heat[steps, idx]), 0
+            )
+        heat[steps, idx] += load
+        residual -= load
+    for rank in range(len(units)):
+        idx = order[:, rank]
+        running = heat > 0
+        reducible = ((heat - min_load) * running).sum(axis=1)
+        excess = min_load[idx] - residual
+        switch_on = (
+            (residual > 1e-9) & (heat[steps, idx] == 0)
+            & (max_load[idx] > 0) & (excess <= reducible)
+            )
+        share = np.divide(
+            np.clip(excess, 0, None), reducible,
+            out=np.zeros(len(residual)), where=reducible > 0
+            )
+        heat -= np.where(
+            switch_on[:, None], (heat - min_load) * running * share[:, None],
+            0
+            )
+        load = np.where(switch_on, np.maximum(residual, min_load[idx]), 0)
+        heat[steps, idx] += load
+        residual = np.where(switch_on, 0, residual)
+
+    for rank in range(len(units)):
+        idx = order[:, rank]
+        marginal_cost = np.where(
+            heat[steps, idx] > 0, cost[steps, idx], marginal_cost
+            )
+
+    # Without any unit running, the cheapest unit sets the marginal cost
+    marginal_cost = np.where(
+        np.isnan(marginal_cost), cost.min(axis=1), marginal_cost
+        )
+
+    return heat, marginal_cost
+
+
+def _is_must_run(unit, unit_params):
+    return unit.rstrip('0123456789') == 'exhs' and unit_params['fix']
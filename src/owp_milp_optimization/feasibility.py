@@ -0,0 +1,269 @@
+"""Checks of the problem data for configurations that can not be feasible."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ISSUE_COLUMNS = ['severity', 'check', 'unit', 'hours', 'value']
+
+# Bounds of the invest units that must not be reversed
+BOUND_PAIRS = {
+    'sol': ('A_min', 'A_max'), 'tes': ('Q_min', 'Q_max')
+    }
+
+
+def output_ranges(data, param_units):
+    """
+    Heat the units can feed into the heat network in every time step.
+
+    Parameters
+    ----------
+
+    data : pandas.DataFrame
+        Time series the model is built with.
+
+    param_units : dict
+        Unit parameters.
+
+    Returns
+    -------
+
+    dict
+        'forced' is the heat output of fixed units (solar thermal, fixed
+        external sources) in every time step, 'flexible' the additional
+        output that may continuously be chosen between zero and its value
+        (e.g. external sources without minimum load), 'intervals' the sorted
+        and merged ranges of the summed output of the units with minimum
+        loads over all their on/off combinations and 'charge', 'discharge'
+        and 'storage' the charging and discharging power and the capacity
+        of all storages. 'net_change' is the range of the change of the
+        total storage content from the first to the last time step and
+        'losses' the largest storage losses over all time steps.
+
+    Notes
+    -----
+
+    The power relations 'Q_in_to_cap' and 'Q_out_to_cap' only limit the
+    flows of invest storages in solph. The flows of storages with a fixed
+    capacity are unbounded, so that only their capacity limits how much
+    heat they can take or give in a time step.
+    """
+    periods = len(data.index)
+    forced = np.zeros(periods)
+    flexible = np.zeros(periods)
+    intervals = np.array([[0.0, 0.0]])
+    charge = discharge = storage = losses = 0
+    net_change = np.zeros(2)
+    for unit, unit_params in param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        invest = unit_params['invest_mode']
+        if unit_cat == 'tes':
+            capacity = unit_params['Q_max' if invest else 'Q_N']
+            if invest:
+                charge += capacity * unit_params['Q_in_to_cap']
+                discharge += capacity * unit_params['Q_out_to_cap']
+            else:
+                charge += capacity
+                discharge += capacity
+            storage += capacity
+            losses += capacity * unit_params['Q_rel_loss'] * periods
+            if not unit_params['balanced']:
+                # The largest capacity of invest storages gives the widest
+                # range of the change
+                init = unit_params['init_storage'] * capacity
+                net_change += [-init, capacity - init]
+        elif unit_cat == 'sol':
+            profile = (
+                unit_params['eta_col'] * data['solar_heat_flow'].to_numpy()
+                )
+            if invest:
+                forced += unit_params['A_min'] * profile
+                flexible += (
+                    (unit_params['A_max'] - unit_params['A_min']) * profile
+                    )
+            else:
+                forced += unit_params['A_N'] * profile
+        elif unit_cat == 'exhs':
+            lower, upper = (
+                (unit_params['cap_min'], unit_params['cap_max']) if invest
+                else (unit_params['cap_N'], unit_params['cap_N'])
+                )
+            if unit_params['fix']:
+                forced += lower
+                flexible += upper - lower
+            else:
+                flexible += upper
+        else:
+            lower, upper = (
+                (unit_params['cap_min'], unit_params['cap_max']) if invest
+                else (unit_params['cap_N'], unit_params['cap_N'])
+                )
+            intervals = _add_unit(
+                intervals, lower * unit_params['Q_rel_min'],
+                upper * unit_params['Q_rel_max']
+                )
+
+    return {
+        'forced': forced, 'flexible': flexible, 'intervals': intervals,
+        'charge': charge, 'discharge': discharge, 'storage': storage,
+        'net_change': net_change, 'losses': losses
+        }
+
+
+def _add_unit(intervals, minimum, maximum):
+    # Every combination either includes the unit or not
+    combined = np.vstack([intervals, intervals + [minimum, maximum]])
+    combined = combined[np.argsort(combined[:, 0])]
+
+    merged = [combined[0]]
+    for lower, upper in combined[1:]:
+        if lower <= merged[-1][1]:
+            merged[-1] = [merged[-1][0], max(merged[-1][1], upper)]
+        else:
+            merged += [[lower, upper]]
+
+    return np.array(merged)
+
+
+def _runs(values):
+    # Run number of the consecutive positive values in every time step (0
+    # outside of the runs) and the sums of the runs
+    positive = values > 0
+    starts = positive & ~np.r_[False, positive[:-1]]
+    runs = np.where(positive, np.cumsum(starts), 0)
+    return runs, np.bincount(runs, weights=values)[1:]
+
+
+def check_feasibility(data, param_units):
+    """
+    Find configurations that can not be feasible before building the model.
+
+    All checks are necessary conditions of a feasible model and are
+    evaluated for all time steps at once:
+
+    - 'bounds': minimum above maximum capacity or load of a unit
+    - 'capacity': heat demand above the output of all units and storages
+    - 'min_load': heat demand between the outputs the units can reach with
+      their minimum loads, so that it can neither be met exactly nor the
+      difference be stored
+    - 'forced_output': output of fixed units above the heat demand and the
+      charging power of the storages
+    - 'storage_energy': consecutive hours of missing or excess heat that
+      exceed the capacity of the storages
+    - 'storage_balance': more missing or excess heat over all time steps
+      than the storages can make up for by charging and discharging in the
+      other time steps, e.g. with balanced storages
+
+    Units that can not run in any time step due to their minimum load are
+    reported as 'never_runs' warning.
+
+    Parameters
+    ----------
+
+    data : pandas.DataFrame
+        Time series the model is built with.
+
+    param_units : dict
+        Unit parameters.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        One row per issue with its severity ('error' or 'warning'), check,
+        unit (None for the entire energy system), number of affected time
+        steps and largest violation in MW or MWh.
+    """
+    issues = []
+    for unit, unit_params in param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        lower, upper = BOUND_PAIRS.get(unit_cat, ('cap_min', 'cap_max'))
+        if (unit_params['invest_mode']
+                and unit_params[lower] > unit_params[upper]):
+            issues += [[
+                'error', 'bounds', unit, 0,
+                unit_params[lower] - unit_params[upper]
+                ]]
+        if unit_params.get('Q_rel_min', 0) > unit_params.get('Q_rel_max', 1):
+            issues += [[
+                'error', 'bounds', unit, 0,
+                unit_params['Q_rel_min'] - unit_params['Q_rel_max']
+                ]]
+    if issues:
+        return pd.DataFrame(issues, columns=ISSUE_COLUMNS)
+
+    ranges = output_ranges(data, param_units)
+    residual = data['heat_demand'].to_numpy(dtype=float) - ranges['forced']
+    lower = ranges['intervals'][:, 0] - ranges['charge']
+    upper = ranges['intervals'][:, 1] + ranges['discharge']
+
+    # Interval with the largest output that does not exceed the residual
+    index = np.searchsorted(lower, residual, side='right') - 1
+    surplus = np.where(index < 0, lower[0] - residual, 0)
+    shortfall = np.where(
+        index >= 0,
+        residual - upper[np.maximum(index, 0)] - ranges['flexible'], 0
+        )
+    above_all = index == len(lower) - 1
+    checks = {
+        'forced_output': surplus,
+        'capacity': np.where(above_all, shortfall, 0),
+        'min_load': np.where(above_all, 0, shortfall)
+        }
+    for check, violation in checks.items():
+        violated = violation > 0
+        if violated.any():
+            issues += [[
+                'error', check, None, int(violated.sum()), violation.max()
+                ]]
+
+    if ranges['storage'] > 0:
+        # Storages can not be charged while heat is missing and vice versa
+        maximum = ranges['intervals'][-1, 1] + ranges['flexible']
+        deficit = np.maximum(residual - maximum, 0)
+        excess = np.maximum(-residual, 0)
+        for energy in [deficit, excess]:
+            runs, run_sums = _runs(energy)
+            exceeding = np.flatnonzero(run_sums > ranges['storage']) + 1
+            if exceeding.size:
+                issues += [[
+                    'error', 'storage_energy', None,
+                    int(np.isin(runs, exceeding).sum()),
+                    run_sums.max() - ranges['storage']
+                    ]]
+
+        # Range of the change of the storage content over all time steps
+        max_charge = np.minimum(
+            ranges['charge'], np.maximum(maximum - residual, 0)
+            )
+        max_discharge = np.minimum(
+            ranges['discharge'], np.maximum(residual, 0)
+            )
+        lowest = excess.sum() - max_discharge.sum() - ranges['losses']
+        highest = max_charge.sum() - deficit.sum()
+        net_min, net_max = ranges['net_change']
+        if lowest > net_max:
+            issues += [[
+                'error', 'storage_balance', None, int((excess > 0).sum()),
+                lowest - net_max
+                ]]
+        elif highest < net_min:
+            issues += [[
+                'error', 'storage_balance', None, int((deficit > 0).sum()),
+                net_min - highest
+                ]]
+
+    for unit, unit_params in param_units.items():
+        if 'Q_rel_min' not in unit_params:
+            continue
+        capacity = unit_params[
+            'cap_min' if unit_params['invest_mode'] else 'cap_N'
+            ]
+        minimum = capacity * unit_params['Q_rel_min']
+        if minimum > 0 and (minimum > residual + ranges['charge']).all():
+            issues += [['warning', 'never_runs', unit, len(residual), minimum]]
+
+    return pd.DataFrame(issues, columns=ISSUE_COLUMNS)
@@ -1,7 +1,24 @@
 import base64
 import os
 
+import altair as alt
+import numpy as np
 import streamlit as st
+from cache import ResultCache
+from database import load_input_database
+from jobs import JobManager
+
+
+@st.cache_resource
+def shared_input_database():
+    """Input database loaded once per process and shared by all sessions."""
+    return load_input_database()
+
+
+@st.cache_resource
+def shared_job_manager():
+    """Queue of background solves shared by all sessions."""
+    return JobManager(cache=ResultCache())
 
 
 def img_to_base64(image_path):
@@ -97,3 +114,103 @@ def footer(icon_base64s):
 
 def format_sep(value, dec=2):
     return f"{value:,.{dec}f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def convergence_chart(progress):
+    """Line chart of incumbent and best bound over the solver time."""
+    progress = progress.replace([np.inf, -np.inf], np.nan)
+    progress = progress.rename(
+        columns={'incumbent': 'Beste Lösung', 'bound': 'Beste Schranke'}
+        )
+    domain = ['Beste Lösung', 'Beste Schranke']
+
+    return alt.Chart(
+        progress[['time', *domain]].melt('time').dropna()
+        ).mark_line(interpolate='step-after', point=True).encode(
+            y=alt.Y('value', title='Zielfunktionswert', scale=alt.Scale(zero=False)),
+            x=alt.X('time', title='Rechenzeit in s'),
+            color=alt.Color('variable', title=None).scale(
+                domain=domain, range=['#B54036', '#00395B']
+                )
+            )
+
+def infeasibility_chart(report, labels):
+    """Bar chart of the slacks of an infeasible energy system over time."""
+    report = report.rename(columns=labels)
+    report.index.name = 'Date'
+    domain = [col for col in report.columns if (report[col] > 0).any()]
+
+    report = report.loc[(report[domain] > 0).any(axis=1), domain]
+
+    return alt.Chart(
+        report.reset_index().melt('Date')
+        ).mark_bar().encode(
+            y=alt.Y('value', title='Abweichung in MWh'),
+            x=alt.X('Date', title='Datum'),
+            color=alt.Color('variable', title=None)
+            )
+
+def feasibility_messages(issues, longnames):
+    """
+    Messages of the issues found by `feasibility.check_feasibility`.
+
+    Returns
+    -------
+
+    list of tuple(str, str)
+        Severity ('error' or 'warning') and message of every issue.
+    """
+    messages = []
+    for _, issue in issues.iterrows():
+        label = None
+        if isinstance(issue['unit'], str):
+            unit_cat = issue['unit'].rstrip('0123456789')
+            label = f'{longnames[unit_cat]} {issue["unit"][len(unit_cat):]}'
+        hours = f'{issue["hours"]:.0f}'
+        value = format_sep(issue['value'])
+        if issue['check'] == 'bounds':
+            message = (
+                f'Bei {label} ist die minimale Kapazität oder Teillast größer '
+                + 'als die maximale.'
+                )
+        elif issue['check'] == 'capacity':
+            message = (
+                f'In {hours} Stunden übersteigt der Wärmebedarf die Leistung '
+                + f'aller Wärmeanlagen und -speicher um bis zu {value} MW. '
+                + 'Erhöhe die installierte oder maximal zu installierende '
+                + 'Leistung der Anlagen oder füge weitere Anlagen oder einen '
+                + 'Wärmespeicher hinzu.'
+                )
+        elif issue['check'] == 'min_load':
+            message = (
+                f'In {hours} Stunden kann der Wärmebedarf aufgrund der '
+                + 'Mindestteillasten weder genau gedeckt noch die Differenz '
+                + f'gespeichert werden (bis zu {value} MW). Verringere die '
+                + 'Mindestteillasten oder füge eine flexible externe '
+                + 'Wärmequelle oder einen Wärmespeicher hinzu.'
+                )
+        elif issue['check'] == 'forced_output':
+            message = (
+                f'In {hours} Stunden erzeugen Solarthermie und externe '
+                + f'Wärmequellen mit festem Einsatz bis zu {value} MW mehr '
+                + 'Wärme, als abgenommen oder gespeichert werden kann.'
+                )
+        elif issue['check'] == 'storage_energy':
+            message = (
+                'Die Wärmespeicher können zusammenhängende Zeiträume mit '
+                + 'fehlender oder überschüssiger Wärme nicht überbrücken. Es '
+                + f'fehlen bis zu {value} MWh Speicherkapazität.'
+                )
+        elif issue['check'] == 'storage_balance':
+            message = (
+                'Über den gesamten Zeitraum fehlt oder entsteht mehr Wärme, '
+                + 'als die Wärmespeicher durch Be- und Entladen ausgleichen '
+                + f'können (mindestens {value} MWh).'
+                )
+        else:
+            message = (
+                f'{label} kann aufgrund der Mindestteillast von {value} MW in '
+                + 'keiner Stunde betrieben werden.'
+                )
+        messages += [(issue['severity'], message)]
+
+    return messages
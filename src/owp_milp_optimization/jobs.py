@@ -0,0 +1,326 @@
+"""Background solve jobs, so that solves do not block the dashboard."""
+
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from owp_milp_optimization.batch import run_energy_system
+from owp_milp_optimization.cache import result_entry
+from owp_milp_optimization.profiling import allow_peak_reset
+from owp_milp_optimization.racing import RACE_MODES, SOLVERS, race_file
+from owp_milp_optimization.solverlog import (
+    PROGRESS_COLUMNS, LogTailer, solver_file
+    )
+from owp_milp_optimization.workdir import WorkDirs
+
+
+def _run_job(data, param_units, param_opt, logpath, cache):
+    energy_system, solver_status = run_energy_system(
+        data, param_units, param_opt, cache=cache, logpath=logpath
+        )
+    if solver_status != 'ok':
+        return solver_status, None, energy_system.infeasibility
+
+    entry = result_entry(energy_system)
+    entry['cached'] = getattr(energy_system, 'cached', False)
+    return solver_status, entry, None
+
+
+def _run_job_process(data, param_units, param_opt, logpath, cache):
+    """
+    Run `_run_job` in a new Python process and return its result.
+
+    The process is started with this module as main module. Workers spawned
+    by `multiprocessing` would import the main module of the dashboard
+    instead, i.e. the script of a page. The input and the result are passed
+    as pickle files in the directory of the solver log. A process that
+    fails, e.g. because it runs out of memory, only fails its own job.
+    """
+    workdir = os.path.dirname(logpath)
+    inpath = os.path.join(workdir, 'job_input.pkl')
+    outpath = os.path.join(workdir, 'job_result.pkl')
+    with open(inpath, 'wb') as file:
+        pickle.dump(
+            (data, param_units, param_opt, logpath, cache), file,
+            protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+    # The input may reference modules imported from the search path of this
+    # process, e.g. the top-level modules of the dashboard pages
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join(path for path in sys.path if path)
+        }
+    process = subprocess.run(
+        [sys.executable, '-m', 'owp_milp_optimization.jobs', inpath, outpath],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        errors='replace', env=env
+        )
+    if process.returncode < 0:
+        raise RuntimeError(
+            'The solve process was terminated by signal '
+            + f'{-process.returncode}.'
+            )
+    if process.returncode != 0:
+        # The last line of a traceback names the exception
+        lines = process.stderr.strip().splitlines()
+        raise RuntimeError(
+            f'The solve process exited with code {process.returncode}.'
+            + (f' {lines[-1]}' if lines else '')
+            )
+    with open(outpath, 'rb') as file:
+        return pickle.load(file)
+
+
+def main():
+    """Run a job written by `_run_job_process` and write its result."""
+    inpath, outpath = sys.argv[1:3]
+    # The process only solves this job
+    allow_peak_reset()
+    with open(inpath, 'rb') as file:
+        result = _run_job(*pickle.load(file))
+
+    tmppath = f'{outpath}.tmp'
+    with open(tmppath, 'wb') as file:
+        pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmppath, outpath)
+
+
+def _last_gap(progress):
+    # Gap of the last line of a progress, infinite without a gap yet
+    if progress.empty or pd.isna(progress['gap'].iloc[-1]):
+        return float('inf')
+    return progress['gap'].iloc[-1]
+
+
+class SolveJob():
+    """
+    Solve of an energy system submitted to a `JobManager`.
+
+    The input data is kept with the job, so that the results can be
+    assigned to an `EnergySystem` of the same input data once the job is
+    finished (see `cache.restore_results`).
+    """
+
+    def __init__(self, job_id, data, param_units, param_opt, workdir):
+        self.id = job_id
+        self.data = data
+        self.param_units = param_units
+        self.param_opt = param_opt
+        self.workdir = workdir
+        self.logpath = os.path.join(
+            workdir, f'{param_opt["Solver"].lower()}_log.txt'
+            )
+        # Tailer of the log file and of the logs of solver races
+        self.tailer = None
+        self.race_tailers = {}
+        # Solver whose progress is returned by `progress`
+        self.progress_solver = None
+        self.submitted = time.time()
+        self.cancelled = False
+        self.future = None
+
+    @property
+    def status(self):
+        """One of 'queued', 'running', 'done', 'failed' or 'cancelled'."""
+        if self.cancelled:
+            return 'cancelled'
+        if self.future is None:
+            return 'queued'
+        if self.future.done():
+            return 'failed' if self.future.exception() else 'done'
+        return 'running'
+
+    @property
+    def solver_status(self):
+        """Solver status as returned by `EnergySystem.solve_model`."""
+        return self.future.result()[0]
+
+    @property
+    def result(self):
+        """Results of the solved energy system (None if not solved)."""
+        return self.future.result()[1]
+
+    @property
+    def infeasibility(self):
+        """
+        Slacks of an infeasible energy system (see
+        `EnergySystem.diagnose_infeasibility`) or None.
+        """
+        return self.future.result()[2]
+
+    @property
+    def error(self):
+        """Exception raised by the job or None."""
+        if self.future is None or not self.future.done():
+            return None
+        return self.future.exception()
+
+    def progress(self):
+        """
+        MIP progress of the solve so far.
+
+        Races and stall-monitored solves write a log per solver (see
+        `racing.race_file`), of which the solver with the smallest gap is
+        shown. Single solves of the 'Auto' or 'Race' option are read once
+        the chosen solver is known (see `solverlog.solver_file`). Only the
+        part of the logs written since the last call is read (see
+        `solverlog.LogTailer`).
+
+        Returns
+        -------
+
+        pandas.DataFrame
+            Progress as returned by `solverlog.parse_progress`.
+        """
+        for solver in SOLVERS:
+            racepath = race_file(self.workdir, solver, 'log')
+            if solver not in self.race_tailers and os.path.exists(racepath):
+                self.race_tailers[solver] = LogTailer(racepath, solver)
+        if self.race_tailers:
+            progresses = {
+                solver: tailer.poll()
+                for solver, tailer in self.race_tailers.items()
+                }
+            self.progress_solver = min(
+                progresses, key=lambda solver: _last_gap(progresses[solver])
+                )
+            return progresses[self.progress_solver]
+
+        if self.tailer is None:
+            solver = self.param_opt['Solver']
+            if solver in RACE_MODES:
+                try:
+                    with open(solver_file(self.logpath), 'r') as file:
+                        solver = file.read().strip()
+                except FileNotFoundError:
+                    pass
+            if solver in SOLVERS:
+                self.tailer = LogTailer(self.logpath, solver)
+                self.progress_solver = solver
+        if self.tailer is None:
+            return pd.DataFrame(columns=PROGRESS_COLUMNS)
+
+        return self.tailer.poll()
+
+
+class JobManager():
+    """
+    Queue of background solves shared by all users of the dashboard.
+
+    Parameters
+    ----------
+
+    max_workers : int
+        Number of energy systems that are solved at the same time. Further
+        jobs are queued.
+
+    mode : str
+        'process' to solve every job in its own Python process or 'thread'
+        to solve in threads of the current process. Processes keep the
+        server responsive, as the solvers do not release the global
+        interpreter lock during the solve, and a crashing solve does not
+        affect the server or other jobs.
+
+    cache : ResultCache
+        Result cache used by all jobs (see `batch.run_energy_system`).
+
+    workdirs : WorkDirs
+        Scratch directories of the jobs. Each job gets its own directory,
+        which is kept until the job is forgotten.
+    """
+
+    def __init__(self, max_workers=2, mode='process', cache=None,
+                 workdirs=None):
+        if mode == 'process':
+            self._run = _run_job_process
+        elif mode == 'thread':
+            self._run = _run_job
+        else:
+            raise ValueError(f'Unknown job mode "{mode}".')
+        # The threads only wait for the solve processes in 'process' mode
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.mode = mode
+        self.max_workers = max_workers
+        self.cache = cache
+        self.workdirs = WorkDirs() if workdirs is None else workdirs
+        self.jobs = {}
+
+        # Jobs are only passed to the executor when a worker is free, so
+        # that their status is known and queued jobs can be cancelled
+        self._pending = []
+        self._active = 0
+        self._lock = threading.RLock()
+
+    def submit(self, data, param_units, param_opt):
+        """Queue the solve of an energy system and return the job id."""
+        job_id = uuid.uuid4().hex
+        workdir = self.workdirs.create(f'job_{job_id}', active=True)
+
+        job = SolveJob(job_id, data, param_units, param_opt, workdir)
+        with self._lock:
+            self.jobs[job_id] = job
+            self._pending += [job]
+        self._dispatch()
+
+        return job_id
+
+    def _dispatch(self):
+        with self._lock:
+            while self._pending and self._active < self.max_workers:
+                job = self._pending.pop(0)
+                self._active += 1
+                job.future = self.executor.submit(
+                    self._run, job.data, job.param_units, job.param_opt,
+                    job.logpath, self.cache
+                    )
+                job.future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        with self._lock:
+            self._active -= 1
+        self._dispatch()
+
+    def job(self, job_id):
+        """Return the job of the given id or None if it is unknown."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        """Number of queued jobs submitted before the given job."""
+        with self._lock:
+            job = self.jobs[job_id]
+            if job not in self._pending:
+                return 0
+            return self._pending.index(job)
+
+    def cancel(self, job_id):
+        """Cancel a queued job. Running jobs can not be cancelled."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job not in self._pending:
+                return False
+            self._pending.remove(job)
+            job.cancelled = True
+            return True
+
+    def forget(self, job_id):
+        """Remove a finished job and its scratch directory."""
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+        if job is not None:
+            self.workdirs.remove(job.workdir)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,110 @@
+import logging
 import os
+import shutil
+import time
+from copy import deepcopy
 
 import oemof.solph as solph
 import pandas as pd
+import pyomo.environ as po
 from oemof.solph import views
 from pyomo.contrib import appsi
 from pyomo.contrib.appsi.base import TerminationCondition
 
+from owp_milp_optimization.aggregation import TypicalPeriods
+from owp_milp_optimization.diagnosis import add_elastic_slacks, slack_report
+from owp_milp_optimization.dispatch import (
+    dispatch_results, merit_order_dispatch
+    )
+from owp_milp_optimization.feasibility import ISSUE_COLUMNS, check_feasibility
+from owp_milp_optimization.presolve import (
+    BOUND_COLUMNS, CHP_INTERNAL_CAPACITY, tighten_bounds
+    )
+from owp_milp_optimization.profiling import PhaseProfiler, profiled
+from owp_milp_optimization.racing import (
+    RACE_MODES, available_solvers, fastest_solver, race_file, race_solvers,
+    record_winner, size_class
+    )
+from owp_milp_optimization.resources import SolveSlots, solver_options
+from owp_milp_optimization.solverlog import read_progress, solver_file
+from owp_milp_optimization.symmetry import (
+    add_count_constraints, add_ordering_constraints, aggregate_params,
+    disaggregate, identical_units, is_aggregable
+    )
+from owp_milp_optimization.termination import stall_policy
+from owp_milp_optimization.warmstart import (
+    accepts_start, apply_start, heuristic_start
+    )
+from owp_milp_optimization.workdir import WorkDirs
+
+# Parameters that only enter the objective function, the solver options or
+# the postprocessing, so that they can be changed without a model rebuild
+UPDATABLE_PARAM_OPT = [
+    'MIPGap', 'TimeLimit', 'Threads', 'calc_network', 'net_dist',
+    'net_inv_spez', 'net_op_cost_fix', 'net_op_cost_var', 'net_inv_total',
+    'net_op_cost_fix_total', 'net_op_cost_var_total', 'ef_gas',
+    'elec_consumer_charges_grid', 'elec_consumer_charges_self', 'heat_price',
+    'energy_tax', 'vNNE', 'capital_interest', 'lifetime'
+    ]
+UPDATABLE_PARAM_UNITS = [
+    'op_cost_var', 'op_cost_bonus_rel', 'inv_spez', 'inv_bonus_rel',
+    'op_cost_fix'
+    ]
+
+# Column labels of the result variables by the categories (labels without
+# number) of the source and target node of an edge. '*' matches all nodes and
+# the variable None all remaining variables of an edge.
+LABEL_RULES = {
+    ('hp', 'heat network'): {
+        'flow': 'Q_out_{source}', 'invest': 'cap_{source}',
+        'status': 'state_{source}', 'status_nominal': 'state_nom_{source}',
+        'total': 'total_{source}'
+        },
+    ('tes', 'heat network'): {
+        'flow': 'Q_out_{source}', 'invest': 'cap_out_{source}',
+        'status': 'state_out_{source}',
+        'status_nominal': 'state_nom_out_{source}',
+        'total': 'total_out_{source}'
+        },
+    ('*', 'heat network'): {
+        'flow': 'Q_{source}', 'invest': 'cap_{source}',
+        'status': 'state_{source}', 'status_nominal': 'state_nom_{source}',
+        'total': 'total_{source}'
+        },
+    ('heat network', 'tes'): {
+        'flow': 'Q_in_{target}', 'invest': 'cap_in_{target}',
+        'status': 'state_in_{target}',
+        'status_nominal': 'state_nom_in_{target}',
+        'total': 'total_in_{target}'
+        },
+    ('heat network', 'heat demand'): {None: 'Q_demand'},
+    ('*', 'chp node'): {'flow': 'P_{source}'},
+    ('electricity network', 'hp'): {
+        'flow': 'P_in_{target}', 'status': 'state_{target}'
+        },
+    ('electricity network', '*'): {None: 'P_{target}'},
+    ('gas network', '*'): {None: 'H_{target}'},
+    ('chp node', 'spotmarket'): {None: 'P_spotmarket'},
+    ('chp node', 'chp internal'): {None: 'P_internal'},
+    ('chp internal', 'electricity network'): {None: 'P_internal'},
+    ('gas source', '*'): {None: 'H_source'},
+    ('electricity source', '*'): {None: 'P_source'},
+    ('tes', 'None'): {
+        'storage_content': 'storage_content_{source}',
+        'invest': 'cap_{source}', 'total': 'total_{source}',
+        'storage_losses': 'storage_losses_{source}'
+        }
+    }
+
+logger = logging.getLogger(__name__)
+
 
 class EnergySystem():
     """Model class that builds the energy system from parameters."""
 
-    def __init__(self, data, param_units, param_opt):
+    def __init__(self, data, param_units, param_opt, prepare=True):
+        # Without `prepare`, the typical periods and the presolve are skipped,
+        # e.g. to restore cached results that need no model
         self.data = data
         self.param_units = param_units
         self.param_opt = param_opt
@@ -46,10 +140,21 @@ class EnergySystem():
                 ])
             )
 
-        self.periods = len(data.index)
+        # Time series used to build the model (typical periods if aggregated)
+        self.aggregation = None
+        self.model_data = data
+        if (prepare and self.param_opt.get('typical_periods')
+                and not self.param_opt.get('rolling_horizon')):
+            self.aggregation = TypicalPeriods(
+                data, self.param_opt['typical_periods'],
+                period_length=self.param_opt.get('period_length', 24)
+                )
+            self.model_data = self.aggregation.data
+
+        self.periods = len(self.model_data.index)
         self.es = solph.EnergySystem(
             timeindex=pd.date_range(
-                data.index[0], periods=self.periods, freq='h'
+                self.model_data.index[0], periods=self.periods, freq='h'
                 ),
             infer_last_interval=True
             )
@@ -59,9 +164,96 @@ class EnergySystem():
             self.param_opt['lifetime']
             )
 
+        # Drop the minimum load constraints to obtain a pure LP
+        self.relax_nonconvex = False
+
         self.buses = {}
         self.comps = {}
+        # Groups of identical units ordered or aggregated in the model
+        self.ordered_units = []
+        self.aggregated_units = []
+
+        # Built model and persistent solver kept for repeated solves
+        self.model = None
+        self.solver = None
+
+        # Start values of the first solve (see `warmstart.results_start`)
+        self.start_values = None
+        self.warm_started = False
+
+        # Solver log file, defaults to a new directory of `WorkDirs`
+        self.logpath = None
+        # Directory created for the solver log (see `remove_workdir`)
+        self.workdir = None
+        # Content of the solver log once its file is removed
+        self.solver_log = None
+        # Objective value of the solution used by the postprocessing
+        self.objective = None
+        # MIP progress of the last solve (see `solverlog.parse_progress`)
+        self.progress = None
+        # Slacks of the elastic model of an infeasible energy system (see
+        # `diagnose_infeasibility`)
+        self.infeasibility = None
+        # Issues found before building the model (see `check_feasibility`)
+        self.feasibility_issues = pd.DataFrame(columns=ISSUE_COLUMNS)
+        # Solver of the last solve, which differs from the 'Solver' option
+        # if solvers are raced (see `racing`)
+        self.used_solver = None
+        # Wall time and memory of the build, solve and postprocessing phases
+        self.profiler = PhaseProfiler(
+            memory=self.param_opt.get('profile_memory', 'rss')
+            )
+
+        # Investment bounds and 'chp internal' capacity used in the model
+        self.invest_maximum = {}
+        self.chp_internal_capacity = CHP_INTERNAL_CAPACITY
+        self.tightened_bounds = pd.DataFrame(columns=BOUND_COLUMNS)
+        if prepare and self.param_opt.get('tighten_bounds', True):
+            self.presolve()
+
+    @profiled
+    def presolve(self):
+        """Tighten the bounds of the model (see `presolve.tighten_bounds`)."""
+        (
+            self.invest_maximum, self.chp_internal_capacity,
+            self.tightened_bounds
+            ) = tighten_bounds(self.model_data, self.param_units)
+
+    @profiled
+    def check_feasibility(self):
+        """
+        Check the problem data for configurations that can not be feasible.
+
+        The issues are stored as `feasibility_issues` and logged (see
+        `feasibility.check_feasibility`).
+
+        Returns
+        -------
+
+        bool
+            False if the energy system is certainly infeasible.
+        """
+        self.feasibility_issues = check_feasibility(
+            self.model_data, self.param_units
+            )
+        for _, issue in self.feasibility_issues.iterrows():
+            log = (
+                logger.error if issue['severity'] == 'error'
+                else logger.warning
+                )
+            log(
+                f'Feasibility check "{issue["check"]}" failed'
+                + (
+                    f' for {issue["unit"]}' if isinstance(issue['unit'], str)
+                    else ''
+                    )
+                + f' in {issue["hours"]} time steps by up to '
+                + f'{issue["value"]:.2f}.'
+                )
 
+        return not (self.feasibility_issues['severity'] == 'error').any()
+
+    @profiled
     def generate_buses(self):
         if self.gas_used:
             self.buses['gnw'] = solph.Bus(label='gas network')
@@ -73,6 +265,7 @@ class EnergySystem():
 
         self.es.add(*list(self.buses.values()))
 
+    @profiled
     def generate_sources(self):
         if self.gas_used:
             self.comps['gas_source'] = solph.components.Source(
@@ -80,8 +273,8 @@ class EnergySystem():
                 outputs={
                     self.buses['gnw']: solph.flows.Flow(
                         variable_costs=(
-                            self.data['gas_price']
-                            + (self.data['co2_price']
+                            self.model_data['gas_price']
+                            + (self.model_data['co2_price']
                                * self.param_opt['ef_gas'])
                             )
                         )
@@ -98,7 +291,7 @@ class EnergySystem():
                         variable_costs=(
                             self.param_opt['elec_consumer_charges_grid']
                             - self.param_opt['elec_consumer_charges_self']
-                            + self.data['el_spot_price']
+                            + self.model_data['el_spot_price']
                             )
                         )
                     }
@@ -116,7 +309,9 @@ class EnergySystem():
                             * (1 - unit_params['inv_bonus_rel'])
                             + unit_params['op_cost_fix']
                         ),
-                        maximum=unit_params['A_max'],
+                        maximum=self.invest_maximum.get(
+                            unit, unit_params['A_max']
+                            ),
                         minimum=unit_params['A_min']
                     )
                 else:
@@ -132,7 +327,7 @@ class EnergySystem():
                             ),
                             nominal_capacity=nominal_capacity,
                             fix=(
-                                self.data['solar_heat_flow']
+                                self.model_data['solar_heat_flow']
                                 * unit_params['eta_col']
                             )
                         )
@@ -154,7 +349,9 @@ class EnergySystem():
                             * (1 - unit_params['inv_bonus_rel'])
                             + unit_params['op_cost_fix']
                         ),
-                        maximum=unit_params['cap_max'],
+                        maximum=self.invest_maximum.get(
+                            unit, unit_params['cap_max']
+                            ),
                         minimum=unit_params['cap_min']
                     )
                 else:
@@ -176,14 +373,18 @@ class EnergySystem():
 
                 self.es.add(self.comps[unit])
 
+    @profiled
     def generate_sinks(self):
         self.comps['heat_sink'] = solph.components.Sink(
             label='heat demand',
             inputs={
                 self.buses['hnw']: solph.flows.Flow(
                     variable_costs=-self.param_opt['heat_price'],
-                    nominal_capacity=self.data['heat_demand'].max(),
-                    fix=self.data['heat_demand']/self.data['heat_demand'].max()
+                    nominal_capacity=self.model_data['heat_demand'].max(),
+                    fix=(
+                        self.model_data['heat_demand']
+                        / self.model_data['heat_demand'].max()
+                        )
                     )
                 }
             )
@@ -196,7 +397,8 @@ class EnergySystem():
                 inputs={
                     self.buses['chp_node']: solph.flows.Flow(
                         variable_costs=(
-                            -self.data['el_spot_price'] - self.param_opt['vNNE']
+                            -self.model_data['el_spot_price']
+                            - self.param_opt['vNNE']
                             )
                         )
                     }
@@ -204,10 +406,40 @@ class EnergySystem():
 
             self.es.add(self.comps['elec_sink'])
 
-    def generate_components(self):
+    @profiled
+    def generate_components(self, symmetry=True):
+        """
+        Generate the heat producing units and storages.
+
+        Parameters
+        ----------
+
+        symmetry : bool
+            Whether identical units are handled as set by the
+            'identical_units' option (see `symmetry`). Groups of identical
+            units with fixed capacity are either aggregated into their first
+            unit or ordered like all other groups.
+        """
+        self.ordered_units = []
+        self.aggregated_units = []
+        mode = self.param_opt.get('identical_units') if symmetry else None
+        for units in identical_units(self.param_units):
+            if (mode == 'aggregate'
+                    and is_aggregable(units[0], self.param_units[units[0]])):
+                self.aggregated_units += [units]
+            elif mode is not None:
+                self.ordered_units += [units]
+        members = {
+            unit: units for units in self.aggregated_units for unit in units
+            }
+
         internal_el = False
         for unit, unit_params in self.param_units.items():
             unit_cat = unit.rstrip('0123456789')
+            if unit in members:
+                if unit != members[unit][0]:
+                    continue
+                unit_params = aggregate_params(unit_params, len(members[unit]))
             if unit_cat in ['ccet', 'ice']:
 
                 if unit_params['invest_mode']:
@@ -217,7 +449,9 @@ class EnergySystem():
                             * (1 - unit_params['inv_bonus_rel'])
                             + unit_params['op_cost_fix']
                         ),
-                        maximum=unit_params['cap_max'],
+                        maximum=self.invest_maximum.get(
+                            unit, unit_params['cap_max']
+                            ),
                         minimum=unit_params['cap_min']
                     )
                 else:
@@ -236,8 +470,7 @@ class EnergySystem():
                         self.buses['hnw']: solph.flows.Flow(
                             nominal_capacity=nominal_capacity,
                             max=unit_params['Q_rel_max'],
-                            min=unit_params['Q_rel_min'],
-                            nonconvex=solph.NonConvex()
+                            **self._min_load_kwargs(unit, unit_params)
                             )
                         },
                     conversion_factors={
@@ -282,7 +515,9 @@ class EnergySystem():
                             * (1 - unit_params['inv_bonus_rel'])
                             + unit_params['op_cost_fix']
                         ),
-                        maximum=unit_params['cap_max'],
+                        maximum=self.invest_maximum.get(
+                            unit, unit_params['cap_max']
+                            ),
                         minimum=unit_params['cap_min']
                     )
                 else:
@@ -295,9 +530,8 @@ class EnergySystem():
                         self.buses['hnw']: solph.flows.Flow(
                             nominal_capacity=nominal_capacity,
                             max=unit_params['Q_rel_max'],
-                            min=unit_params['Q_rel_min'],
-                            nonconvex=solph.NonConvex(),
-                            variable_costs=var_cost
+                            variable_costs=var_cost,
+                            **self._min_load_kwargs(unit, unit_params)
                             )
                         },
                     conversion_factors={
@@ -358,7 +592,7 @@ class EnergySystem():
                 label='chp internal',
                 inputs={self.buses['chp_node']: solph.flows.Flow()},
                 outputs={self.buses['enw']: solph.flows.Flow(
-                    nominal_capacity=9999,
+                    nominal_capacity=self.chp_internal_capacity,
                     max=1.0,
                     min=0.0
                     )},
@@ -367,62 +601,223 @@ class EnergySystem():
 
             self.es.add(self.comps['chp_internal'])
 
-    def solve_model(self):
-        self.model = solph.Model(self.es)
-
-        solverlogspath = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), 'solverlogs')
-            )
-        if not os.path.exists(solverlogspath):
-            os.mkdir(solverlogspath)
+    def _min_load_kwargs(self, unit, unit_params):
+        # Aggregated units are limited by their unit count instead
+        aggregated = [units[0] for units in self.aggregated_units]
+        if self.relax_nonconvex or unit in aggregated:
+            return {'min': 0}
+        return {'min': unit_params['Q_rel_min'], 'nonconvex': solph.NonConvex()}
+
+    @profiled
+    def size_units_relaxed(self):
+        """
+        Fix the capacities of all invest units with an LP relaxation.
+
+        The investment problem is solved without the minimum load constraints
+        of the `NonConvex` flows, which results in a pure LP. Its capacities
+        are set as fixed capacities of the units, so that the subsequent
+        MILP only optimizes the dispatch. The LP objective is a lower bound of
+        the monolithic MILP and is used to report the gap of the staged
+        solution in `calc_econ_params`.
+        """
+        solver_status, lp_system = self.solve_relaxation()
+        if solver_status != 'ok':
+            return solver_status
+
+        lp_system.get_results()
+
+        self.param_units = deepcopy(self.param_units)
+        self.fixed_invest_cost = 0
+        for unit, unit_params in self.param_units.items():
+            if not unit_params['invest_mode']:
+                continue
+            unit_cat = unit.rstrip('0123456789')
+            if unit_cat == 'tes':
+                param_var = 'Q_N'
+            elif unit_cat == 'sol':
+                param_var = 'A_N'
+            else:
+                param_var = 'cap_N'
+
+            cap = float(lp_system.data_caps.loc[0, f'cap_{unit}'])
+            unit_params[param_var] = cap if cap > 1e-6 else 0.0
+            unit_params['invest_mode'] = False
+            self.fixed_invest_cost += unit_params[param_var] * (
+                unit_params['inv_spez'] / self.bwsf
+                * (1 - unit_params['inv_bonus_rel'])
+                + unit_params['op_cost_fix']
+                )
 
-        logpath = os.path.abspath(
-            os.path.join(
-                solverlogspath, f'{self.param_opt["Solver"].lower()}_log.txt'
+        return solver_status
+
+    @profiled
+    def solve_relaxation(self):
+        """
+        Solve the LP relaxation of the energy system.
+
+        The relaxation drops the minimum load constraints of the `NonConvex`
+        flows. Its objective is stored as `lp_objective`, a guaranteed lower
+        bound of the objective of the MILP, which `calc_econ_params` reports
+        together with the remaining gap of the solution.
+
+        Returns
+        -------
+
+        tuple(str, EnergySystem)
+            Solver status and the solved relaxed energy system.
+        """
+        lp_system = EnergySystem(self.data, self.param_units, self.param_opt)
+        lp_system.relax_nonconvex = True
+        lp_system.profiler = self.profiler
+        lp_system.logpath = self.init_logpath()
+        solver_status = lp_system.run_model()
+        if solver_status == 'ok':
+            self.lp_objective = po.value(lp_system.model.objective)
+
+        return solver_status, lp_system
+
+    def init_logpath(self):
+        """Return the solver log file, creating its directory if unset."""
+        if self.logpath is None:
+            self.workdir = WorkDirs().create('solve', active=True)
+            self.logpath = os.path.join(
+                self.workdir, f'{self.param_opt["Solver"].lower()}_log.txt'
                 )
+
+        return self.logpath
+
+    def remove_workdir(self):
+        """
+        Remove the directory created by `init_logpath` once a run is done.
+
+        The solver log is kept as `solver_log`. Log files set from outside,
+        e.g. in the directory of a background job, are not touched.
+        """
+        if self.workdir is None:
+            return
+
+        if os.path.exists(self.logpath):
+            with open(self.logpath, 'r', encoding='utf-8') as file:
+                self.solver_log = file.read()
+        WorkDirs().remove(self.workdir)
+        self.workdir = None
+        self.logpath = None
+
+    def build_model(self):
+        """Build the pyomo model of the generated oemof energy system."""
+        with self.profiler.phase('build_model'):
+            if self.aggregation is None:
+                self.model = solph.Model(self.es)
+            else:
+                self.model = solph.Model(
+                    self.es,
+                    objective_weighting=self.aggregation.weights.tolist()
+                    )
+                self.link_typical_period_storages()
+            if self.ordered_units:
+                nr_constraints = add_ordering_constraints(
+                    self.model,
+                    [
+                        [self.comps[unit] for unit in units]
+                        for units in self.ordered_units
+                        ],
+                    self.buses['hnw']
+                    )
+                logger.info(
+                    f'Added {nr_constraints} constraints to order the '
+                    + f'identical units {self.ordered_units}.'
+                    )
+            if self.aggregated_units and not self.relax_nonconvex:
+                add_count_constraints(
+                    self.model,
+                    {
+                        self.comps[units[0]]: (
+                            len(units), self.param_units[units[0]]
+                            )
+                        for units in self.aggregated_units
+                        },
+                    self.buses['hnw']
+                    )
+                logger.info(
+                    f'Aggregated the identical units {self.aggregated_units}.'
+                    )
+        self.model_params = (
+            self.data.copy(), deepcopy(self.param_units),
+            deepcopy(self.param_opt)
             )
+
+        return self.model
+
+    def apply_warm_start(self, solver):
+        """
+        Set the start values as initial solution of the built model.
+
+        Without given `start_values`, the merit-order dispatch is used as
+        start if the 'warm_start' option is set. LP relaxations and solvers
+        that can not be passed a start (see `warmstart.accepts_start`) are
+        solved without one, so no start is computed for them.
+        """
+        self.warm_started = False
+        if self.relax_nonconvex:
+            return False
+        if not accepts_start(solver):
+            if (self.start_values is not None
+                    or self.param_opt.get('warm_start') is not None):
+                logger.warning(
+                    f'Solving without start values, as {solver} can not be '
+                    + 'passed a start'
+                    + (' before highspy 1.7.' if solver == 'HiGHS' else '.')
+                    )
+            return False
+
+        if (self.start_values is None
+                and self.param_opt.get('warm_start') is not None):
+            self.start_values = heuristic_start(self)
+        if self.start_values is None:
+            return False
+
+        with self.profiler.phase('warm_start'):
+            applied = apply_start(self.model, self.start_values)
+        logger.info(f'Set start values of {applied} variables.')
+        self.warm_started = applied > 0
+
+        return self.warm_started
+
+    @profiled
+    def solve_model(self):
+        first_solve = self.model is None
+        if first_solve:
+            self.build_model()
+
+        logpath = self.init_logpath()
         if os.path.exists(logpath):
             os.remove(logpath)
 
-        tc = None
-        if self.param_opt['Solver'] == 'Gurobi':
-            options = {
-                    'MIPGap': self.param_opt['MIPGap'],
-                    'LogFile': logpath
-                    }
-            if self.param_opt['TimeLimit'] is not None:
-                options.update({'TimeLimit': self.param_opt['TimeLimit']})
-            results = self.model.solve(
-                solver='gurobi', solve_kwargs={'tee': True},
-                cmdline_options=options, allow_nonoptimal=True
-                )
-            tc = results.Solver.Termination_condition
-        elif self.param_opt['Solver'] == 'SCIP':
-            options = {
-                    'limits/gap': self.param_opt['MIPGap'],
-                    'logfile': logpath
-                    }
-            if self.param_opt['TimeLimit'] is not None:
-                options.update({'limits/time': self.param_opt['TimeLimit']})
-            results = self.model.solve(
-                solver='scip', solve_kwargs={'tee': True},
-                cmdline_options=options, allow_nonoptimal=True
-                )
-            tc = results.Solver.Termination_condition
-        elif self.param_opt['Solver'] == 'HiGHS':
-            opt = appsi.solvers.Highs()
-            opt.config.mip_gap = self.param_opt['MIPGap']
-            opt.config.logfile = logpath
-            if self.param_opt['TimeLimit'] is not None:
-                opt.config.time_limit = self.param_opt['TimeLimit']
-            # opt.config.stream_solver = True
-            # opt.highs_options['output_flag'] = True
-            # opt.highs_options['log_to_console'] = True
-            try:
-                results = opt.solve(self.model)
-            except RuntimeError:
-                results = appsi.solvers.highs.HighsResults(opt)
-            tc = results.termination_condition
+        solver = self.param_opt['Solver']
+        if solver in RACE_MODES:
+            solvers = available_solvers()
+            if not solvers:
+                logger.error('None of the supported solvers is available.')
+                return 'unknown solver error'
+            model_class = size_class(self.model)
+            if len(solvers) == 1:
+                solver = solvers[0]
+            elif solver == 'Auto':
+                solver = fastest_solver(model_class, solvers) or 'Race'
+            if solver == 'Race':
+                return self.race_solvers(solvers, model_class)
+            with open(solver_file(logpath), 'w', encoding='utf-8') as file:
+                file.write(solver)
+        if (stall_policy(self.param_opt) is not None
+                and not self.relax_nonconvex):
+            # Only solves in a separate process can be stopped at a stall
+            return self.race_solvers([solver])
+        if first_solve:
+            self.apply_warm_start(solver)
+        self.used_solver = solver
+        resource_options = solver_options(
+            solver, self.param_opt, os.path.dirname(logpath)
+            )
 
         feasable_sols = [
             TerminationCondition.optimal,
@@ -441,16 +836,330 @@ class EnergySystem():
             'infeasibleOrUnbounded',
         ]
 
+        tc = None
+        slots = SolveSlots(self.param_opt.get('SolveSlots'))
+        with self.profiler.phase('solve'), slots:
+            if solver == 'Gurobi':
+                options = {
+                        'MIPGap': self.param_opt['MIPGap'],
+                        'LogFile': logpath
+                        }
+                if self.param_opt['TimeLimit'] is not None:
+                    options.update({'TimeLimit': self.param_opt['TimeLimit']})
+                options.update(resource_options)
+                results = self.model.solve(
+                    solver='gurobi',
+                    solve_kwargs={'tee': True, 'warmstart': self.warm_started},
+                    cmdline_options=options, allow_nonoptimal=True
+                    )
+                tc = results.Solver.Termination_condition
+            elif solver == 'SCIP':
+                options = {'limits/gap': self.param_opt['MIPGap']}
+                if self.param_opt['TimeLimit'] is not None:
+                    options.update(
+                        {'limits/time': self.param_opt['TimeLimit']}
+                        )
+                options.update(resource_options)
+                # SCIP has no log file option, so pyomo writes its output.
+                # Start values are passed as initial values of the NL file.
+                results = self.model.solve(
+                    solver='scip',
+                    solve_kwargs={'tee': True, 'logfile': logpath},
+                    cmdline_options=options, allow_nonoptimal=True
+                    )
+                tc = results.Solver.Termination_condition
+            elif solver == 'HiGHS':
+                resolve = self.solver is not None
+                if not resolve:
+                    self.solver = appsi.solvers.Highs()
+                opt = self.solver
+                # Start from the start values or from the previous solution
+                # when the model is re-solved
+                opt.config.warmstart = (
+                    self.warm_started or (resolve and accepts_start(solver))
+                    )
+                if resolve and not accepts_start(solver):
+                    logger.warning(
+                        'Solving the updated model without the previous '
+                        + 'solution as start, which requires highspy 1.7.'
+                        )
+                opt.config.mip_gap = self.param_opt['MIPGap']
+                opt.config.logfile = logpath
+                if self.param_opt['TimeLimit'] is not None:
+                    opt.config.time_limit = self.param_opt['TimeLimit']
+                opt.highs_options.update(resource_options)
+                # opt.config.stream_solver = True
+                # opt.highs_options['output_flag'] = True
+                # opt.highs_options['log_to_console'] = True
+                # Load the solution only if there is one, so that infeasible
+                # models are reported as such
+                opt.config.load_solution = False
+                try:
+                    results = opt.solve(self.model)
+                except RuntimeError:
+                    results = appsi.solvers.highs.HighsResults(opt)
+                tc = results.termination_condition
+                if results.best_feasible_objective is not None:
+                    results.solution_loader.load_vars()
+                elif tc not in infeasable_sols:
+                    tc = TerminationCondition.unknown
+
+        self.progress = read_progress(logpath, solver)
+
         if tc in feasable_sols:
             return 'ok'
         elif tc in infeasable_sols:
             return 'infeasable'
         else:
-            print(f'UNKOWN SOVLER ERROR:: Termination Condition: {tc}')
+            logger.error(f'Unknown solver error with termination condition {tc}.')
             return 'unknown solver error'
 
-    def get_results(self):
-        self.results = solph.processing.results(self.model)
+    def race_solvers(self, solvers, model_class=None):
+        """
+        Solve the built model with several solvers in parallel.
+
+        The winner of the race (see `racing.race_solvers`) is recorded for
+        the size class of the model, so that the 'Auto' solver option uses
+        it for similar models later on. Its log is copied to the log file.
+        Without `model_class`, e.g. for the monitored solve of a single
+        solver with a stall policy, the winner is not recorded.
+        """
+        logpath = self.init_logpath()
+        slots = SolveSlots(self.param_opt.get('SolveSlots'))
+        with self.profiler.phase('solve'), slots:
+            solver_status, winner = race_solvers(
+                self.model, self.param_opt, solvers,
+                os.path.dirname(logpath)
+                )
+        if winner is None:
+            return solver_status
+
+        if model_class is not None:
+            record_winner(model_class, winner)
+        shutil.copyfile(
+            race_file(os.path.dirname(logpath), winner, 'log'), logpath
+            )
+        self.used_solver = winner
+        self.progress = read_progress(logpath, winner)
+
+        return solver_status
+
+    @profiled
+    def update_parameters(self, data, param_units, param_opt):
+        """
+        Update the cost parameters of an already built model in place.
+
+        If only parameters listed in `UPDATABLE_PARAM_OPT` and
+        `UPDATABLE_PARAM_UNITS` changed since the model was built, the cost
+        coefficients of the flows and investments are replaced and the
+        objective function is rebuilt, while all constraints are kept. With
+        HiGHS, the persistent solver then only updates the objective and
+        warm starts from the previous solution on the next `solve_model`.
+
+        Returns
+        -------
+
+        bool
+            True if the model was updated and can be solved again, False if
+            it has to be rebuilt from scratch.
+        """
+        if self.model is None or self.param_opt.get('rolling_horizon'):
+            return False
+
+        built_data, built_units, built_opt = self.model_params
+        if not data.equals(built_data):
+            return False
+        if built_units.keys() != param_units.keys():
+            return False
+        for unit, unit_params in param_units.items():
+            if unit_params.keys() != built_units[unit].keys():
+                return False
+            if any(
+                    unit_params[key] != built_units[unit][key]
+                    for key in unit_params.keys()
+                    if key not in UPDATABLE_PARAM_UNITS
+                    ):
+                return False
+        if any(
+                param_opt.get(key) != built_opt.get(key)
+                for key in set(param_opt.keys()) | set(built_opt.keys())
+                if key not in UPDATABLE_PARAM_OPT
+                ):
+            return False
+
+        # Build the nodes with the new parameters to obtain the coefficients
+        updated = EnergySystem(data, param_units, param_opt)
+        updated.relax_nonconvex = self.relax_nonconvex
+        updated.generate_buses()
+        updated.generate_sources()
+        updated.generate_sinks()
+        updated.generate_components()
+
+        flows = {
+            (str(i), str(o)): flow for (i, o), flow in updated.es.flows().items()
+            }
+        for (i, o), flow in self.es.flows().items():
+            flow.variable_costs = flows[(str(i), str(o))].variable_costs
+            if flow.investment is not None:
+                flow.investment.ep_costs = (
+                    flows[(str(i), str(o))].investment.ep_costs
+                    )
+        for unit, comp in self.comps.items():
+            if getattr(comp, 'investment', None) is not None:
+                comp.investment.ep_costs = updated.comps[unit].investment.ep_costs
+
+        # The cost expressions of the blocks are replaced on purpose
+        pyomo_logger = logging.getLogger('pyomo.core')
+        level = pyomo_logger.level
+        pyomo_logger.setLevel(logging.ERROR)
+        try:
+            self.model._add_objective(update=True)
+        finally:
+            pyomo_logger.setLevel(level)
+
+        if self.solver is not None:
+            # Only the objective changed, so skip scanning the constraints
+            for option in [
+                    'check_for_new_or_removed_constraints',
+                    'check_for_new_or_removed_vars',
+                    'check_for_new_or_removed_params', 'update_constraints',
+                    'update_vars', 'update_params', 'update_named_expressions'
+                    ]:
+                setattr(self.solver.update_config, option, False)
+
+        self.data = data
+        self.param_units = param_units
+        self.param_opt = param_opt
+        self.bwsf = updated.bwsf
+        if hasattr(self, 'lp_objective'):
+            # The bound refers to the previous parameters
+            del self.lp_objective
+        self.model_params = (
+            data.copy(), deepcopy(param_units), deepcopy(param_opt)
+            )
+
+        return True
+
+    @profiled
+    def solve_rolling_horizon(self, window=168, lookahead=48):
+        """
+        Solve the dispatch in consecutive overlapping time windows.
+
+        Each window of `window` hours is optimized together with the
+        following `lookahead` hours, of which only the first `window` hours
+        are kept. The storage contents at the end of the kept hours are
+        passed on as initial storage levels of the next window. As the
+        windows are only coupled by the storage contents, this is limited to
+        energy systems without capacity optimization. The storages are not
+        balanced over the entire time range, so they may be discharged at the
+        end of the last window. The stitched results
+        are stored in the same layout as by `get_results`; the key
+        parameters refer to the entire time range.
+
+        Parameters
+        ----------
+
+        window : int
+            Number of hours kept from each window.
+
+        lookahead : int
+            Number of additional hours optimized in each window.
+        """
+        if any(p['invest_mode'] for p in self.param_units.values()):
+            raise ValueError(
+                'The rolling horizon dispatch requires fixed capacities of '
+                + 'all units.'
+                )
+
+        param_units = deepcopy(self.param_units)
+        storages = [
+            unit for unit in param_units.keys()
+            if unit.rstrip('0123456789') == 'tes'
+            ]
+        for unit in storages:
+            param_units[unit]['balanced'] = False
+        param_opt = {
+            **self.param_opt, 'rolling_horizon': False, 'typical_periods': None,
+            'two_stage': False, 'lp_bound': False
+            }
+
+        window_results = []
+        for start in range(0, self.periods, window):
+            stop = min(start + window + lookahead, self.periods)
+            window_system = EnergySystem(
+                self.data.iloc[start:stop], param_units, param_opt
+                )
+            window_system.logpath = self.init_logpath()
+            window_system.profiler = self.profiler
+            solver_status = window_system.run_model()
+            if solver_status != 'ok':
+                return solver_status
+            window_system.get_results()
+
+            keep = min(window, stop - start)
+            if start + window >= self.periods:
+                # Keep the final storage contents like get_results does
+                keep += 1
+            window_results += [window_system.data_all.iloc[:keep]]
+
+            for unit in storages:
+                if param_units[unit]['Q_N'] > 0:
+                    param_units[unit]['init_storage'] = (
+                        window_system.data_all[f'storage_content_{unit}'].iloc[
+                            min(window, stop - start)
+                            ]
+                        / param_units[unit]['Q_N']
+                        )
+
+        self.model = window_system.model
+        self.data_all = pd.concat(window_results, axis=0)
+        self.data_caps = window_system.data_caps
+        self.cost_df = pd.DataFrame()
+        self.key_params = {}
+
+        return 'ok'
+
+    def link_typical_period_storages(self):
+        """Make the storage contents cyclic within every typical period."""
+        period_length = self.aggregation.period_length
+        nr_periods = len(self.aggregation.medoids)
+        storages = [
+            self.comps[unit] for unit in self.param_units.keys()
+            if unit.rstrip('0123456789') == 'tes'
+            ]
+        for block_name in ['GenericStorageBlock', 'GenericInvestmentStorageBlock']:
+            block = self.model.component(block_name)
+            if block is None:
+                continue
+            block_storages = [
+                n for n in storages if (n, 0) in block.storage_content
+                ]
+            block.typical_period_cycle = po.Constraint(
+                block_storages, range(nr_periods),
+                rule=lambda b, n, k: (
+                    b.storage_content[n, k * period_length]
+                    == b.storage_content[n, (k + 1) * period_length]
+                    )
+                )
+
+    @profiled
+    def get_results(self, results=None):
+        """
+        Extract the time series and capacities of the solved model.
+
+        Parameters
+        ----------
+
+        results : dict
+            Processed oemof results to use instead of the solution of the
+            pyomo model, e.g. of a model solved offline (see `offline`).
+        """
+        if results is None:
+            with self.profiler.phase('processing_results'):
+                self.results = solph.processing.results(self.model)
+            self.objective = po.value(self.model.objective)
+        else:
+            self.results = results
 
         # self.meta_results = solph.processing.meta_results(self.model)
 
@@ -494,23 +1203,44 @@ class EnergySystem():
                         capacity_data += [results_tes['scalars']]
 
         # Combine all data and relabel the column names
-        self.data_all = pd.concat(time_series_data, axis=1)
-        if self.data_all.iloc[-1, :].isna().values.all():
-            self.data_all.drop(self.data_all.tail(1).index, inplace=True)
-
-        result_labeling(self.data_all)
-        self.data_all = self.data_all.loc[
-            :, ~self.data_all.columns.duplicated()
-            ].copy()
+        edges = [(str(i), str(o)) for i, o in self.es.flows().keys()]
+        edges += [
+            (unit, 'None') for unit in self.param_units.keys()
+            if unit.rstrip('0123456789') == 'tes'
+            ]
+        labeldict = build_labeldict(edges)
+
+        data_all = pd.concat(time_series_data, axis=1)
+        if data_all.iloc[-1, :].isna().values.all():
+            data_all = data_all.iloc[:-1]
+
+        labels = result_labels(data_all.columns, labeldict)
+        keep = (
+            ~labels.duplicated()
+            & ~labels.str.lower().str.contains('none|status|state')
+            )
+        data_all = data_all.loc[:, keep]
+        data_all.columns = labels[keep]
+        if self.aggregated_units:
+            data_all = disaggregate(
+                data_all, self.aggregated_units, self.param_units
+                )
+        self.data_all = data_all[sorted(data_all.columns)].copy()
 
         if capacity_data:
-            self.data_caps = pd.concat(capacity_data, axis=0)
+            data_caps = pd.concat(capacity_data, axis=0)
         else:
-            self.data_caps = pd.Series()
-        result_labeling(self.data_caps)
+            data_caps = pd.Series(dtype=float)
+        labels = result_labels(data_caps.index, labeldict)
+        keep = (
+            ~labels.duplicated()
+            & ~labels.str.lower().str.contains('none|total')
+            )
+        data_caps = data_caps[keep]
+        data_caps.index = labels[keep]
 
         for unit, unit_params in self.param_units.items():
-            if f'cap_{unit}' not in self.data_caps.index:
+            if f'cap_{unit}' not in data_caps.index:
                 unit_cat = unit.rstrip('0123456789')
                 if unit_cat == 'tes':
                     param_var = 'Q_N'
@@ -518,49 +1248,21 @@ class EnergySystem():
                     param_var = 'A_N'
                 else:
                     param_var = 'cap_N'
-                self.data_caps[f'cap_{unit}'] = unit_params[param_var]
-
-        drop_cols = []
-        for col in self.data_all.columns:
-            if col is None or ('none' in str(col).lower()):
-                drop_cols.append(col)
-            elif ('status' in str(col)) or ('state' in str(col)):
-                drop_cols.append(col)
-        if drop_cols:
-            self.data_all.drop(columns=drop_cols, inplace=True)
-
-        self.data_caps = self.data_caps.to_frame().transpose()
-        self.data_caps.reset_index(inplace=True, drop=True)
-        self.data_caps = (
-            self.data_caps.loc[:,~self.data_caps.columns.duplicated()].copy()
-        )
-        drop_cols = []
-        for col in self.data_caps.columns:
-            if col is None or ('none' in str(col).lower()):
-                drop_cols.append(col)
-            elif ('total' in str(col)) or ('0' in str(col)):
-                drop_cols.append(col)
-        if drop_cols:
-            self.data_caps.drop(columns=drop_cols, inplace=True)
+                data_caps[f'cap_{unit}'] = unit_params[param_var]
 
-        try:
-            self.data_all = self.data_all.reindex(
-                sorted(self.data_all.columns), axis=1
-                )
-        except TypeError as e:
-            print(f'TypeError in sorting data_all: {e}')
+        self.data_caps = (
+            data_caps[sorted(data_caps.index)].to_frame().transpose()
+            )
+        self.data_caps.reset_index(inplace=True, drop=True)
 
-        try:
-            self.data_caps = self.data_caps.reindex(
-                sorted(self.data_caps.columns), axis=1
-                )
-        except TypeError as e:
-            print(f'TypeError in sorting data_caps: {e}')
+        if self.aggregation is not None:
+            self.data_all = self.aggregation.disaggregate(self.data_all)
 
         # Prepare economic and ecologic data containers
         self.cost_df = pd.DataFrame()
         self.key_params = {}
 
+    @profiled
     def calc_econ_params(self):
         for unit, unit_params in self.param_units.items():
             unit_cat = unit.rstrip('0123456789')
@@ -725,6 +1427,31 @@ class EnergySystem():
 
         self.key_params['total_heat_demand'] = self.data_all['Q_demand'].sum()
 
+        # %% Gap bound from the LP relaxation
+        if hasattr(self, 'lp_objective'):
+            self.key_params['objective_lp_relaxation'] = self.lp_objective
+            objective = self.objective + getattr(self, 'fixed_invest_cost', 0)
+            gap_bound = (objective - self.lp_objective) / abs(objective)
+            if hasattr(self, 'fixed_invest_cost'):
+                self.key_params['objective_two_stage'] = objective
+                self.key_params['two_stage_gap_bound'] = gap_bound
+            else:
+                self.key_params['lp_gap_bound'] = gap_bound
+
+        # %% Error estimate of time series aggregation
+        if self.aggregation is not None:
+            self.aggregation_errors = self.aggregation.errors()
+            self.key_params['LCOH_rel_error'] = (
+                self.aggregation_errors.loc['heat_demand', 'sum_rel']
+                + max(
+                    self.aggregation_errors['demand_weighted_mean_rel'].drop(
+                        'heat_demand'
+                        ),
+                    default=0.0
+                    )
+                )
+
+    @profiled
     def calc_ecol_params(self):
         self.data_all['Emissions OM'] = 0
 
@@ -762,18 +1489,159 @@ class EnergySystem():
             self.data_all['Emissions OM'].sum()
             )
 
+    @property
+    def two_stage(self):
+        """Whether the capacities are sized by `size_units_relaxed` first."""
+        return bool(
+            self.param_opt.get('two_stage')
+            and not self.relax_nonconvex
+            and any(p['invest_mode'] for p in self.param_units.values())
+            )
+
     def run_model(self):
+        if (self.param_opt.get('check_feasibility', True)
+                and not self.relax_nonconvex
+                and not self.check_feasibility()):
+            return 'infeasable'
+
+        if self.param_opt.get('rolling_horizon'):
+            return self.solve_rolling_horizon(
+                window=self.param_opt.get('rolling_window', 168),
+                lookahead=self.param_opt.get('rolling_lookahead', 48)
+                )
+
+        if self.two_stage:
+            solver_status = self.size_units_relaxed()
+            if solver_status != 'ok':
+                return solver_status
+        elif self.param_opt.get('lp_bound') and not self.relax_nonconvex:
+            solver_status, _ = self.solve_relaxation()
+            if solver_status != 'ok':
+                return solver_status
+
         self.generate_buses()
         self.generate_sources()
         self.generate_sinks()
         self.generate_components()
-        self.solve_model()
+        return self.solve_model()
+
+    @profiled
+    def diagnose_infeasibility(self):
+        """
+        Locate why the energy system is infeasible.
+
+        The energy system is solved again over the entire time series with
+        penalized slacks on the balances of the heat network and the storages
+        (see `diagnosis.add_elastic_slacks`). The slacks show in which hours
+        and by how much heat demand can not be met, heat has to be produced
+        in excess, e.g. due to minimum loads, or storage balances do not
+        hold. They are stored as `infeasibility` (see
+        `diagnosis.slack_report`).
+
+        Returns
+        -------
+
+        str
+            Solver status of the elastic model. If it is infeasible as well,
+            other constraints than the relaxed balances are violated.
+        """
+        param_opt = {
+            **self.param_opt, 'rolling_horizon': False,
+            'typical_periods': None, 'two_stage': False, 'lp_bound': False,
+            'warm_start': None, 'stall_improvement': None
+            }
+        elastic = EnergySystem(self.data, self.param_units, param_opt)
+        elastic.profiler = self.profiler
+        elastic.logpath = self.init_logpath()
+        elastic.generate_buses()
+        elastic.generate_sources()
+        elastic.generate_sinks()
+        elastic.generate_components()
+        elastic.build_model()
+        storages = {
+            unit: comp for unit, comp in elastic.comps.items()
+            if unit.rstrip('0123456789') == 'tes'
+            }
+        slacks = add_elastic_slacks(
+            elastic.model, elastic.buses['hnw'], storages
+            )
+
+        solver_status = elastic.solve_model()
+        if solver_status == 'ok':
+            self.infeasibility = slack_report(slacks, self.data.index)
+
+        return solver_status
+
+    def run_preview(self):
+        """
+        Estimate the results with a merit-order dispatch instead of a solve.
+
+        The nominal capacities of all units are dispatched by their marginal
+        heat cost (see `dispatch.merit_order_dispatch`) and postprocessed like
+        the results of a solved model. Heat demand that the units can not
+        cover is reported as 'preview_unmet_heat'.
+        """
+        self.generate_buses()
+        self.generate_sources()
+        self.generate_sinks()
+        self.generate_components(symmetry=False)
+        with self.profiler.phase('merit_order_dispatch'):
+            dispatch = merit_order_dispatch(
+                self, nominal=True, storages=True
+                )
+            results = dispatch_results(self, dispatch)
+        self.get_results(results)
+        self.calc_econ_params()
+        self.calc_ecol_params()
+        self.key_params['preview_unmet_heat'] = dispatch['unmet'].sum()
 
     def run_postprocessing(self):
-        self.get_results()
+        if not self.param_opt.get('rolling_horizon'):
+            self.get_results()
         self.calc_econ_params()
         self.calc_ecol_params()
 
+def compare_two_stage(data, param_units, param_opt):
+    """
+    Solve an energy system monolithically and with the two-stage approach.
+
+    Returns
+    -------
+
+    dict
+        Solver status, objective value and solve time of both approaches as
+        well as the relative gap of the two-stage objective to the
+        monolithic one. The objective of an approach is None unless its
+        status is 'ok', and the gap is None unless both are. The objective
+        includes the heat revenue as negative cost, so the gap is relative
+        to the absolute value of the net objective rather than to the total
+        cost.
+    """
+    comparison = {}
+    for mode in ['monolithic', 'two_stage']:
+        start = time.perf_counter()
+        energy_system = EnergySystem(
+            data, param_units, {**param_opt, 'two_stage': mode == 'two_stage'}
+            )
+        solver_status = energy_system.run_model()
+        energy_system.remove_workdir()
+        comparison[f'time_{mode}'] = time.perf_counter() - start
+        comparison[f'status_{mode}'] = solver_status
+        comparison[f'objective_{mode}'] = None
+        if solver_status == 'ok':
+            comparison[f'objective_{mode}'] = (
+                po.value(energy_system.model.objective)
+                + getattr(energy_system, 'fixed_invest_cost', 0)
+                )
+
+    comparison['gap'] = None
+    monolithic = comparison['objective_monolithic']
+    two_stage = comparison['objective_two_stage']
+    if monolithic is not None and two_stage is not None and monolithic != 0:
+        comparison['gap'] = (two_stage - monolithic) / abs(monolithic)
+
+    return comparison
+
 def calc_bwsf(i, n):
     """Berechne Barwert Summenfaktor.
     
@@ -848,167 +1716,84 @@ def calc_cost(label, E_N, param, uc, cost_df, add_var_cost=None):
 
     return cost_df
 
-def result_labeling(df, debug=True, **kwargs):
+def build_labeldict(edges):
     """
-    Relabel the column names of oemof.solve result dataframes.
+    Map the result variables of the edges of an energy system to labels.
 
     Parameters
     ----------
 
-    df : pandas.DataFrame
-        DataFrame containing the results whose column names should be relabeled.
+    edges : list(tuple(str, str))
+        Labels of the source and target node of all edges. Storage contents
+        and losses are stored with the target 'None'.
+
+    Returns
+    -------
+
+    dict
+        Dictionary of the edges containing a dictionary that maps the result
+        variables to column labels. The key None holds the label of all
+        remaining variables (None, if they are dropped).
     """
     labeldict = {}
-    if isinstance(df, pd.DataFrame):
-        for col in df.columns:
-            if not isinstance(col, tuple):
-                if debug:
-                    print(f'Edge "{col}" was skipped while labeling.')
-                continue
-            labeldict[col] = check_column(col, debug)
-        df.rename(columns=labeldict, inplace=True)
-
-    elif isinstance(df, pd.Series):
-        for col in df.index:
-            if not isinstance(col, tuple):
-                if debug:
-                    print(f'Edge "{col}" was skipped while labeling.')
-                continue
-            labeldict[col] = check_column(col, debug)
-        df.rename(index=labeldict, inplace=True)
-
-def check_column(col, debug):
-    if col[0][1] == 'heat network':
-        if col[0][0].rstrip('0123456789') == 'hp':
-            if col[1] == 'flow':
-                return f'Q_out_{col[0][0]}'
-            elif col[1] == 'invest':
-                return f'cap_{col[0][0]}'
-            elif col[1] == 'status':
-                return f'state_{col[0][0]}'
-            elif col[1] == 'status_nominal':
-                return f'state_nom_{col[0][0]}'
-            elif col[1] == 'total':
-                return f'total_{col[0][0]}'
-        elif col[0][0].rstrip('0123456789') == 'tes':
-            if col[1] == 'flow':
-                return f'Q_out_{col[0][0]}'
-            elif col[1] == 'invest':
-                return f'cap_out_{col[0][0]}'
-            elif col[1] == 'status':
-                return f'state_out_{col[0][0]}'
-            elif col[1] == 'status_nominal':
-                return f'state_nom_out_{col[0][0]}'
-            elif col[1] == 'total':
-                return f'total_out_{col[0][0]}'
-        else:
-            if col[1] == 'flow':
-                return f'Q_{col[0][0]}'
-            elif col[1] == 'invest':
-                return f'cap_{col[0][0]}'
-            elif col[1] == 'status':
-                return f'state_{col[0][0]}'
-            elif col[1] == 'status_nominal':
-                return f'state_nom_{col[0][0]}'
-            elif col[1] == 'total':
-                return f'total_{col[0][0]}'
-
-    elif col[0][0] == 'heat network':
-        if col[0][1].rstrip('0123456789') == 'tes':
-            if col[1] == 'flow':
-                return f'Q_in_{col[0][1]}'
-            elif col[1] == 'invest':
-                return f'cap_in_{col[0][1]}'
-            elif col[1] == 'status':
-                return f'state_in_{col[0][1]}'
-            elif col[1] == 'status_nominal':
-                return f'state_nom_in_{col[0][1]}'
-            elif col[1] == 'total':
-                return f'total_in_{col[0][1]}'
-        elif col[0][1] == 'heat demand':
-            return 'Q_demand'
-
-    elif col[0][1] == 'chp node':
-        if col[1] == 'flow':
-            return f'P_{col[0][0]}'
-
-    elif col[0][0] == 'electricity network':
-        if col[0][1].rstrip('0123456789') == 'hp':
-            if col[1] == 'flow':
-                return f'P_in_{col[0][1]}'
-            elif col[1] == 'status':
-                return f'state_{col[0][1]}'
-        else:
-            return f'P_{col[0][1]}'
-
-    elif col[0][0] == 'gas network':
-        return f'H_{col[0][1]}'
-
-    elif col[0][0] == 'chp node':
-        if col[0][1] == 'spotmarket':
-            return 'P_spotmarket'
-        elif col[0][1] == 'chp internal':
-            return 'P_internal'
-
-    elif col[0][0] == 'chp internal':
-        if col[0][1] == 'electricity network':
-            return 'P_internal'
-
-    elif col[0][0] == 'gas source':
-        return 'H_source'
-
-    elif col[0][0] == 'electricity source':
-        return 'P_source'
-
-    elif col[0][0].rstrip('0123456789') == 'tes' and col[0][1] == 'None':
-        if col[1] == 'storage_content':
-            return f'storage_content_{col[0][0]}'
-        elif col[1] == 'invest':
-            return f'cap_{col[0][0]}'
-        elif col[1] == 'total':
-            return f'total_{col[0][0]}'
-        elif col[1] == 'storage_losses':
-            return f'storage_losses_{col[0][0]}'
-        else:
-            return str(col)
+    for source, target in edges:
+        rules = _find_label_rules(
+            source.rstrip('0123456789'), target.rstrip('0123456789')
+            )
+        if rules is None:
+            logger.debug(f'Edge "{(source, target)}" could not be labeled.')
+            rules = {}
+
+        labeldict[(source, target)] = {
+            var: (
+                None if label is None
+                else label.format(source=source, target=target)
+                )
+            for var, label in rules.items()
+            }
 
-    else:
-        if debug:
-            print(f'Edge "{col}" could not be labeled.')
+    return labeldict
 
-# def result_labeling(df, labeldictpath='labeldict.csv'):
-#     """
-#     Relabel the column names of oemof.solve result dataframes.
 
-#     Parameters
-#     ----------
+def _find_label_rules(source_cat, target_cat):
+    for key in [
+            (source_cat, target_cat), (source_cat, '*'), ('*', target_cat)
+            ]:
+        if key in LABEL_RULES:
+            return LABEL_RULES[key]
+    return None
 
-#     df : pandas.DataFrame
-#         DataFrame containing the results whose column names should be relabeled.
-    
-#     labeldictpath : str
-#         Relative path to the labeldict csv file. Defaults to a path in the same
-#         directory.
-#     """
-#     labeldict_csv = pd.read_csv(labeldictpath, sep=';', na_filter=False)
-
-#     labeldict = dict()
-#     for idx in labeldict_csv.index:
-#         labeldict[
-#             ((labeldict_csv.loc[idx, 'name_out'],
-#               labeldict_csv.loc[idx, 'name_in']),
-#               labeldict_csv.loc[idx, 'type'])
-#             ] = labeldict_csv.loc[idx, 'label']
-
-#     if isinstance(df, pd.DataFrame):
-#         for col in df.columns:
-#             if col in labeldict.keys():
-#                 df.rename(columns={col: labeldict[col]}, inplace=True)
-#             else:
-#                 print(f'Column name "{col}" not in "{labeldictpath}".')
-#     elif isinstance(df, pd.Series):
-#         for idx in df.index:
-#             if idx in labeldict.keys():
-#                 df.rename(index={idx: labeldict[idx]}, inplace=True)
-#             else:
-#                 print(f'Column name "{idx}" not in "{labeldictpath}".')
+
+def result_labels(keys, labeldict):
+    """
+    Column labels of result keys of `oemof.solph.views.node`.
+
+    Parameters
+    ----------
+
+    keys : iterable
+        Keys of the form ((source, target), variable).
+
+    labeldict : dict
+        Labels as returned by `build_labeldict`.
+
+    Returns
+    -------
+
+    pandas.Index
+        Labels of the keys with 'none' for keys that could not be labeled.
+    """
+    labels = []
+    for key in keys:
+        if not isinstance(key, tuple):
+            logger.debug(f'Edge "{key}" was skipped while labeling.')
+            labels += ['none']
+            continue
+        rules = labeldict.get(tuple(map(str, key[0])), {})
+        label = rules.get(key[1], rules.get(None))
+        if label is None:
+            logger.debug(f'Edge "{key}" could not be labeled.')
+            label = 'none'
+        labels += [label]
+
+    return pd.Index(labels)
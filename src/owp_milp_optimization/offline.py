@@ -0,0 +1,334 @@
+"""Export of built models and import of solutions computed elsewhere."""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import pandas as pd
+from oemof.network.network import Node
+from oemof.solph import processing
+from pyomo.core import Var
+from pyomo.core.base.piecewise import IndexedPiecewise
+
+from owp_milp_optimization.batch import load_energy_system, save_results
+from owp_milp_optimization.model import EnergySystem
+from owp_milp_optimization.solverlog import read_solution
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMATS = ['mps', 'lp']
+
+MAP_FILE = 'model_map.json'
+
+
+def export_model(energy_system, path, fmt='mps'):
+    """
+    Write the built model of an energy system into a directory.
+
+    Besides the model file, the directory contains the input data of the
+    energy system and `model_map.json`, which maps the column names of the
+    model file to the variables of the oemof flows and components. A
+    solution of the model file computed by any solver can then be loaded
+    with `import_solution`.
+
+    Parameters
+    ----------
+
+    energy_system : EnergySystem
+        Energy system to export. The model is built if necessary. If
+        capacities are sized in two stages, the LP relaxation is solved first
+        and the dispatch model with fixed capacities is exported.
+
+    path : str
+        Output directory.
+
+    fmt : str
+        Format of the model file, either 'mps' or 'lp'.
+
+    Returns
+    -------
+
+    str
+        Path of the model file.
+    """
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(f'Unknown model format "{fmt}".')
+    if energy_system.param_opt.get('rolling_horizon'):
+        raise ValueError(
+            'Energy systems solved with a rolling horizon can not be '
+            + 'exported as a single model.'
+            )
+
+    if energy_system.model is None:
+        if energy_system.two_stage:
+            solver_status = energy_system.size_units_relaxed()
+            if solver_status != 'ok':
+                raise RuntimeError(
+                    f'Sizing of the capacities failed ({solver_status}).'
+                    )
+        elif energy_system.param_opt.get('lp_bound'):
+            solver_status, _ = energy_system.solve_relaxation()
+            if solver_status != 'ok':
+                raise RuntimeError(
+                    f'The LP relaxation could not be solved ({solver_status}).'
+                    )
+        energy_system.generate_buses()
+        energy_system.generate_sources()
+        energy_system.generate_sinks()
+        energy_system.generate_components()
+        energy_system.build_model()
+
+    os.makedirs(path, exist_ok=True)
+    modelpath = os.path.join(path, f'model.{fmt}')
+    with energy_system.profiler.phase('export_model'):
+        _, smap_id = energy_system.model.write(
+            modelpath, io_options={'symbolic_solver_labels': False}
+            )
+        symbol_map = energy_system.model.solutions.symbol_map[smap_id]
+        model_map = {
+            'format': fmt,
+            'variables': _variable_map(
+                energy_system.model, symbol_map.byObject
+                )
+            }
+    if hasattr(energy_system, 'lp_objective'):
+        model_map['lp_objective'] = energy_system.lp_objective
+    if hasattr(energy_system, 'fixed_invest_cost'):
+        model_map['fixed_invest_cost'] = energy_system.fixed_invest_cost
+
+    with open(os.path.join(path, MAP_FILE), 'w', encoding='utf-8') as file:
+        json.dump(model_map, file)
+
+    # Sized capacities of a two-stage solve are part of the unit parameters
+    energy_system.data.to_csv(os.path.join(path, 'data_input.csv'), sep=';')
+    with open(os.path.join(path, 'param_opt.json'), 'w') as file:
+        json.dump(energy_system.param_opt, file, indent=4, sort_keys=True)
+    with open(os.path.join(path, 'param_units.json'), 'w') as file:
+        json.dump(energy_system.param_units, file, indent=4, sort_keys=True)
+
+    return modelpath
+
+
+def _variable_map(model, symbols):
+    # Block, name, index, column name and fixed value of all variables, named
+    # like `oemof.solph.processing.create_dataframe` does
+    variables = []
+    for var in model.component_data_objects(Var):
+        component = var.parent_component()
+        if isinstance(component.parent_block().parent_component(),
+                      IndexedPiecewise):
+            continue
+        name = str(component).split('.')
+        column = symbols.get(id(var))
+        # Fixed variables are substituted by constants in the model file
+        fixed = var.value if var.fixed else None
+        if column is None and fixed is None:
+            continue
+        variables += [
+            [name[0], name[-1], _encode_index(var.index()), column, fixed]
+            ]
+
+    return variables
+
+
+def _encode_index(index):
+    if isinstance(index, tuple):
+        return [_encode_index(i) for i in index]
+    if isinstance(index, Node):
+        return {'node': index.label}
+    return index
+
+
+def _decode_index(index, nodes):
+    if isinstance(index, list):
+        return tuple(_decode_index(i, nodes) for i in index)
+    if isinstance(index, dict):
+        return nodes[index['node']]
+    return index
+
+
+def solution_results(energy_system, model_map, values):
+    """
+    Create the oemof results of a solution without a pyomo model.
+
+    Parameters
+    ----------
+
+    energy_system : EnergySystem
+        Energy system with generated oemof nodes.
+
+    model_map : dict
+        Variable map as written by `export_model`.
+
+    values : dict
+        Values of the columns of the model file.
+
+    Returns
+    -------
+
+    dict
+        Results as returned by `oemof.solph.processing.results`.
+    """
+    nodes = {node.label: node for node in energy_system.es.nodes}
+    var_dict = {}
+    for block, name, index, column, fixed in model_map['variables']:
+        key = (block, name, _decode_index(index, nodes))
+        var_dict[key] = fixed if column is None else values.get(column)
+
+    # Same steps as `oemof.solph.processing.create_dataframe`
+    df = pd.DataFrame(list(var_dict.items()), columns=['pyomo_tuple', 'value'])
+    df['variable_name'] = df['pyomo_tuple'].str[1]
+    df['oemof_tuple'] = df['pyomo_tuple'].map(processing.get_tuple)
+    df = df[df['oemof_tuple'].map(lambda x: x is not None)]
+    df['timestep'] = df['oemof_tuple'].map(processing.get_timestep)
+    df['oemof_tuple'] = df['oemof_tuple'].map(processing.remove_timestep)
+    df.loc[df['variable_name'] == 'flow', 'oemof_tuple'] = df.loc[
+        df['variable_name'] == 'flow', 'oemof_tuple'
+        ].map(processing.remove_timestep)
+    df = df.sort_values(['oemof_tuple', 'timestep'], ascending=[True, True])
+    df = df.dropna(subset=['value'])
+
+    # Same steps as `oemof.solph.processing.results` for a standard model
+    df_dict = {
+        k if len(k) > 1 else (k[0], None): v[
+            ['timestep', 'variable_name', 'value']
+            ]
+        for k, v in df.groupby('oemof_tuple')
+        }
+
+    return processing._extract_standard_model_result(
+        df_dict, {}, energy_system.es.timeindex, False
+        )
+
+
+def _load_solution(energy_system, model_map, solution_file):
+    columns = [
+        column for _, _, _, column, _ in model_map['variables']
+        if column is not None
+        ]
+    objective, values = read_solution(solution_file, columns)
+    missing = [column for column in columns if column not in values]
+    if missing:
+        raise ValueError(
+            f'Solution file "{solution_file}" lacks {len(missing)} of the '
+            + 'model columns.'
+            )
+
+    return objective, solution_results(energy_system, model_map, values)
+
+
+def import_solution(path, solution_file):
+    """
+    Postprocess a solution of a model written by `export_model`.
+
+    Only the oemof energy system is generated from the exported input data,
+    the pyomo model is not built again.
+
+    Parameters
+    ----------
+
+    path : str
+        Directory written by `export_model`.
+
+    solution_file : str
+        Solution of the model file (see `read_solution`).
+
+    Returns
+    -------
+
+    EnergySystem
+        Energy system with the results of the solution.
+    """
+    with open(os.path.join(path, MAP_FILE), 'r', encoding='utf-8') as file:
+        model_map = json.load(file)
+    data, param_units, param_opt = load_energy_system(path)
+
+    energy_system = EnergySystem(data, param_units, param_opt)
+    energy_system.generate_buses()
+    energy_system.generate_sources()
+    energy_system.generate_sinks()
+    energy_system.generate_components()
+
+    with energy_system.profiler.phase('load_solution'):
+        objective, results = _load_solution(
+            energy_system, model_map, solution_file
+            )
+    if 'lp_objective' in model_map:
+        energy_system.lp_objective = model_map['lp_objective']
+    if 'fixed_invest_cost' in model_map:
+        energy_system.fixed_invest_cost = model_map['fixed_invest_cost']
+
+    energy_system.get_results(results)
+    energy_system.objective = objective
+    energy_system.calc_econ_params()
+    energy_system.calc_ecol_params()
+
+    return energy_system
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=(
+            'Export saved energy systems as MPS or LP files and import '
+            + 'solutions computed with external solvers.'
+            )
+        )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser(
+        'export', help='Write the model of a saved energy system.'
+        )
+    export_parser.add_argument(
+        'source', help='Saved energy system (zip archive or directory).'
+        )
+    export_parser.add_argument(
+        '-o', '--output', default='model',
+        help='Output directory of the model (default: "model").'
+        )
+    export_parser.add_argument(
+        '--format', choices=MODEL_FORMATS, default='mps',
+        help='Format of the model file (default: mps).'
+        )
+
+    import_parser = subparsers.add_parser(
+        'import', help='Postprocess a solution of an exported model.'
+        )
+    import_parser.add_argument(
+        'model', help='Directory written by the export command.'
+        )
+    import_parser.add_argument(
+        'solution', help='Solution file of the model.'
+        )
+    import_parser.add_argument(
+        '-o', '--output', default='results',
+        help='Output directory for the results (default: "results").'
+        )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s'
+        )
+
+    if args.command == 'export':
+        data, param_units, param_opt = load_energy_system(args.source)
+        energy_system = EnergySystem(data, param_units, param_opt)
+        try:
+            modelpath = export_model(
+                energy_system, args.output, args.format
+                )
+        finally:
+            # Created by the solves of the LP relaxation or the sizing
+            energy_system.remove_workdir()
+        logger.info(f'Wrote model to "{modelpath}".')
+    else:
+        energy_system = import_solution(args.model, args.solution)
+        save_results(energy_system, args.output)
+        logger.info(f'Wrote results to "{args.output}".')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
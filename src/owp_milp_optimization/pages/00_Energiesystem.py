@@ -2,17 +2,21 @@ import base64
 import datetime as dt
 import json
 import os
-import shutil
-import zipfile
 from copy import deepcopy
 
 import altair as alt
 import pandas as pd
 import pyomo.environ as pyo
 import streamlit as st
-from helpers import footer, format_sep, load_icon_base64s
+from batch import load_energy_system
+from feasibility import check_feasibility
+from helpers import (
+    feasibility_messages, footer, format_sep, load_icon_base64s,
+    shared_input_database
+    )
 from pyomo.contrib.appsi.solvers import Highs
 from pyomo.opt import check_available_solvers
+from racing import RACE_MODES, available_solvers
 from streamlit import session_state as ss
 
 st.set_page_config(
@@ -20,25 +24,6 @@ st.set_page_config(
     page_icon=os.path.join(os.path.dirname(__file__), '..', 'img',  'page_icon_ZNES.png')
     )
 
-# %% MARK: Read Input Data
-@st.cache_data
-def read_input_data():
-    '''Read in input data all at once.'''
-    inputpath = os.path.abspath(os.path.join(
-        os.path.dirname(__file__), '..', 'input'
-        ))
-    all_heat_load = pd.read_csv(
-        os.path.join(inputpath, 'heat_load.csv'),
-        sep=';', index_col=0, parse_dates=True
-        )
-    eco_data = pd.read_csv(
-        os.path.join(inputpath, 'eco_data.csv'),
-        sep=';', index_col=0, parse_dates=True
-        )
-
-    return all_heat_load, eco_data
-
-
 def init_ss_widget(widget_key, ss_variable, default_value):
     """
     Make widget stateful.
@@ -100,18 +85,11 @@ longnames = {
     'tes': 'Wärmespeicher'
 }
 
+# %% MARK: Read Input Data
 if 'eco_data' not in ss:
-    ss.all_heat_load, ss.eco_data = read_input_data()
-
-    ss.all_el_prices = ss.eco_data['el_spot_price'].to_frame()
-    ss.all_el_emissions = ss.eco_data['ef_om'].to_frame()
-    ss.all_gas_prices = ss.eco_data['gas_price'].to_frame()
-    ss.all_co2_prices = ss.eco_data['co2_price'].to_frame()
-    ss.all_solar_heat_flow = ss.eco_data[[
-        'solar_heat_flow_schleswig',
-        'solar_heat_flow_chemnitz',
-        'solar_heat_flow_stuttgart'
-    ]]
+    # References to the shared frames, which are not copied per session
+    for key, frame in shared_input_database().items():
+        ss[key] = frame
 
 unitpath = os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..', 'input', 'param_units.json')
@@ -715,32 +693,10 @@ with tab_system:
         help=ss.tt['own_es'], key='own_es'
     )
     if esfile is not None:
-        tmppath = os.path.abspath(
-            os.path.join(
-                os.path.dirname(__file__), '..', '_tmp'
-            )
-        )
-        if not os.path.exists(tmppath):
-            os.mkdir(tmppath)
-
-        zippath = os.path.join(tmppath, esfile.name.split('.')[0])
-        with zipfile.ZipFile(esfile, 'r') as z:
-            z.extractall(zippath)
-
-        tspath = os.path.join(zippath, 'data_input.csv')
-        ss.data = pd.read_csv(tspath, sep=';', index_col=0, parse_dates=True)
-
-        optpath = os.path.join(zippath, 'param_opt.json')
-        with open(optpath, 'r', encoding='utf-8') as file:
-            ss.param_opt = json.load(file)
-
-        unitpath = os.path.join(zippath, 'param_units.json')
-        with open(unitpath, 'r', encoding='utf-8') as file:
-            ss.param_units = json.load(file)
+        ss.data, ss.param_units, ss.param_opt = load_energy_system(esfile)
 
         ss.units = [longnames[u] for u in ss.param_units.keys()]
 
-        shutil.rmtree(tmppath)
         own_es = True
 
 # %% MARK: Unit Parameters
@@ -2044,13 +2000,26 @@ with tab_misc:
         ss_variable='solver',
         default_value='Gurobi'
     )
+    solver_labels = {
+        'Race': 'Wettlauf aller Solver', 'Auto': 'Automatische Auswahl'
+        }
     ss.solver = col_opt.selectbox(
-        'Solver', options=['Gurobi', 'SCIP', 'HiGHS'], help=ss.tt['solver'],
-        key='select_solver'
+        'Solver', options=['Gurobi', 'SCIP', 'HiGHS'] + RACE_MODES,
+        format_func=lambda solver: solver_labels.get(solver, solver),
+        help=ss.tt['solver'], key='select_solver'
         )
     ss.param_opt['Solver'] = ss.solver
 
-    if ss.param_opt['Solver'] == 'HiGHS':
+    if ss.param_opt['Solver'] in RACE_MODES:
+        solvers = available_solvers()
+        if not solvers:
+            col_opt.error(
+                'Auf diesem System ist keiner der unterstützten Solver '
+                + 'verfügbar.'
+                )
+        else:
+            col_opt.info('Verfügbare Solver: ' + ', '.join(solvers))
+    elif ss.param_opt['Solver'] == 'HiGHS':
         if not Highs().available():
             col_opt.error(
                 'Der Solver `HiGHS` ist auf diesem System nicht verfügbar. '
@@ -2099,6 +2068,237 @@ with tab_misc:
     else:
         ss.param_opt['TimeLimit'] = None
 
+    init_ss_widget(
+        widget_key='toggle_stall',
+        ss_variable='stop_at_stall',
+        default_value=False
+    )
+    ss.stop_at_stall = col_opt.toggle(
+        'Bei Stillstand abbrechen',
+        help=ss.tt['toggle_stall'],
+        key='toggle_stall'
+        )
+    if ss.stop_at_stall:
+        init_ss_widget(
+            widget_key='num_input_stall_improvement',
+            ss_variable='stall_improvement',
+            default_value=0.1
+        )
+        ss.stall_improvement = col_opt.number_input(
+            'Mindestverbesserung des MIP Gaps in %-Punkten pro Minute',
+            min_value=0.001, step=0.05, format='%.3f',
+            key='num_input_stall_improvement'
+            )
+        init_ss_widget(
+            widget_key='num_input_stall_window',
+            ss_variable='stall_window',
+            default_value=2.0
+        )
+        ss.stall_window = col_opt.number_input(
+            'Beobachtungszeitraum in Minuten', min_value=0.5, step=0.5,
+            help=ss.tt['stall_window'], key='num_input_stall_window'
+            )
+        ss.param_opt['stall_improvement'] = float(ss.stall_improvement)
+        ss.param_opt['stall_window'] = float(ss.stall_window)
+    else:
+        ss.param_opt['stall_improvement'] = None
+
+    init_ss_widget(
+        widget_key='toggle_resources',
+        ss_variable='is_resource_limited',
+        default_value=False
+    )
+    ss.is_resource_limited = col_opt.toggle(
+        'Rechenressourcen begrenzen',
+        help=ss.tt['toggle_resources'],
+        key='toggle_resources'
+        )
+    if ss.is_resource_limited:
+        init_ss_widget(
+            widget_key='num_input_Threads',
+            ss_variable='Threads',
+            default_value=max(1, (os.cpu_count() or 2) // 2)
+        )
+        ss.Threads = col_opt.number_input(
+            'Anzahl Threads', min_value=1, step=1,
+            key='num_input_Threads'
+            )
+        init_ss_widget(
+            widget_key='num_input_MemoryLimit',
+            ss_variable='MemoryLimit',
+            default_value=8.0
+        )
+        ss.MemoryLimit = col_opt.number_input(
+            'Arbeitsspeicher in GB', min_value=0.5, step=0.5,
+            help=ss.tt['MemoryLimit'], key='num_input_MemoryLimit'
+            )
+        init_ss_widget(
+            widget_key='num_input_SolveSlots',
+            ss_variable='SolveSlots',
+            default_value=2
+        )
+        ss.SolveSlots = col_opt.number_input(
+            'Gleichzeitige Optimierungen auf dem Rechner', min_value=1,
+            step=1, help=ss.tt['SolveSlots'], key='num_input_SolveSlots'
+            )
+        ss.param_opt['Threads'] = int(ss.Threads)
+        ss.param_opt['MemoryLimit'] = float(ss.MemoryLimit)
+        ss.param_opt['SolveSlots'] = int(ss.SolveSlots)
+    else:
+        ss.param_opt['Threads'] = None
+        ss.param_opt['MemoryLimit'] = None
+        ss.param_opt['SolveSlots'] = None
+
+    init_ss_widget(
+        widget_key='toggle_typical_periods',
+        ss_variable='use_typical_periods',
+        default_value=False
+    )
+    ss.use_typical_periods = col_opt.toggle(
+        'Zeitreihen zu Typperioden aggregieren',
+        help=ss.tt['toggle_typical_periods'],
+        key='toggle_typical_periods'
+        )
+    if ss.use_typical_periods:
+        init_ss_widget(
+            widget_key='select_period_type',
+            ss_variable='period_type',
+            default_value='Typtage'
+        )
+        ss.period_type = col_opt.selectbox(
+            'Art der Typperioden', options=['Typtage', 'Typwochen'],
+            key='select_period_type'
+            )
+        if ss.period_type == 'Typtage':
+            ss.param_opt['period_length'] = 24
+        else:
+            ss.param_opt['period_length'] = 168
+
+        max_periods = max(
+            1, len(ss.data.index) // ss.param_opt['period_length']
+            )
+        init_ss_widget(
+            widget_key='num_input_typical_periods',
+            ss_variable='nr_typical_periods',
+            default_value=min(12, max_periods)
+        )
+        ss['num_input_typical_periods'] = min(
+            ss['num_input_typical_periods'], max_periods
+            )
+        ss.nr_typical_periods = col_opt.number_input(
+            'Anzahl der Typperioden', min_value=1, max_value=max_periods,
+            step=1, help=ss.tt['nr_typical_periods'],
+            key='num_input_typical_periods'
+            )
+        ss.param_opt['typical_periods'] = int(ss.nr_typical_periods)
+    else:
+        ss.param_opt['typical_periods'] = None
+
+    if any(p['invest_mode'] for p in ss.param_units.values()):
+        init_ss_widget(
+            widget_key='toggle_two_stage',
+            ss_variable='two_stage',
+            default_value=False
+        )
+        ss.two_stage = col_opt.toggle(
+            'Zweistufige Optimierung',
+            help=ss.tt['toggle_two_stage'],
+            key='toggle_two_stage'
+            )
+        ss.param_opt['two_stage'] = ss.two_stage
+    else:
+        ss.param_opt['two_stage'] = False
+
+    if (not ss.use_typical_periods
+            and not any(p['invest_mode'] for p in ss.param_units.values())):
+        init_ss_widget(
+            widget_key='toggle_rolling_horizon',
+            ss_variable='rolling_horizon',
+            default_value=False
+        )
+        ss.rolling_horizon = col_opt.toggle(
+            'Rollierende Einsatzoptimierung',
+            help=ss.tt['toggle_rolling_horizon'],
+            key='toggle_rolling_horizon'
+            )
+        if ss.rolling_horizon:
+            init_ss_widget(
+                widget_key='num_input_rolling_window',
+                ss_variable='rolling_window',
+                default_value=7
+            )
+            ss.rolling_window = col_opt.number_input(
+                'Länge der Zeitfenster in Tagen', min_value=1, step=1,
+                help=ss.tt['rolling_window'],
+                key='num_input_rolling_window'
+                )
+            init_ss_widget(
+                widget_key='num_input_rolling_lookahead',
+                ss_variable='rolling_lookahead',
+                default_value=2
+            )
+            ss.rolling_lookahead = col_opt.number_input(
+                'Vorausschau in Tagen', min_value=0, step=1,
+                help=ss.tt['rolling_lookahead'],
+                key='num_input_rolling_lookahead'
+                )
+            ss.param_opt['rolling_window'] = int(ss.rolling_window) * 24
+            ss.param_opt['rolling_lookahead'] = (
+                int(ss.rolling_lookahead) * 24
+                )
+        ss.param_opt['rolling_horizon'] = ss.rolling_horizon
+    else:
+        ss.param_opt['rolling_horizon'] = False
+
+    if not ss.param_opt['two_stage'] and not ss.param_opt['rolling_horizon']:
+        init_ss_widget(
+            widget_key='toggle_lp_bound',
+            ss_variable='lp_bound',
+            default_value=True
+        )
+        ss.lp_bound = col_opt.toggle(
+            'Untere Schranke aus LP-Relaxierung',
+            help=ss.tt['toggle_lp_bound'],
+            key='toggle_lp_bound'
+            )
+        ss.param_opt['lp_bound'] = ss.lp_bound
+    else:
+        ss.param_opt['lp_bound'] = False
+
+    warm_start_modes = {
+        'Keine': None,
+        'Merit-Order-Einsatz': 'heuristic',
+        'Letzte ähnliche Lösung': 'previous'
+        }
+    init_ss_widget(
+        widget_key='select_warm_start',
+        ss_variable='warm_start',
+        default_value='Keine'
+    )
+    ss.warm_start = col_opt.selectbox(
+        'Startlösung', options=list(warm_start_modes),
+        help=ss.tt['warm_start'], key='select_warm_start'
+        )
+    ss.param_opt['warm_start'] = warm_start_modes[ss.warm_start]
+
+    identical_unit_modes = {
+        'Zusammenfassen': 'aggregate',
+        'Ordnen': 'order',
+        'Keine Behandlung': None
+        }
+    init_ss_widget(
+        widget_key='select_identical_units',
+        ss_variable='identical_units',
+        default_value='Zusammenfassen'
+    )
+    ss.identical_units = col_opt.selectbox(
+        'Identische Anlagen', options=list(identical_unit_modes),
+        help=ss.tt['identical_units'], key='select_identical_units'
+        )
+    ss.param_opt['identical_units'] = (
+        identical_unit_modes[ss.identical_units]
+        )
+
     st.markdown('''---''')
 
     with st.container(border=True):
@@ -2108,41 +2308,15 @@ with tab_misc:
             )
 
 # %%: Troubleshooting
-Q_tot_max = 0
-residual_heat_demand = heat_load.copy()
-for unit, unit_params in ss.param_units.items():
-    unit_cat = unit.rstrip('0123456789')
-    if unit_params['invest_mode']:
-        if unit_cat not in ['sol', 'tes']:
-            Q_tot_max += unit_params['cap_max']
-        elif unit_cat == 'sol':
-            residual_heat_demand['heat_demand'] -= (
-                unit_params['A_max'] * solar_heat_flow['solar_heat_flow']
-                )
-        elif unit_cat == 'tes':
-            Q_tot_max += unit_params['Q_max'] * unit_params['Q_out_to_cap']
-    else:
-        if unit_cat not in ['sol', 'tes']:
-            Q_tot_max += unit_params['cap_N']
-        elif unit_cat == 'sol':
-            residual_heat_demand['heat_demand'] -= (
-                unit_params['A_N'] * solar_heat_flow['solar_heat_flow']
-                )
-        elif unit_cat == 'tes':
-            Q_tot_max += unit_params['Q_N'] * unit_params['Q_out_to_cap']
-
-if Q_tot_max != 0:
-    if residual_heat_demand['heat_demand'].max() > Q_tot_max:
-        placeholder_infeasable.error(
-            'Die gewählten Wärmeanlagen genügen nicht um den maximalen '
-            + 'Wärmebedarf zu decken. Mögliche Ansätze zur Lösung des '
-            + 'Problems könnten sein:\n\n'
-            + '- Erhöhe die installierte oder maximal zu installierende'
-            + ' Leistung der Anlagen\n\n'
-            + '- Füge andere Anlagen hinzu oder erhöhe die Anzahl der '
-            + 'vorhandenen Anlagen\n\n'
-            + '- Füge einen Wärmespeicher hinzu'
-            )
+if ss.param_units:
+    issues = check_feasibility(ss.data, ss.param_units)
+    if not issues.empty:
+        with placeholder_infeasable.container():
+            for severity, message in feasibility_messages(issues, longnames):
+                if severity == 'error':
+                    st.error(message)
+                else:
+                    st.warning(message)
 
 # %% MARK: Footer
 icon_path = os.path.join(os.path.dirname(__file__), '..', 'img', 'icons')
@@ -5,9 +5,17 @@ import shutil
 
 import pandas as pd
 import streamlit as st
-from helpers import footer, load_icon_base64s
+from batch import run_energy_system
+from cache import ResultCache, restore_results
+from diagnosis import summarize
+from feasibility import check_feasibility
+from helpers import (
+    convergence_chart, feasibility_messages, footer, format_sep,
+    infeasibility_chart, load_icon_base64s, shared_job_manager
+    )
 from model import EnergySystem
 from streamlit import session_state as ss
+from workdir import WorkDirs
 
 st.set_page_config(
     layout='wide',
@@ -17,18 +25,10 @@ st.set_page_config(
 @st.dialog('Energiesystem lokal speichern')
 def download_energy_system():
     """Temporarely save data and zip it, then let user download zip archive."""
-    with st.spinner('Daten werden verarbeitet...'):
-        tmppath = os.path.abspath(
-            os.path.join(
-                os.path.dirname(__file__), '..', '_tmp'
-            )
-        )
-        if not os.path.exists(tmppath):
-            os.mkdir(tmppath)
-
+    with st.spinner('Daten werden verarbeitet...'), \
+            WorkDirs().session('export') as tmppath:
         zippath = os.path.join(tmppath, 'energysystem')
-        if not os.path.exists(zippath):
-            os.mkdir(zippath)
+        os.mkdir(zippath)
 
         tspath = os.path.join(zippath, 'data_input.csv')
         ss.data.to_csv(tspath, sep=';')
@@ -43,15 +43,83 @@ def download_energy_system():
 
         shutil.make_archive(zippath, 'zip', zippath)
 
-    with open(f'{zippath}.zip', 'rb') as file:
-        btn = st.download_button(
-            label='Speichere dein Energiesystem',
-            data=file,
-            file_name='Energiesystem',
-            mime='application/zip'
-        )
+        with open(f'{zippath}.zip', 'rb') as file:
+            zipdata = file.read()
+
+    btn = st.download_button(
+        label='Speichere dein Energiesystem',
+        data=zipdata,
+        file_name='Energiesystem',
+        mime='application/zip'
+    )
+
+tooltippath = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'input', 'tooltips.json')
+    )
+with open(tooltippath, 'r', encoding='utf-8') as file:
+    ss.tt = json.load(file)
+
+job_status_labels = {
+    'queued': 'In der Warteschlange',
+    'running': 'Optimierung läuft',
+    }
+
+
+@st.fragment(run_every=2)
+def show_solve_job():
+    """Poll the background solve of this session and show its progress."""
+    job_manager = shared_job_manager()
+    job = job_manager.job(ss.solve_job)
+    if job is None:
+        ss.pop('solve_job')
+        st.rerun()
+
+    status = job.status
+    if status in job_status_labels:
+        st.markdown(f'**{job_status_labels[status]}**')
+        if status == 'queued':
+            st.caption(
+                'Position in der Warteschlange: '
+                + f'{job_manager.queue_position(job.id) + 1}'
+                )
+            if st.button('Optimierung abbrechen', key='cancel_solve_job'):
+                job_manager.cancel(job.id)
+                st.rerun()
+        else:
+            progress = job.progress()
+            if progress.empty:
+                st.caption('Das Modell wird erzeugt.')
+                return
+            last = progress.iloc[-1]
+            st.caption(f'Fortschritt von {job.progress_solver}')
+            col_inc, col_bound, col_gap, col_time = st.columns(4)
+            col_inc.metric('Beste Lösung', f"{last['incumbent']:,.0f}")
+            col_bound.metric('Beste Schranke', f"{last['bound']:,.0f}")
+            col_gap.metric('Gap', f"{last['gap']:.2f} %")
+            col_time.metric('Rechenzeit', f"{last['time']:.0f} s")
+            st.altair_chart(convergence_chart(progress), width='stretch')
+        return
+
+    if status == 'done':
+        ss.job_solver_status = job.solver_status
+        if job.solver_status == 'infeasable':
+            ss.infeasibility = job.infeasibility
+        if job.solver_status == 'ok':
+            ss.energy_system = EnergySystem(
+                job.data, job.param_units, job.param_opt, prepare=False
+                )
+            restore_results(
+                ss.energy_system, job.result, cached=job.result['cached']
+                )
+    elif status == 'failed':
+        ss.job_error = str(job.error)
+    else:
+        ss.job_error = 'Die Optimierung wurde abgebrochen.'
+
+    job_manager.forget(job.id)
+    ss.pop('solve_job')
+    st.rerun()
 
-    shutil.rmtree(tmppath)
 
 shortnames = {
     'Wärmepumpe': 'hp',
@@ -64,6 +132,54 @@ shortnames = {
     'Wärmespeicher': 'tes'
 }
 
+
+def show_infeasibility(report):
+    """Show where the diagnosis of an infeasible energy system found slacks."""
+    summary = summarize(report)
+    if summary.empty:
+        st.info(
+            'Die Analyse hat keine Abweichungen in den Wärme- und '
+            + 'Speicherbilanzen gefunden.'
+            )
+        return
+
+    longnames = {short: long for long, short in shortnames.items()}
+    labels = {
+        'unmet_heat': 'Ungedeckter Wärmebedarf',
+        'excess_heat': 'Überschüssige Wärme'
+        }
+    messages = []
+    for col, (hours, total, peak) in summary.iterrows():
+        if col == 'unmet_heat':
+            messages += [
+                f'- In {hours:.0f} Stunden kann der Wärmebedarf nicht gedeckt '
+                + f'werden (insgesamt {format_sep(total)} MWh). Es fehlt eine '
+                + f'Wärmeleistung von mindestens {format_sep(peak)} MW.'
+                ]
+        elif col == 'excess_heat':
+            messages += [
+                f'- In {hours:.0f} Stunden wird mehr Wärme erzeugt, als '
+                + f'abgenommen werden kann (insgesamt {format_sep(total)} '
+                + f'MWh, maximal {format_sep(peak)} MW), z.B. aufgrund der '
+                + 'Mindestteillasten.'
+                ]
+        else:
+            unit = col[len('storage_'):]
+            unit_cat = unit.rstrip('0123456789')
+            labels[col] = (
+                f'{longnames[unit_cat]} {unit[len(unit_cat):]}'.strip()
+                )
+            messages += [
+                f'- Die Speicherbilanz von {labels[col]} kann in {hours:.0f} '
+                + f'Stunden nicht eingehalten werden (insgesamt '
+                + f'{format_sep(total)} MWh). Überprüfe die Parameter des '
+                + 'Speichers.'
+                ]
+
+    st.markdown('**Analyse der Unzulässigkeit**')
+    st.markdown('\n'.join(messages))
+    st.altair_chart(infeasibility_chart(report, labels), width='stretch')
+
 # %% MARK: Sidebar
 with st.sidebar:
     st.subheader('Offene Wärmespeicherplanung')
@@ -190,6 +306,17 @@ elif ss.param_opt['calc_network'] == 'total':
             'calc_network', 'net_op_cost_fix_total', 'net_op_cost_var_total'
             ], inplace=True
         )
+param_overview.drop(
+    index=[
+        'typical_periods', 'period_length', 'two_stage', 'rolling_horizon',
+        'rolling_window', 'rolling_lookahead', 'warm_start', 'tighten_bounds',
+        'identical_units', 'Threads', 'MemoryLimit', 'SolveSlots',
+        'stall_improvement', 'stall_window', 'lp_bound',
+        'diagnose_infeasibility', 'check_feasibility'
+        ],
+    errors='ignore',
+    inplace=True
+    )
 param_overview.loc['ef_gas'] *= 1000
 param_overview.loc['capital_interest'] *= 100
 param_overview.rename(
@@ -270,31 +397,52 @@ if reset_es:
 
 with st.container(border=True):
     solver_status = None
-    opt = st.button(label='🖥️**Optimierung starten**', width='stretch')
-    if opt:
+    background = st.toggle(
+        'Im Hintergrund optimieren', value=True, key='toggle_background',
+        help=ss.tt['toggle_background']
+        )
+    opt = st.button(
+        label='🖥️**Optimierung starten**', width='stretch',
+        disabled='solve_job' in ss
+        )
+    preview = st.button(
+        label='⚡ Schnellabschätzung (Merit-Order)', width='stretch',
+        help=ss.tt['button_preview'], disabled='solve_job' in ss
+        )
+    if preview:
+        ss.energy_system = EnergySystem(ss.data, ss.param_units, ss.param_opt)
+        ss.energy_system.run_preview()
+        solver_status = 'ok'
+        st.toast('Schnellabschätzung ist durchgeführt', duration=8)
+    elif opt and background:
+        ss.solve_job = shared_job_manager().submit(
+            ss.data, ss.param_units, ss.param_opt
+            )
+        st.toast('Optimierung ist in der Warteschlange', duration=8)
+    elif opt:
         with st.spinner('Optimierung wird durchgeführt...'):
-            ss.energy_system = EnergySystem(
-                ss.data, ss.param_units, ss.param_opt
+            # The built model is solved again if only cost parameters changed
+            ss.energy_system, solver_status = run_energy_system(
+                ss.data, ss.param_units, ss.param_opt, cache=ResultCache(),
+                reuse=ss.get('energy_system')
                 )
-            st.toast('Energiesystem ist initialisiert', duration=8)
-
-            ss.energy_system.generate_buses()
-            ss.energy_system.generate_sources()
-            ss.energy_system.generate_sinks()
-            ss.energy_system.generate_components()
-            st.toast('Modell ist erzeugt', duration=8)
-
-            st.toast('Optimierung ist gestartet', duration=8)
-            solver_status = ss.energy_system.solve_model()
-
-            if solver_status == 'ok':
+            if getattr(ss.energy_system, 'cached', False):
+                st.toast('Ergebnisse wurden aus dem Cache geladen', duration=8)
+            elif solver_status == 'ok':
                 st.toast('Optimierungsproblem ist gelöst', duration=8)
-                ss.energy_system.get_results()
-                st.toast('Ergebnisse sind ausgelesen', duration=8)
+            elif solver_status == 'infeasable':
+                ss.infeasibility = ss.energy_system.infeasibility
+
+    if 'solve_job' in ss:
+        show_solve_job()
 
-                ss.energy_system.calc_econ_params()
-                ss.energy_system.calc_ecol_params()
-                st.toast('Postprocessing ist durchgeführt', duration=8)
+    if 'job_solver_status' in ss:
+        solver_status = ss.pop('job_solver_status')
+    if 'job_error' in ss:
+        st.error(
+            'Bei der Optimierung ist ein Fehler aufgetreten.\n\n'
+            + ss.pop('job_error')
+            )
 
 if solver_status is not None:
     if solver_status == 'infeasable':
@@ -309,20 +457,29 @@ if solver_status is not None:
             + '- Füge einen Wärmespeicher hinzu\n\n'
             + '- Füge eine flexible externe Wärmequelle hinzu\n\n'
             )
+        longnames = {short: long for long, short in shortnames.items()}
+        issues = check_feasibility(ss.data, ss.param_units)
+        for severity, message in feasibility_messages(issues, longnames):
+            if severity == 'error':
+                st.error(message)
+            else:
+                st.warning(message)
+        infeasibility = ss.pop('infeasibility', None)
+        if infeasibility is not None:
+            show_infeasibility(infeasibility)
     elif solver_status == 'unknown solver error':
         st.error(
             'Bei der Optimierung ist ein unbekannter Fehler aufgetreten.\n\n'
             + 'Überprüfe die gewählten Parameter und versuche eine neue '
             + 'Optimierung zu starten.'
             )
-if opt:
-    if solver_status is not None and solver_status == 'ok':
-        with st.container(border=True):
-            st.page_link(
-                'pages/02_Simulationsergebnisse.py',
-                label='**Zu den Ergebnissen**',
-                icon='📊', width='stretch'
-                )
+if solver_status is not None and solver_status == 'ok':
+    with st.container(border=True):
+        st.page_link(
+            'pages/02_Simulationsergebnisse.py',
+            label='**Zu den Ergebnissen**',
+            icon='📊', width='stretch'
+            )
 
 # %% MARK: Footer
 icon_path = os.path.join(os.path.dirname(__file__), '..', 'img', 'icons')
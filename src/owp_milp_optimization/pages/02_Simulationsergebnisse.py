@@ -10,9 +10,13 @@ import altair as alt
 import numpy as np
 import pandas as pd
 import streamlit as st
-from helpers import footer, format_sep, load_icon_base64s
+from charts import create_profile_chart, create_profile_overview
+from helpers import (
+    convergence_chart, footer, format_sep, load_icon_base64s
+    )
 from reporting import generate_html_report
 from streamlit import session_state as ss
+from workdir import WorkDirs
 
 st.set_page_config(
     layout='wide',
@@ -22,18 +26,10 @@ st.set_page_config(
 @st.dialog('Ergebnisse lokal speichern')
 def save_results():
     """Temporarely save results and zip them, then let user download it."""
-    with st.spinner('Daten werden verarbeitet...'):
-        tmppath = os.path.abspath(
-            os.path.join(
-                os.path.dirname(__file__), '..', '_tmp'
-            )
-        )
-        if not os.path.exists(tmppath):
-            os.mkdir(tmppath)
-
+    with st.spinner('Daten werden verarbeitet...'), \
+            WorkDirs().session('export') as tmppath:
         zippath = os.path.join(tmppath, 'results')
-        if not os.path.exists(zippath):
-            os.mkdir(zippath)
+        os.mkdir(zippath)
 
         tspath = os.path.join(zippath, 'Ergebnisse_Zeitreihen.csv')
         ss.energy_system.data_all.to_csv(tspath, sep=';')
@@ -68,17 +64,22 @@ def save_results():
         kppath = os.path.join(zippath, 'Ergebnisse_Allgemein.csv')
         kpdf.to_csv(kppath, sep=';', encoding='utf-8-sig', index=False)
 
+        progress = getattr(ss.energy_system, 'progress', None)
+        if progress is not None and not progress.empty:
+            progresspath = os.path.join(zippath, 'Solver_Fortschritt.csv')
+            progress.to_csv(progresspath, sep=';', index=False)
+
         shutil.make_archive(zippath, 'zip', zippath)
 
-    with open(f'{zippath}.zip', 'rb') as file:
-        btn = st.download_button(
-            label='Speichere deine Ergebnisse',
-            data=file,
-            file_name='Ergebnisse',
-            mime='application/zip'
-        )
+        with open(f'{zippath}.zip', 'rb') as file:
+            zipdata = file.read()
 
-    shutil.rmtree(tmppath)
+    btn = st.download_button(
+        label='Speichere deine Ergebnisse',
+        data=zipdata,
+        file_name='Ergebnisse',
+        mime='application/zip'
+    )
 
 
 @st.dialog('Bericht herunterladen')
@@ -350,6 +351,43 @@ with tab_ov:
     with st.expander('Wirtschaftliche Kennzahlen'):
         st.subheader('Wirtschaftliche Kennzahlen')
 
+        if 'preview_unmet_heat' in ss.energy_system.key_params:
+            st.info(
+                'Die Ergebnisse sind eine Schnellabschätzung, bei der die '
+                + 'Anlagen nach ihren Grenzkosten eingesetzt wurden. Die '
+                + 'Wärmegestehungskosten einer Optimierung sind in der Regel '
+                + 'geringer.'
+                )
+            if round(ss.energy_system.key_params['preview_unmet_heat'], 2) > 0:
+                st.warning(
+                    'Bei der Schnellabschätzung konnten '
+                    + f'{format_sep(ss.energy_system.key_params["preview_unmet_heat"])} MWh '
+                    + 'des Wärmebedarfs nicht gedeckt werden.'
+                    )
+        if 'LCOH_rel_error' in ss.energy_system.key_params:
+            st.info(
+                'Die Optimierung wurde mit Typperioden durchgeführt. Die '
+                + 'geschätzte Abweichung der Wärmegestehungskosten durch die '
+                + 'Aggregation der Zeitreihen beträgt '
+                + f'±{format_sep(ss.energy_system.key_params["LCOH_rel_error"]*100)} %.'
+                )
+        if 'two_stage_gap_bound' in ss.energy_system.key_params:
+            st.info(
+                'Die Optimierung wurde zweistufig durchgeführt. Der '
+                + 'Zielfunktionswert weicht höchstens um '
+                + f'{format_sep(max(0, ss.energy_system.key_params["two_stage_gap_bound"])*100)} % '
+                + 'von dem der kombinierten Optimierung ab.'
+                )
+        if 'lp_gap_bound' in ss.energy_system.key_params:
+            st.info(
+                'Die LP-Relaxierung ergibt eine garantierte untere Schranke '
+                + 'des Zielfunktionswerts von '
+                + f'{format_sep(ss.energy_system.key_params["objective_lp_relaxation"])} €. '
+                + 'Der Zielfunktionswert der Lösung liegt höchstens '
+                + f'{format_sep(max(0, ss.energy_system.key_params["lp_gap_bound"])*100)} % '
+                + 'darüber.'
+                )
+
         col1, col2, col3, col4 = st.columns(4)
         col1.metric(
             'LCOH (Erzeugung) in €/MWh',
@@ -963,20 +1001,63 @@ with tab_pro:
         ),
         unsafe_allow_html=True
     )
-    if ss.param_opt['Solver'] == 'SCIP':
-        st.text('Der SCIP Solver ermöglicht aktuell keine Solverlogs.')
-    else:
-        with tab_pro.expander('Solver Log'):
-            logpath = os.path.abspath(
-                os.path.join(
-                    os.path.dirname(__file__), '..', 'solverlogs',
-                    f'{ss.param_opt["Solver"].lower()}_log.txt'
-                    )
+    progress = getattr(ss.energy_system, 'progress', None)
+    if progress is not None and not progress.empty:
+        st.subheader('Konvergenz', help=ss.tt['results_convergence'])
+        last = progress.iloc[-1]
+        col_inc, col_bound, col_gap, col_time = st.columns(4)
+        col_inc.metric(
+            'Beste Lösung', format_sep(last['incumbent'], 0), border=True
+            )
+        col_bound.metric(
+            'Beste Schranke', format_sep(last['bound'], 0), border=True
+            )
+        col_gap.metric('Gap in %', format_sep(last['gap']), border=True)
+        col_time.metric(
+            'Rechenzeit in s', format_sep(last['time'], 1), border=True
+            )
+        st.altair_chart(convergence_chart(progress), width='stretch')
+
+    profiler = getattr(ss.energy_system, 'profiler', None)
+    if profiler is not None and profiler.records:
+        with tab_pro.expander('Laufzeitanalyse'):
+            st.markdown(ss.tt['results_profile'])
+            st.altair_chart(create_profile_chart(profiler), width='stretch')
+            st.dataframe(
+                create_profile_overview(profiler).style.format({
+                    'Laufzeit in s': '{:.2f}', 'Anteil in %': '{:.1f}',
+                    'Spitzenspeicher in MB': '{:.1f}'
+                    }, na_rep='-'),
+                hide_index=True, width='stretch'
+                )
+
+    bounds = getattr(ss.energy_system, 'tightened_bounds', None)
+    if bounds is not None and not bounds.empty:
+        with tab_pro.expander('Verschärfte Schranken'):
+            st.markdown(ss.tt['results_bounds'])
+            st.dataframe(
+                bounds.rename(columns={
+                    'unit': 'Anlage', 'parameter': 'Parameter',
+                    'original': 'Vorgabe', 'tightened': 'Verschärft'
+                    }).style.format(
+                        {'Vorgabe': '{:.1f}', 'Verschärft': '{:.1f}'}
+                        ),
+                hide_index=True, width='stretch'
                 )
+
+    with tab_pro.expander('Solver Log'):
+        if getattr(ss.energy_system, 'cached', False):
+            st.info('Die Ergebnisse wurden aus dem Cache geladen.')
+
+        logpath = getattr(ss.energy_system, 'logpath', None)
+        solverlog = getattr(ss.energy_system, 'solver_log', None)
+        if solverlog is None and logpath and os.path.exists(logpath):
             with open(logpath, 'r', encoding='utf-8') as file:
                 solverlog = file.read()
+        if solverlog is None:
+            solverlog = 'Es ist kein Solverlog vorhanden.'
 
-            st.text(solverlog)
+        st.text(solverlog)
 
 # %% MARK: Footer
 icon_path = os.path.join(os.path.dirname(__file__), '..', 'img', 'icons')
@@ -0,0 +1,139 @@
+"""Bounds of the model variables derived from the problem data."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BOUND_COLUMNS = ['unit', 'parameter', 'original', 'tightened']
+
+# Nominal capacity of the 'chp internal' flow without tightened bounds
+CHP_INTERNAL_CAPACITY = 9999
+
+
+def max_heat_output(data, param_units):
+    """
+    Upper bound of the heat output of any single unit in MW.
+
+    The heat network has no other sink than the heat demand and the
+    storages, so no unit can feed in more than the demand plus the charging
+    power of all storages, reduced by the fixed output of must-run units.
+    As solph only limits the charging power of invest storages, storages
+    with a fixed capacity can take up to their capacity in one time step.
+    """
+    residual = data['heat_demand'].to_numpy(dtype=float).copy()
+    charge = 0
+    for unit, unit_params in param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        if unit_cat == 'tes':
+            if unit_params['invest_mode']:
+                charge += unit_params['Q_max'] * unit_params['Q_in_to_cap']
+            else:
+                charge += unit_params['Q_N']
+        elif unit_params['invest_mode']:
+            continue
+        elif unit_cat == 'sol':
+            residual -= (
+                unit_params['A_N'] * unit_params['eta_col']
+                * data['solar_heat_flow'].to_numpy()
+                )
+        elif unit_cat == 'exhs' and unit_params['fix']:
+            residual -= unit_params['cap_N']
+
+    return max(residual.max() + charge, 0)
+
+
+def tighten_bounds(data, param_units):
+    """
+    Tighten the investment bounds and the internal electricity flow.
+
+    The maximum capacity of invest units is reduced to the capacity needed
+    for `max_heat_output`. Larger capacities only add investment cost, so
+    the optimum is not cut off as long as the specific investment cost is
+    not negative. The 'chp internal' flow is bounded by the electricity
+    output of the combined heat and power units and by the electricity
+    demand of heat pumps and electrode boilers.
+
+    Parameters
+    ----------
+
+    data : pandas.DataFrame
+        Time series the model is built with.
+
+    param_units : dict
+        Unit parameters, which are not modified.
+
+    Returns
+    -------
+
+    tuple(dict, float, pandas.DataFrame)
+        Maximum capacities (area for solar thermal units) of the invest
+        units, the nominal capacity of the 'chp internal' flow and the
+        tightened bounds with their original and new values.
+    """
+    heat_bound = max_heat_output(data, param_units)
+
+    maximum = {}
+    report = []
+    chp_el = 0
+    el_demand = 0
+    for unit, unit_params in param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        if unit_cat == 'tes':
+            continue
+
+        if unit_cat == 'sol':
+            # The solar heat flow is only part of the data with solar units
+            solar_peak = data['solar_heat_flow'].max()
+            parameter, lower = 'A_max', unit_params['A_min']
+            needed = (
+                heat_bound / (unit_params['eta_col'] * solar_peak)
+                if solar_peak > 0 else lower
+                )
+        else:
+            parameter, lower = 'cap_max', unit_params['cap_min']
+            needed = heat_bound / unit_params.get('Q_rel_max', 1)
+
+        if unit_params['invest_mode']:
+            ep_costs = (
+                unit_params['inv_spez'] * (1 - unit_params['inv_bonus_rel'])
+                + unit_params['op_cost_fix']
+                )
+            original = unit_params[parameter]
+            capacity = original
+            if ep_costs >= 0 and needed < original:
+                capacity = max(lower, needed)
+                report += [[unit, parameter, original, capacity]]
+            maximum[unit] = capacity
+        else:
+            capacity = unit_params['cap_N' if unit_cat != 'sol' else 'A_N']
+
+        if unit_cat == 'sol':
+            continue
+        output = capacity * unit_params.get('Q_rel_max', 1)
+        if unit_cat in ['ccet', 'ice']:
+            chp_el += output * unit_params['eta_el'] / unit_params['eta_th']
+        elif unit_cat in ['hp', 'eb']:
+            el_demand += output / unit_params[
+                'cop' if unit_cat == 'hp' else 'eta'
+                ]
+
+    chp_internal = min(
+        float(np.ceil(min(chp_el, el_demand))), CHP_INTERNAL_CAPACITY
+        )
+    if chp_el > 0 and chp_internal < CHP_INTERNAL_CAPACITY:
+        report += [[
+            'chp internal', 'nominal_capacity', CHP_INTERNAL_CAPACITY,
+            chp_internal
+            ]]
+
+    report = pd.DataFrame(report, columns=BOUND_COLUMNS)
+    for _, row in report.iterrows():
+        logger.info(
+            f'Tightened {row["parameter"]} of {row["unit"]} from '
+            + f'{row["original"]:.1f} to {row["tightened"]:.1f}.'
+            )
+
+    return maximum, chp_internal, report
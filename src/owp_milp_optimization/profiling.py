@@ -0,0 +1,204 @@
+"""Wall time and memory profiling of the phases of a run."""
+
+import functools
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+PROFILE_COLUMNS = ['phase', 'level', 'calls', 'wall_time', 'peak_memory']
+
+MEMORY_MODES = ['rss', 'python', None]
+
+# Whether phases may reset the peak memory of the process (see
+# `allow_peak_reset`)
+_peak_reset_allowed = False
+
+
+def allow_peak_reset(allowed=True):
+    """
+    Allow the phases to reset the peak memory usage of the process.
+
+    The peak can only be reset for the whole process, which would falsify
+    the peaks measured concurrently by other profilers, e.g. of parallel
+    dashboard sessions or background jobs. Therefore, it should only be
+    allowed in processes that run a single energy system at a time, like
+    the batch runner, sweep workers, background job processes and the
+    benchmark. Without resets, a phase only knows its peak if it raises the
+    peak of the process; otherwise the highest usage observed at the start
+    and end of the phase and its nested phases is reported.
+    """
+    global _peak_reset_allowed
+    _peak_reset_allowed = allowed
+
+
+def _read_rss():
+    # Current and peak resident set size in bytes (Linux only)
+    try:
+        with open('/proc/self/status', 'r') as file:
+            status = file.read()
+    except OSError:
+        return None
+    current = re.search(r'VmRSS:\s+(\d+)', status)
+    peak = re.search(r'VmHWM:\s+(\d+)', status)
+    if current is None or peak is None:
+        return None
+
+    return int(current.group(1)) * 1024, int(peak.group(1)) * 1024
+
+
+def _reset_rss_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def _phase_peak(state, usage):
+    # Highest usage known to lie within the phase of the given state
+    current, process_peak = usage
+    if process_peak > state['process_peak']:
+        # The process reached a new peak during the phase
+        return max(state['peak'], process_peak)
+    return max(state['peak'], current)
+
+
+class PhaseProfiler():
+    """
+    Record wall time and peak memory of named phases.
+
+    Phases can be nested. The peak memory of a phase is the highest memory
+    usage during the phase in addition to the usage at its start. It is
+    only exact if resetting the peak of the process is allowed (see
+    `allow_peak_reset`).
+
+    Parameters
+    ----------
+
+    memory : str
+        'rss' measures the resident set size of the process, which includes
+        the memory of the solvers, but also of other threads of the process
+        (Linux only). 'python' only measures the memory allocated by Python
+        with `tracemalloc`, which slows down Python code considerably. None
+        only measures wall times.
+    """
+
+    def __init__(self, memory='rss'):
+        if memory not in MEMORY_MODES:
+            raise ValueError(f'Unknown memory mode "{memory}".')
+        self.memory = memory
+        self.records = []
+        self._stack = []
+
+    def _memory(self):
+        # Current and peak memory usage since the last reset or None
+        if self.memory == 'rss':
+            return _read_rss()
+        if self.memory == 'python' and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()
+        return None
+
+    def _reset_peak(self):
+        if not _peak_reset_allowed:
+            return False
+        if self.memory == 'rss':
+            return _reset_rss_peak()
+        if self.memory == 'python':
+            tracemalloc.reset_peak()
+            return True
+        return False
+
+    @contextmanager
+    def phase(self, name):
+        """Context in which the given phase is measured."""
+        started_tracing = False
+        if self.memory == 'python' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+
+        usage = self._memory()
+        if usage is not None and self._stack:
+            # The peak may be reset below, so pass it to the enclosing phase
+            self._stack[-1]['peak'] = _phase_peak(self._stack[-1], usage)
+        reset = usage is not None and self._reset_peak()
+        state = {
+            'start': usage[0] if usage else None,
+            'peak': usage[0] if usage else 0,
+            # Peak of the process at the start, which a reset lowers to the
+            # current usage
+            'process_peak': (
+                usage[0] if reset else (usage[1] if usage else 0)
+                )
+            }
+
+        record = {
+            'phase': name, 'level': len(self._stack), 'calls': 1,
+            'wall_time': float('nan'), 'peak_memory': float('nan')
+            }
+        # Add the record now, so that records are ordered by their start
+        self.records += [record]
+        self._stack += [state]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['wall_time'] = time.perf_counter() - start
+            self._stack.pop()
+            usage = self._memory()
+            if usage is not None and state['start'] is not None:
+                peak = _phase_peak(state, usage)
+                record['peak_memory'] = peak - state['start']
+                if self._stack:
+                    self._stack[-1]['peak'] = max(
+                        self._stack[-1]['peak'], peak
+                        )
+            if started_tracing:
+                tracemalloc.stop()
+
+    def to_frame(self):
+        """
+        Timing breakdown of all recorded phases.
+
+        Phases recorded several times (e.g. in every window of a rolling
+        horizon) are summed up, keeping the order of their first start.
+
+        Returns
+        -------
+
+        pandas.DataFrame
+            One row per phase and nesting level with the number of calls,
+            the total wall time in seconds and the highest peak memory in
+            bytes.
+        """
+        profile = pd.DataFrame(self.records, columns=PROFILE_COLUMNS)
+        if profile.empty:
+            return profile
+
+        return profile.groupby(
+            ['phase', 'level'], sort=False, as_index=False
+            ).agg({'calls': 'sum', 'wall_time': 'sum', 'peak_memory': 'max'})
+
+    def to_dict(self):
+        """Timing breakdown as dict of phase names and their measurements."""
+        return {
+            row['phase']: {
+                'level': row['level'], 'calls': row['calls'],
+                'wall_time': row['wall_time'],
+                'peak_memory': row['peak_memory']
+                }
+            for _, row in self.to_frame().iterrows()
+            }
+
+
+def profiled(method):
+    """Measure a method of an object with a `profiler` as a phase."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.profiler.phase(method.__name__):
+            return method(self, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,424 @@
+"""Parallel solves of a model with all available solvers."""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+import highspy
+import numpy as np
+from pyomo.contrib import appsi
+from pyomo.core import Var
+from pyomo.opt import check_available_solvers
+
+from owp_milp_optimization.resources import solver_options
+from owp_milp_optimization.solverlog import (LogTailer,
+                                             read_improving_solution,
+                                             read_solution)
+from owp_milp_optimization.termination import stall_policy
+from owp_milp_optimization.workdir import user_cache_dir
+
+logger = logging.getLogger(__name__)
+
+SOLVERS = ['Gurobi', 'SCIP', 'HiGHS']
+
+# Values of the 'Solver' option that race all available solvers or use the
+# solver that won most races of models of the same size class
+RACE_MODES = ['Race', 'Auto']
+
+# File of the won races in the cache directory of the user
+RECORD_FILE = 'solver_races.json'
+
+# Seconds between two checks of the solver processes
+POLL_INTERVAL = 0.1
+
+# Exit code of `solve_highs` for infeasible models
+INFEASIBLE_EXIT_CODE = 2
+
+# Status messages of infeasible models in the solver logs
+INFEASIBLE_LOG_TEXT = {
+    'Gurobi': 'Model is infeasible', 'SCIP': 'problem is solved [infeasible]'
+    }
+
+# Primal solution status of HiGHS if a feasible solution was found
+HIGHS_FEASIBLE = 2
+
+
+def available_solvers():
+    """Solvers of `SOLVERS` that can be started on this system."""
+    available = []
+    if check_available_solvers('gurobi') and shutil.which('gurobi_cl'):
+        available += ['Gurobi']
+    if check_available_solvers('scip'):
+        available += ['SCIP']
+    if appsi.solvers.Highs().available():
+        available += ['HiGHS']
+
+    return available
+
+
+def size_class(model):
+    """
+    Size class of a pyomo model used to record the race winners.
+
+    The class consists of the problem type and the order of magnitude of the
+    number of variables, e.g. 'milp_1e4'.
+    """
+    nr_vars = 0
+    nr_integers = 0
+    for var in model.component_data_objects(Var):
+        nr_vars += 1
+        nr_integers += var.is_integer() or var.is_binary()
+
+    problem = 'milp' if nr_integers else 'lp'
+    return f'{problem}_1e{int(np.log10(max(nr_vars, 1)))}'
+
+
+def solver_command(solver, modelpath, solutionpath, logpath, mip_gap,
+                   time_limit=None, options=None):
+    """
+    Command line that solves a model file with one of the `SOLVERS`.
+
+    `options` are resource options as returned by
+    `resources.solver_options`.
+    """
+    options = {} if options is None else options
+    if solver == 'Gurobi':
+        command = [
+            'gurobi_cl', f'MIPGap={mip_gap}', f'LogFile={logpath}',
+            f'ResultFile={solutionpath}'
+            ]
+        if time_limit is not None:
+            command += [f'TimeLimit={time_limit}']
+        command += [f'{key}={value}' for key, value in options.items()]
+        return command + [modelpath]
+
+    if solver == 'SCIP':
+        commands = [f'read {modelpath}', f'set limits gap {mip_gap}']
+        if time_limit is not None:
+            commands += [f'set limits time {time_limit}']
+        commands += [
+            f'set {key.replace("/", " ")} {value}'
+            for key, value in options.items()
+            ]
+        # SCIP leaves out columns with a value of zero by default
+        commands += [
+            'optimize', 'set write printzeros TRUE',
+            f'write solution {solutionpath}', 'quit'
+            ]
+        command = ['scip', '-q', '-l', logpath]
+        for scip_command in commands:
+            command += ['-c', scip_command]
+        return command
+
+    if solver == 'HiGHS':
+        # highspy has no command line interface, so this module is run
+        command = [
+            sys.executable, '-m', 'owp_milp_optimization.racing',
+            modelpath, solutionpath, logpath, '--mip-gap', str(mip_gap)
+            ]
+        if time_limit is not None:
+            command += ['--time-limit', str(time_limit)]
+        if 'threads' in options:
+            command += ['--threads', str(options['threads'])]
+        return command
+
+    raise ValueError(f'Unknown solver "{solver}".')
+
+
+def race_solvers(model, param_opt, solvers, workdir):
+    """
+    Solve a pyomo model with several solvers in parallel processes.
+
+    The model is written as MPS file and every solver is started in its own
+    process with the 'MIPGap' and 'TimeLimit' options. The 'Threads'
+    (default: all cores) and 'MemoryLimit' options are shared evenly among
+    the solvers (see `resources.solver_options`). The first
+    solver that finishes with a solution wins, all others are terminated.
+    The solution of the winner is set as values of the model variables.
+
+    If the optimization parameters define a stall policy (see
+    `termination.stall_policy`), the logs of the solvers are monitored and
+    a solver whose MIP gap stalls is stopped with its incumbent, which then
+    counts as its solution. Racing a single solver therefore solves a model
+    with early termination.
+
+    Parameters
+    ----------
+
+    model : pyomo.core.ConcreteModel
+        Built model to solve.
+
+    param_opt : dict
+        Optimization parameters.
+
+    solvers : list of str
+        Solvers of `SOLVERS` to race.
+
+    workdir : str
+        Directory of the model, solution and log files.
+
+    Returns
+    -------
+
+    tuple(str, str)
+        Solver status ('ok', 'infeasable' or 'unknown solver error') and the
+        winning solver (None if no solver found a solution).
+    """
+    modelpath = os.path.join(workdir, 'race_model.mps')
+    _, smap_id = model.write(
+        modelpath, io_options={'symbolic_solver_labels': False}
+        )
+    symbols = model.solutions.symbol_map[smap_id].byObject
+    variables = {
+        symbols[id(var)]: var for var in model.component_data_objects(Var)
+        if id(var) in symbols
+        }
+
+    threads = param_opt.get('Threads') or os.cpu_count()
+    memory = param_opt.get('MemoryLimit')
+    shares = {
+        'Threads': max(threads // len(solvers), 1),
+        'MemoryLimit': memory / len(solvers) if memory else None
+        }
+    policy = stall_policy(param_opt)
+    processes = {}
+    tailers = {}
+    for solver in solvers:
+        command = solver_command(
+            solver, modelpath, race_file(workdir, solver, 'solution'),
+            race_file(workdir, solver, 'log'), param_opt['MIPGap'],
+            time_limit=param_opt.get('TimeLimit'),
+            options=solver_options(solver, shares, workdir)
+            )
+        processes[solver] = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        if policy is not None:
+            tailers[solver] = LogTailer(
+                race_file(workdir, solver, 'log'), solver
+                )
+
+    start = time.time()
+    winner = None
+    infeasible = False
+    try:
+        while processes and winner is None:
+            time.sleep(POLL_INTERVAL)
+            for solver, process in list(processes.items()):
+                if process.poll() is None:
+                    if policy is not None and solver in tailers:
+                        progress = tailers[solver].poll()
+                        if policy.stalled(progress, time.time() - start):
+                            logger.info(
+                                f'Stopping {solver} after its MIP gap '
+                                + f'stalled at {progress["gap"].iloc[-1]} %.'
+                                )
+                            del tailers[solver]
+                            _interrupt(solver, process)
+                    continue
+                del processes[solver]
+                values = _read_values(
+                    solver, race_file(workdir, solver, 'solution')
+                    )
+                if all(column in values for column in variables):
+                    winner = solver
+                    break
+                infeasible |= _is_infeasible(
+                    solver, process.returncode,
+                    race_file(workdir, solver, 'log')
+                    )
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    if winner is None:
+        if infeasible:
+            return 'infeasable', None
+        logger.error(f'None of the solvers {solvers} found a solution.')
+        return 'unknown solver error', None
+
+    if len(solvers) > 1:
+        logger.info(
+            f'{winner} won the solver race after {time.time() - start:.1f} s.'
+            )
+    for column, var in variables.items():
+        var.set_value(values[column], skip_validation=True)
+
+    return 'ok', winner
+
+
+def race_file(workdir, solver, kind):
+    """Path of the solution or log file of a solver in a race."""
+    extension = 'sol' if kind == 'solution' else 'txt'
+    return os.path.join(workdir, f'{solver.lower()}_race_{kind}.{extension}')
+
+
+def _interrupt(solver, process):
+    # Gurobi and SCIP stop at an interrupt and still write their incumbent,
+    # whereas the HiGHS worker can only be terminated and leaves its last
+    # improving solution
+    if solver == 'HiGHS' or os.name != 'posix':
+        process.terminate()
+    else:
+        process.send_signal(signal.SIGINT)
+
+
+def _read_values(solver, solutionpath):
+    if os.path.exists(solutionpath):
+        return read_solution(solutionpath)[1]
+    improvingpath = improving_file(solutionpath)
+    if solver == 'HiGHS' and os.path.exists(improvingpath):
+        return read_improving_solution(improvingpath)[1]
+    return {}
+
+
+def improving_file(solutionpath):
+    """Path of the improving solutions written by `solve_highs`."""
+    return f'{solutionpath}.improving'
+
+
+def _is_infeasible(solver, returncode, logpath):
+    if solver == 'HiGHS':
+        return returncode == INFEASIBLE_EXIT_CODE
+    try:
+        with open(logpath, 'r', encoding='utf-8', errors='replace') as file:
+            text = file.read()
+    except FileNotFoundError:
+        return False
+    return INFEASIBLE_LOG_TEXT[solver] in text
+
+
+def read_records(path=None):
+    """
+    Number of won races by solver and size class (see `size_class`).
+
+    The records are read from `path`, which defaults to `RECORD_FILE` in
+    the cache directory of the user. Missing or unreadable records are
+    treated as no won races.
+    """
+    path = user_cache_dir(RECORD_FILE) if path is None else path
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f'Could not read the solver race records: {e}')
+        return {}
+
+
+def record_winner(model_class, solver, path=None):
+    """
+    Count a won race of a solver for models of a size class.
+
+    The solve that won the race is not affected if the records can not be
+    written, e.g. in a directory without write access.
+    """
+    path = user_cache_dir(RECORD_FILE) if path is None else path
+    records = read_records(path)
+    wins = records.setdefault(model_class, {})
+    wins[solver] = wins.get(solver, 0) + 1
+
+    # Replace the file at once, as several races may finish concurrently
+    tmppath = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmppath, 'w', encoding='utf-8') as file:
+            json.dump(records, file, indent=4, sort_keys=True)
+        os.replace(tmppath, path)
+    except OSError as e:
+        logger.warning(f'Could not record the winner of the solver race: {e}')
+        try:
+            os.remove(tmppath)
+        except OSError:
+            pass
+
+
+def fastest_solver(model_class, solvers, path=None):
+    """
+    Solver that won most races of models of a size class.
+
+    Returns
+    -------
+
+    str
+        One of `solvers` or None if none of them won a race of the size
+        class so far.
+    """
+    wins = read_records(path).get(model_class, {})
+    candidates = [solver for solver in solvers if wins.get(solver)]
+    if not candidates:
+        return None
+    return max(candidates, key=wins.get)
+
+
+def solve_highs(modelpath, solutionpath, logpath, mip_gap, time_limit=None,
+                threads=None):
+    """
+    Solve a model file with HiGHS and write the solution if one was found.
+
+    Every improving solution is appended to the file `improving_file`, so
+    that the incumbent is available if the process is terminated.
+
+    Returns
+    -------
+
+    int
+        0 if a solution was written, `INFEASIBLE_EXIT_CODE` if the model is
+        infeasible and 1 otherwise.
+    """
+    highs = highspy.Highs()
+    highs.setOptionValue('log_to_console', False)
+    highs.setOptionValue('log_file', logpath)
+    highs.setOptionValue('mip_rel_gap', mip_gap)
+    highs.setOptionValue('mip_improving_solution_save', True)
+    highs.setOptionValue(
+        'mip_improving_solution_file', improving_file(solutionpath)
+        )
+    if time_limit is not None:
+        highs.setOptionValue('time_limit', float(time_limit))
+    if threads is not None:
+        highs.setOptionValue('threads', threads)
+    highs.readModel(modelpath)
+    highs.run()
+
+    if highs.getModelStatus() == highspy.HighsModelStatus.kInfeasible:
+        return INFEASIBLE_EXIT_CODE
+    if highs.getInfo().primal_solution_status != HIGHS_FEASIBLE:
+        return 1
+    highs.writeSolution(solutionpath, 0)
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Solve a model file with HiGHS during a solver race.'
+        )
+    parser.add_argument('model', help='Model file (MPS or LP).')
+    parser.add_argument('solution', help='Solution file to write.')
+    parser.add_argument('log', help='Log file to write.')
+    parser.add_argument('--mip-gap', type=float, default=1e-4)
+    parser.add_argument('--time-limit', type=float, default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    return solve_highs(
+        args.model, args.solution, args.log, args.mip_gap,
+        time_limit=args.time_limit, threads=args.threads
+        )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,6 +17,8 @@ from owp_milp_optimization.charts import (create_dispatch_timeseries_chart,
                                           create_el_prod_internal_chart,
                                           create_heat_production_chart,
                                           create_ordered_duration_line_chart,
+                                          create_profile_chart,
+                                          create_profile_overview,
                                           create_tes_content_chart)
 
 from .styling import REPORT_CSS
@@ -334,6 +336,20 @@ def create_parameters_table(param_opt: Dict[str, Any]) -> str:
     return html
 
 
+def create_profile_table(profiler) -> str:
+    """Create HTML table for the wall time and memory of the run phases."""
+    profile = create_profile_overview(profiler)
+    profile['Laufzeit in s'] = profile['Laufzeit in s'].map(
+        lambda x: format_number(x, 2)
+        )
+    profile['Anteil in %'] = profile['Anteil in %'].map(format_number)
+    profile['Spitzenspeicher in MB'] = profile['Spitzenspeicher in MB'].map(
+        format_number
+        )
+
+    return profile.to_html(index=False, border=False)
+
+
 def create_overview_table(energy_system):
     """Create HTML table for input time series overview."""
     data_overview = energy_system.data.describe()
@@ -541,6 +557,13 @@ def generate_html_report(
                 f'{unit}-content-chart': altair_to_vega_spec(tes_content_chart)
             })
 
+    profiler = getattr(energy_system, 'profiler', None)
+    profile_available = profiler is not None and len(profiler.records) > 0
+    if profile_available:
+        chart_specs.update({
+            'profile-chart': altair_to_vega_spec(create_profile_chart(profiler))
+        })
+
     # Create chart rendering script
     chart_rendering_script = create_chart_rendering_script(chart_specs)
 
@@ -605,6 +628,18 @@ def generate_html_report(
             """
         chart_sections_html += '</div>'
 
+    if profile_available:
+        chart_sections_html += f"""
+            <div class="section">
+                <div class="section-title">Laufzeitanalyse</div>
+
+                <div class="chart-container">
+                    <div id="profile-chart"></div>
+                </div>
+                {create_profile_table(profiler)}
+            </div>
+        """
+
     # Render main template
     main_template = Template(get_report_template())
 
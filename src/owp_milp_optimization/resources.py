@@ -0,0 +1,146 @@
+"""Limits of the threads, memory and simultaneous runs of the solvers."""
+
+import logging
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Lock files of the solve slots, shared by all processes of the host
+SLOT_DIR = os.path.join(tempfile.gettempdir(), 'owp_milp_solve_slots')
+
+# Seconds between two attempts to acquire a solve slot
+POLL_INTERVAL = 0.5
+
+
+def solver_options(solver, param_opt, workdir=None):
+    """
+    Resource options of a solver from the optimization parameters.
+
+    'Threads' is the number of solver threads and 'MemoryLimit' the memory
+    of the solver in GB. Unset or zero values leave the solver defaults.
+    SCIP solves on a single thread and HiGHS has no memory limit.
+
+    Parameters
+    ----------
+
+    solver : str
+        Solver the options are for ('Gurobi', 'SCIP' or 'HiGHS').
+
+    param_opt : dict
+        Optimization parameters.
+
+    workdir : str
+        Directory of the solve, used by Gurobi to write node files.
+
+    Returns
+    -------
+
+    dict
+        Options with the names of the solver.
+    """
+    threads = param_opt.get('Threads')
+    memory = param_opt.get('MemoryLimit')
+
+    options = {}
+    if solver == 'Gurobi':
+        if threads:
+            options['Threads'] = threads
+        if memory:
+            # Stop with the incumbent at the limit and move the nodes of the
+            # branch-and-bound tree to disk well before it
+            options['SoftMemLimit'] = memory
+            options['NodefileStart'] = memory / 2
+            if workdir is not None:
+                options['NodefileDir'] = workdir
+    elif solver == 'SCIP':
+        if memory:
+            options['limits/memory'] = memory * 1024
+    elif solver == 'HiGHS':
+        if threads:
+            options['threads'] = threads
+
+    return options
+
+
+class SolveSlots():
+    """
+    Host-wide bound of the number of simultaneous solves.
+
+    Every slot is a lock file in `SLOT_DIR`. Entering the context waits
+    until one of the slots is free and locks it until the context is left.
+    As the operating system releases the locks of terminated processes,
+    slots are never lost. All dashboard sessions, batch runs and sweeps of a
+    host share the slots.
+
+    Parameters
+    ----------
+
+    slots : int
+        Number of simultaneous solves. None or zero does not limit the
+        number of solves.
+
+    path : str
+        Directory of the lock files.
+    """
+
+    def __init__(self, slots, path=SLOT_DIR):
+        self.slots = slots
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if not self.slots:
+            return self
+
+        os.makedirs(self.path, exist_ok=True)
+        start = time.time()
+        while self.file is None:
+            for slot in range(self.slots):
+                file = open(os.path.join(self.path, f'slot_{slot}.lock'), 'a+')
+                file.seek(0)
+                if _lock(file):
+                    self.file = file
+                    break
+                file.close()
+            else:
+                time.sleep(POLL_INTERVAL)
+
+        waited = time.time() - start
+        if waited > POLL_INTERVAL:
+            logger.info(f'Waited {waited:.1f} s for a free solve slot.')
+
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.file is not None:
+            _unlock(self.file)
+            self.file.close()
+            self.file = None
+
+
+def _lock(file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,317 @@
+"""Parsing of the MIP progress and solutions from solver output files."""
+
+import os
+
+import pandas as pd
+
+PROGRESS_COLUMNS = ['time', 'nodes', 'incumbent', 'bound', 'gap']
+
+# Abbreviations of large node counts in SCIP logs
+SCIP_UNITS = {'k': 1e3, 'M': 1e6}
+
+
+def _to_float(value):
+    value = value.rstrip('%')
+    if value in ['-', '--', 'inf', 'Inf', 'Large', '']:
+        return float('nan')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _parse_highs_line(line):
+    # [H] Proc InQueue Leaves Expl% BestBound BestSol Gap Cuts InLp Confl
+    # LpIters Time
+    tokens = line.split()
+    if len(tokens) < 12 or not tokens[-1].endswith('s'):
+        return None
+    if not tokens[0].isdigit():
+        tokens = tokens[1:]
+    if len(tokens) != 12 or not tokens[3].endswith('%'):
+        return None
+
+    values = [
+        _to_float(tokens[-1][:-1]), _to_float(tokens[0]),
+        _to_float(tokens[5]), _to_float(tokens[4]), _to_float(tokens[6])
+        ]
+    if any(v is None for v in values):
+        return None
+    return values
+
+
+def _parse_gurobi_line(line):
+    # [H*] Expl Unexpl [Obj Depth IntInf] Incumbent BestBd Gap It/Node Time
+    tokens = line.split()
+    if len(tokens) < 7 or not tokens[-1].endswith('s'):
+        return None
+    if not tokens[0].isdigit():
+        tokens[0] = tokens[0].lstrip('H*')
+        if not tokens[0]:
+            tokens = tokens[1:]
+    if not (tokens[0].isdigit() and tokens[1].isdigit()):
+        return None
+
+    values = [
+        _to_float(tokens[-1][:-1]), _to_float(tokens[0]),
+        _to_float(tokens[-5]), _to_float(tokens[-4]), _to_float(tokens[-3])
+        ]
+    if any(v is None for v in values):
+        return None
+    return values
+
+
+def _parse_scip_line(line):
+    # [H]time | node | left | ... | dualbound | primalbound | gap [| compl.]
+    fields = [field.strip() for field in line.split('|')]
+    if len(fields) < 6 or not fields[0].endswith('s'):
+        return None
+    if fields[0] and not fields[0][0].isdigit():
+        fields[0] = fields[0][1:].strip()
+    # The number of columns depends on the SCIP version, but only the bounds
+    # are written in scientific notation
+    bounds = [
+        i for i, field in enumerate(fields)
+        if field == '--' or 'e+' in field or 'e-' in field
+        ]
+    if not bounds or bounds[0] + 2 >= len(fields):
+        return None
+    dual = bounds[0]
+
+    nodes = fields[1]
+    factor = 1
+    if nodes[-1:] in SCIP_UNITS:
+        nodes, factor = nodes[:-1], SCIP_UNITS[nodes[-1]]
+    nodes = _to_float(nodes)
+    if nodes is not None:
+        nodes *= factor
+
+    values = [
+        _to_float(fields[0][:-1]), nodes, _to_float(fields[dual+1]),
+        _to_float(fields[dual]), _to_float(fields[dual+2])
+        ]
+    if any(v is None for v in values):
+        return None
+    return values
+
+
+PARSERS = {
+    'HiGHS': _parse_highs_line,
+    'Gurobi': _parse_gurobi_line,
+    'SCIP': _parse_scip_line
+    }
+
+
+def parse_progress(text, solver):
+    """
+    Extract the MIP progress from the log of a solver.
+
+    Parameters
+    ----------
+
+    text : str
+        Content of the solver log.
+
+    solver : str
+        Solver that wrote the log ('HiGHS', 'Gurobi' or 'SCIP').
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        One row per progress line with the elapsed time in seconds, the
+        number of explored nodes, the incumbent objective value, the best
+        bound and the gap in percent. Values not yet available are NaN.
+    """
+    parser = PARSERS.get(solver)
+    rows = []
+    if parser is not None:
+        for line in text.splitlines():
+            values = parser(line)
+            if values is not None:
+                rows += [values]
+
+    return pd.DataFrame(rows, columns=PROGRESS_COLUMNS)
+
+
+def solver_file(logpath):
+    """
+    Path of the file naming the solver a race mode chose for a log.
+
+    The logs do not reliably name the solver that writes them, so the
+    solver chosen by the 'Auto' or 'Race' option for a single solve is
+    written to this file (see `EnergySystem.solve_model`).
+    """
+    return f'{logpath}.solver'
+
+
+def read_progress(logpath, solver):
+    """Parse the MIP progress of a complete log file."""
+    try:
+        with open(logpath, 'r', encoding='utf-8', errors='replace') as file:
+            text = file.read()
+    except FileNotFoundError:
+        text = ''
+
+    return parse_progress(text, solver)
+
+
+class LogTailer():
+    """
+    Incremental reader of the MIP progress of a growing solver log.
+
+    Each call of `poll` only reads the part of the log written since the
+    previous call, so that the progress of long solves can be polled
+    frequently. A log that is replaced by a new solve is read from the start.
+
+    Parameters
+    ----------
+
+    logpath : str
+        Path of the solver log.
+
+    solver : str
+        Solver that writes the log ('HiGHS', 'Gurobi' or 'SCIP').
+    """
+
+    def __init__(self, logpath, solver):
+        self.logpath = logpath
+        self.parser = PARSERS.get(solver)
+        self.offset = 0
+        self.rest = ''
+        self.rows = []
+
+    def poll(self):
+        """Read new lines of the log and return the complete progress."""
+        try:
+            size = os.path.getsize(self.logpath)
+        except FileNotFoundError:
+            size = 0
+        if size < self.offset:
+            self.offset = 0
+            self.rest = ''
+            self.rows = []
+
+        if self.parser is not None and size > self.offset:
+            with open(self.logpath, 'rb') as file:
+                file.seek(self.offset)
+                chunk = file.read(size - self.offset)
+            self.offset += len(chunk)
+
+            lines = (self.rest + chunk.decode('utf-8', 'replace')).split('\n')
+            # The last line may still be incomplete
+            self.rest = lines.pop()
+            for line in lines:
+                values = self.parser(line)
+                if values is not None:
+                    self.rows += [values]
+
+        return self.progress
+
+    @property
+    def progress(self):
+        """Progress read so far (see `parse_progress`)."""
+        return pd.DataFrame(self.rows, columns=PROGRESS_COLUMNS)
+
+
+def read_solution(solution_file, columns=None):
+    """
+    Read the objective and variable values of a solution file.
+
+    Supported are the solution files of HiGHS (`--solution_file`), Gurobi
+    (`ResultFile=*.sol`) and SCIP (`write solution`). SCIP leaves out
+    columns with a value of zero unless 'write/printzeros' is set.
+
+    Parameters
+    ----------
+
+    solution_file : str
+        Path of the solution file.
+
+    columns : list
+        Names of all columns of the model. Columns missing in a SCIP
+        solution with an objective value are set to zero.
+
+    Returns
+    -------
+
+    tuple(float, dict)
+        Objective value (None if not contained in the file) and the values
+        of the columns by their name.
+    """
+    with open(solution_file, 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+
+    objective = None
+    values = {}
+    if '# Columns' in ''.join(lines[:10]):
+        # HiGHS writes the primal values after a header with the objective
+        section = None
+        for line in lines:
+            if line.startswith('# '):
+                section = line.split()[1]
+                continue
+            fields = line.split()
+            if section == 'Primal' and fields[:1] == ['Objective']:
+                objective = float(fields[1])
+            elif section == 'Columns' and len(fields) == 2:
+                values[fields[0]] = float(fields[1])
+        return objective, values
+
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        lowered = line.lower()
+        if 'objective value' in lowered:
+            objective = float(lowered.split('objective value')[1].strip(' :='))
+            continue
+        if line.startswith('#') or len(fields) < 2:
+            continue
+        try:
+            values[fields[0]] = float(fields[1])
+        except ValueError:
+            continue
+
+    # SCIP solution files start with the solution status
+    scip = bool(lines) and lines[0].startswith('solution status:')
+    if scip and columns is not None and objective is not None:
+        values = {column: values.get(column, 0.0) for column in columns}
+
+    return objective, values
+
+
+def read_improving_solution(solution_file):
+    """
+    Read the last complete solution of a HiGHS improving solution file.
+
+    HiGHS appends every improving MIP solution to the file given by the
+    'mip_improving_solution_file' option. The last solution may be
+    incomplete if HiGHS was terminated while writing it.
+
+    Returns
+    -------
+
+    tuple(float, dict)
+        Objective value and the values of the columns by their name. If the
+        file contains no complete solution, the objective is None and the
+        values are empty.
+    """
+    with open(solution_file, 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+
+    objective = None
+    values = {}
+    solution = None
+    for line in lines:
+        fields = line.split()
+        if fields[:1] == ['Objective']:
+            solution = {'objective': float(fields[1]), 'values': {}}
+        elif fields[:2] == ['#', 'Columns'] and solution is not None:
+            solution['columns'] = int(fields[2])
+        elif len(fields) == 2 and solution is not None:
+            solution['values'][fields[0]] = float(fields[1])
+            if len(solution['values']) == solution.get('columns'):
+                objective, values = solution['objective'], solution['values']
+
+    return objective, values
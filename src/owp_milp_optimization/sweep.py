@@ -0,0 +1,234 @@
+"""Parallel parameter sweeps over variants of one energy system."""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+
+import pandas as pd
+
+from owp_milp_optimization.batch import load_energy_system, run_energy_system
+from owp_milp_optimization.cache import ResultCache
+from owp_milp_optimization.profiling import allow_peak_reset
+
+logger = logging.getLogger(__name__)
+
+
+def expand_grid(grid):
+    """
+    Build the cartesian product of a parameter grid.
+
+    Parameters
+    ----------
+
+    grid : dict
+        Mapping of parameter paths to lists of values, e.g.
+        `{'param_opt.heat_price': [60, 80], 'param_units.hp1.cap_N': [5, 10]}`.
+        See `apply_variant` for the supported paths.
+
+    Returns
+    -------
+
+    list(dict)
+        One dictionary of parameter path and value per variant.
+    """
+    paths = list(grid.keys())
+    return [
+        dict(zip(paths, values))
+        for values in itertools.product(*[grid[p] for p in paths])
+        ]
+
+
+def apply_variant(data, param_units, param_opt, variant):
+    """
+    Return copies of the input data with the values of a variant applied.
+
+    Supported parameter paths are:
+
+    - `param_opt.<key>`: Replace an optimization parameter.
+    - `param_units.<unit>.<key>`: Replace a unit parameter. If `<unit>` is a
+      unit category without number (e.g. `hp`), all units of the category
+      are changed.
+    - `data.<column>`: Scale a time series column by the given factor.
+    """
+    data = data.copy()
+    param_units = deepcopy(param_units)
+    param_opt = deepcopy(param_opt)
+
+    for path, value in variant.items():
+        target, *keys = path.split('.')
+        if target == 'param_opt' and len(keys) == 1:
+            param_opt[keys[0]] = value
+        elif target == 'param_units' and len(keys) == 2:
+            units = [
+                u for u in param_units
+                if keys[0] in (u, u.rstrip('0123456789'))
+                ]
+            if not units:
+                raise KeyError(
+                    f'Unit "{keys[0]}" is not in the energy system.'
+                    )
+            for unit in units:
+                param_units[unit][keys[1]] = value
+        elif target == 'data' and len(keys) == 1:
+            data[keys[0]] = data[keys[0]] * value
+        else:
+            raise ValueError(f'Unknown parameter path "{path}".')
+
+    return data, param_units, param_opt
+
+
+def plan_workers(nr_variants, core_budget=None, solver_threads=1):
+    """Number of worker processes so that workers * threads <= core budget."""
+    if core_budget is None:
+        core_budget = os.cpu_count() or 1
+
+    return max(1, min(nr_variants, core_budget // max(1, solver_threads)))
+
+
+def _solve_variant(variant_nr, variant, data, param_units, param_opt,
+                   cache=None):
+    # Each worker process solves one variant at a time
+    allow_peak_reset()
+    data, param_units, param_opt = apply_variant(
+        data, param_units, param_opt, variant
+        )
+    energy_system, solver_status = run_energy_system(
+        data, param_units, param_opt, cache=cache
+        )
+
+    row = {'variant': variant_nr, **variant, 'status': solver_status}
+    if solver_status == 'ok':
+        row.update(energy_system.key_params)
+        row.update(energy_system.data_caps.iloc[0].to_dict())
+        for cost_type, costs in energy_system.cost_df.iterrows():
+            for unit, cost in costs.items():
+                row[f'{cost_type}_{unit}'] = cost
+    elif energy_system.infeasibility is not None:
+        row['unmet_heat'] = energy_system.infeasibility['unmet_heat'].sum()
+        row['unmet_heat_peak'] = (
+            energy_system.infeasibility['unmet_heat'].max()
+            )
+
+    return row
+
+
+def run_sweep(data, param_units, param_opt, grid, core_budget=None,
+              solver_threads=1, cache=None):
+    """
+    Solve all variants of a parameter grid in a process pool.
+
+    Every worker builds its own `solph.EnergySystem`. The solver threads of
+    each solve are limited to `solver_threads`, so that at most
+    `core_budget` cores are used at the same time.
+
+    Parameters
+    ----------
+
+    data, param_units, param_opt :
+        Base input data of the energy system as used by `EnergySystem`.
+
+    grid : dict
+        Parameter grid (see `expand_grid`).
+
+    core_budget : int
+        Total number of cores to be used. Defaults to all available cores.
+
+    solver_threads : int
+        Number of threads of each individual solve.
+
+    cache : ResultCache
+        Result cache shared by all workers (see `run_energy_system`).
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        One row per variant containing the varied parameters, the solver
+        status, the key parameters, the unit capacities and the unit costs
+        (as `<cost type>_<unit>` columns).
+    """
+    variants = expand_grid(grid)
+    param_opt = {**param_opt, 'Threads': solver_threads}
+    workers = plan_workers(len(variants), core_budget, solver_threads)
+    logger.info(
+        f'Solving {len(variants)} variants with {workers} workers and '
+        + f'{solver_threads} solver thread(s) each.'
+        )
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                _solve_variant, nr, variant, data, param_units, param_opt,
+                cache
+                ): (nr, variant)
+            for nr, variant in enumerate(variants)
+            }
+        for future in as_completed(futures):
+            nr, variant = futures[future]
+            try:
+                rows += [future.result()]
+            except Exception:
+                logger.exception(f'Variant {nr} ({variant}) failed.')
+                rows += [{'variant': nr, **variant, 'status': 'error'}]
+
+    return pd.DataFrame(rows).sort_values('variant').reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Solve a parameter grid of variants of an energy system.'
+        )
+    parser.add_argument(
+        'source', help='Saved energy system (zip archive or directory).'
+        )
+    parser.add_argument(
+        'grid', help='JSON file mapping parameter paths to lists of values.'
+        )
+    parser.add_argument(
+        '-o', '--output', default='sweep.csv',
+        help='Output csv file (default: "sweep.csv").'
+        )
+    parser.add_argument(
+        '--cores', type=int,
+        help='Total number of cores to use (default: all).'
+        )
+    parser.add_argument(
+        '--solver-threads', type=int, default=1,
+        help='Number of solver threads per variant (default: 1).'
+        )
+    parser.add_argument(
+        '--cache-dir',
+        help='Directory of the result cache (default: user cache directory).'
+        )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='Solve all variants without using the result cache.'
+        )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s'
+        )
+
+    data, param_units, param_opt = load_energy_system(args.source)
+    with open(args.grid, 'r', encoding='utf-8') as file:
+        grid = json.load(file)
+
+    results = run_sweep(
+        data, param_units, param_opt, grid, core_budget=args.cores,
+        solver_threads=args.solver_threads,
+        cache=None if args.no_cache else ResultCache(args.cache_dir)
+        )
+    results.to_csv(args.output, sep=';', index=False)
+
+    return 0 if (results['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Symmetry handling for identical numbered units."""
+
+import json
+from copy import deepcopy
+
+import numpy as np
+import pyomo.environ as po
+
+IDENTICAL_UNIT_MODES = [None, 'order', 'aggregate']
+
+# Units with fixed capacity of these types may be aggregated
+AGGREGABLE = ['ccet', 'ice', 'hp', 'gb', 'eb']
+
+
+def identical_units(param_units):
+    """
+    Find numbered units of the same type with identical parameters.
+
+    Returns
+    -------
+
+    list of list of str
+        Groups of at least two identical units, each ordered by the unit
+        number.
+    """
+    groups = {}
+    for unit, unit_params in param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        key = (unit_cat, json.dumps(unit_params, sort_keys=True, default=str))
+        groups.setdefault(key, []).append(unit)
+
+    return [
+        sorted(units, key=lambda u: int(u[len(u.rstrip('0123456789')):]))
+        for units in groups.values() if len(units) > 1
+        ]
+
+
+def is_aggregable(unit, unit_params):
+    """Whether identical units like `unit` can be aggregated."""
+    return (
+        unit.rstrip('0123456789') in AGGREGABLE
+        and not unit_params['invest_mode']
+        )
+
+
+def aggregate_params(unit_params, count):
+    """Parameters of the unit that represents `count` identical units."""
+    unit_params = deepcopy(unit_params)
+    unit_params['cap_N'] *= count
+
+    return unit_params
+
+
+def add_ordering_constraints(model, groups, heat_bus):
+    """
+    Order identical units so that solvers do not permute them.
+
+    Invest units of a group are ordered by their capacity. The units with
+    fixed capacity have no constraints coupling the time steps, so their
+    dispatch may be swapped in every time step. Their heat flow and on/off
+    status are therefore ordered in every time step, i.e. a unit is only on
+    if the preceding unit of the group is on as well. Both orders leave the
+    optimum unchanged.
+
+    Parameters
+    ----------
+
+    model : oemof.solph.Model
+        Built model of the energy system.
+
+    groups : list of list
+        Groups of identical oemof nodes (see `identical_units`).
+
+    heat_bus : oemof.solph.Bus
+        Heat network the units feed into.
+
+    Returns
+    -------
+
+    int
+        Number of added constraints.
+    """
+    model.symmetry_breaking = po.ConstraintList()
+    for group in groups:
+        for node, next_node in zip(group[:-1], group[1:]):
+            variables = _ordered_variables(model, node, next_node, heat_bus)
+            for var, next_var in zip(*variables):
+                model.symmetry_breaking.add(var >= next_var)
+
+    return len(model.symmetry_breaking)
+
+
+def _ordered_variables(model, node, next_node, heat_bus):
+    # Storage capacities
+    invest = _variable(model, 'GenericInvestmentStorageBlock', 'invest')
+    if invest is not None and (node, 0) in invest:
+        return (
+            [invest[node, p] for p in model.PERIODS],
+            [invest[next_node, p] for p in model.PERIODS]
+            )
+
+    # Capacities of the heat flows of invest units
+    for block_name in ['InvestNonConvexFlowBlock', 'InvestmentFlowBlock']:
+        invest = _variable(model, block_name, 'invest')
+        if invest is not None and (node, heat_bus, 0) in invest:
+            return (
+                [invest[node, heat_bus, p] for p in model.PERIODS],
+                [invest[next_node, heat_bus, p] for p in model.PERIODS]
+                )
+
+    # Status and heat flows of units with fixed capacity
+    first = [model.flow[node, heat_bus, t] for t in model.TIMESTEPS]
+    second = [model.flow[next_node, heat_bus, t] for t in model.TIMESTEPS]
+    status = _variable(model, 'NonConvexFlowBlock', 'status')
+    if status is not None and (node, heat_bus, 0) in status:
+        first += [status[node, heat_bus, t] for t in model.TIMESTEPS]
+        second += [status[next_node, heat_bus, t] for t in model.TIMESTEPS]
+
+    return first, second
+
+
+def _variable(model, block_name, var_name):
+    # Blocks without flows of their kind lack their variables
+    block = model.component(block_name)
+    if block is None:
+        return None
+    return block.component(var_name)
+
+
+def add_count_constraints(model, aggregated, heat_bus):
+    """
+    Limit the heat flow of aggregated units by the number of running units.
+
+    The number of running units is an integer variable `unit_count` in
+    every time step, which replaces the on/off status of the single units.
+    Each running unit has to operate between its minimum and maximum load.
+
+    Parameters
+    ----------
+
+    model : oemof.solph.Model
+        Built model of the energy system.
+
+    aggregated : dict
+        Number of units and parameters of a single unit by the oemof node
+        representing the units.
+
+    heat_bus : oemof.solph.Bus
+        Heat network the units feed into.
+    """
+    nodes = list(aggregated)
+    model.unit_count = po.Var(
+        nodes, model.TIMESTEPS, domain=po.NonNegativeIntegers,
+        bounds=lambda m, n, t: (0, aggregated[n][0])
+        )
+
+    def load(node, bound):
+        unit_params = aggregated[node][1]
+        return unit_params['cap_N'] * unit_params[bound]
+
+    model.unit_count_max = po.Constraint(
+        nodes, model.TIMESTEPS,
+        rule=lambda m, n, t: (
+            m.flow[n, heat_bus, t] <= m.unit_count[n, t] * load(n, 'Q_rel_max')
+            )
+        )
+    model.unit_count_min = po.Constraint(
+        nodes, model.TIMESTEPS,
+        rule=lambda m, n, t: (
+            m.flow[n, heat_bus, t] >= m.unit_count[n, t] * load(n, 'Q_rel_min')
+            )
+        )
+
+
+def unit_count(heat, count, unit_params):
+    """
+    Number of running units of an aggregated unit in every time step.
+
+    The fewest units that can provide the heat flow are used. If these units
+    can not run above their minimum load, neither can more units.
+    """
+    max_load = unit_params['cap_N'] * unit_params['Q_rel_max']
+    return np.clip(np.ceil(np.round(heat / max_load, 6)), 0, count)
+
+
+def disaggregate(data_all, groups, param_units):
+    """
+    Split the time series of aggregated units to the units of their group.
+
+    The flows of an aggregated unit are shared equally by its running units
+    (see `unit_count`). The first unit of a group is the one in the model.
+
+    Returns
+    -------
+
+    pandas.DataFrame
+        Time series with the columns of all units of the groups.
+    """
+    data_all = data_all.copy()
+    for group in groups:
+        unit = group[0]
+        heat_col = f'Q_out_{unit}' if unit.startswith('hp') else f'Q_{unit}'
+        count = unit_count(
+            data_all[heat_col].to_numpy(), len(group), param_units[unit]
+            )
+        share = np.divide(
+            1, count, out=np.zeros(len(count)), where=count > 0
+            )
+        for col in [c for c in data_all.columns if c.endswith(f'_{unit}')]:
+            values = data_all[col].to_numpy() * share
+            prefix = col[:-len(unit)]
+            for nr, member in enumerate(group):
+                data_all[prefix + member] = np.where(count > nr, values, 0)
+
+    return data_all
@@ -0,0 +1,94 @@
+"""Termination of solves whose MIP gap stops improving."""
+
+import numpy as np
+
+# Default seconds over which the improvement of the MIP gap is measured
+STALL_WINDOW = 120
+
+
+class StallPolicy():
+    """
+    Stop a solve once its MIP gap improves too slowly.
+
+    The gap is taken from the progress parsed from the solver log (see
+    `solverlog.LogTailer`). A solve stalls if its gap improved by less than
+    `min_improvement` percentage points per minute over the last `window`
+    seconds. Solves without an incumbent or running shorter than `window`
+    never stall.
+
+    Parameters
+    ----------
+
+    min_improvement : float
+        Minimal improvement of the MIP gap in percentage points per minute.
+
+    window : float
+        Seconds over which the improvement is measured.
+    """
+
+    def __init__(self, min_improvement, window=STALL_WINDOW):
+        self.min_improvement = min_improvement
+        self.window = window
+
+    def improvement(self, progress, elapsed):
+        """
+        Improvement of the MIP gap per minute over the last `window`.
+
+        Parameters
+        ----------
+
+        progress : pandas.DataFrame
+            Progress of the solve with the columns 'time' and 'gap' in %.
+
+        elapsed : float
+            Seconds since the start of the solve.
+
+        Returns
+        -------
+
+        float
+            Improvement in percentage points per minute or None if it can
+            not be measured yet.
+        """
+        if progress.empty or elapsed < self.window:
+            return None
+        gaps = progress.dropna(subset=['gap'])
+        before = gaps[gaps['time'] <= elapsed - self.window]
+        if gaps.empty or before.empty:
+            return None
+        gap_before = before['gap'].iloc[-1]
+        gap_now = gaps['gap'].iloc[-1]
+        if not np.isfinite(gap_before):
+            return None
+
+        return (gap_before - gap_now) / (self.window / 60)
+
+    def stalled(self, progress, elapsed):
+        """Whether the solve should be stopped with its incumbent."""
+        improvement = self.improvement(progress, elapsed)
+        if improvement is None:
+            return False
+        return improvement < self.min_improvement
+
+
+def stall_policy(param_opt):
+    """
+    Stall policy of the optimization parameters.
+
+    'stall_improvement' is the minimal improvement of the MIP gap in
+    percentage points per minute and 'stall_window' the minutes it is
+    measured over.
+
+    Returns
+    -------
+
+    StallPolicy
+        Policy or None if 'stall_improvement' is not set.
+    """
+    min_improvement = param_opt.get('stall_improvement')
+    if not min_improvement:
+        return None
+    window = param_opt.get('stall_window')
+    window = STALL_WINDOW if not window else window * 60
+
+    return StallPolicy(min_improvement, window=window)
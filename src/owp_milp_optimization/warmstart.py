@@ -0,0 +1,133 @@
+"""Initial solutions for warm starts of the MILP solvers."""
+
+import highspy
+import numpy as np
+from oemof.solph import processing
+from pyomo.core import Var
+
+from owp_milp_optimization.dispatch import merit_order_dispatch
+
+WARM_START_MODES = [None, 'heuristic', 'previous']
+
+
+def accepts_start(solver):
+    """Whether the given solver can be passed an initial solution."""
+    if solver == 'HiGHS':
+        # MIP starts require highspy >= 1.7
+        return hasattr(highspy.Highs, 'setSolution')
+    return solver in ['Gurobi', 'SCIP']
+
+
+def results_start(results):
+    """
+    Start values from the oemof results of a solved energy system.
+
+    Returns
+    -------
+
+    dict
+        Values of the variables by the labels of their oemof tuple and the
+        variable name. Sequences are given as arrays, scalars as floats.
+        Nodes are identified by their labels, so that the start values can
+        be applied to the model of another energy system with the same
+        units.
+    """
+    start = {}
+    for nodes, node_results in results.items():
+        key = tuple(None if n is None else n.label for n in nodes)
+        values = {
+            name: series.to_numpy(dtype=float)
+            for name, series in node_results['sequences'].items()
+            }
+        values.update({
+            name: float(value)
+            for name, value in node_results.get('scalars', {}).items()
+            })
+        start[key] = values
+
+    return start
+
+
+def heuristic_start(energy_system):
+    """
+    Start values from the merit-order dispatch of the heat producing units.
+
+    The start covers the heat flows, the input and electricity flows of the
+    converters, the on/off status of units with minimum load and the sizes
+    of invest units. Storages and grid exchange are left to the solver, which
+    completes the partial solution.
+    """
+    dispatch = merit_order_dispatch(energy_system)
+    heat_bus = 'heat network'
+
+    start = {}
+    for unit, unit_params in energy_system.param_units.items():
+        unit_cat = unit.rstrip('0123456789')
+        if unit not in dispatch.columns or unit_cat in ['sol', 'exhs']:
+            continue
+        heat = dispatch[unit].to_numpy()
+        flow = {'flow': heat, 'status': (heat > 0).astype(float)}
+        if unit_params['invest_mode']:
+            flow['invest'] = float(heat.max())
+        start[(unit, heat_bus)] = flow
+
+        if unit_cat in ['ccet', 'ice']:
+            start[('gas network', unit)] = {
+                'flow': heat / unit_params['eta_th']
+                }
+            start[(unit, 'chp node')] = {
+                'flow': heat * unit_params['eta_el'] / unit_params['eta_th']
+                }
+        elif unit_cat == 'gb':
+            start[('gas network', unit)] = {'flow': heat / unit_params['eta']}
+        elif unit_cat in ['hp', 'eb']:
+            eff = unit_params['cop' if unit_cat == 'hp' else 'eta']
+            start[('electricity network', unit)] = {'flow': heat / eff}
+
+    return start
+
+
+def apply_start(model, start):
+    """
+    Set start values as values of the variables of a pyomo model.
+
+    Fixed variables and variables without start value are left unchanged.
+
+    Returns
+    -------
+
+    int
+        Number of variables that received a start value.
+    """
+    applied = 0
+    for var in model.component_data_objects(Var):
+        if var.fixed:
+            continue
+        name = var.parent_component().local_name
+        pyomo_tuple = (None, name, var.index())
+        oemof_tuple = processing.get_tuple(pyomo_tuple)
+        if oemof_tuple is None or oemof_tuple is pyomo_tuple:
+            continue
+        timestep = processing.get_timestep(oemof_tuple)
+        oemof_tuple = processing.remove_timestep(oemof_tuple)
+        if name == 'flow':
+            oemof_tuple = processing.remove_timestep(oemof_tuple)
+
+        labels = tuple(n.label for n in oemof_tuple)
+        if len(labels) == 1:
+            labels += (None,)
+        values = start.get(labels)
+        if values is None or name not in values:
+            continue
+
+        value = values[name]
+        if isinstance(value, np.ndarray):
+            if timestep >= len(value):
+                continue
+            value = value[timestep]
+        if np.isnan(value):
+            continue
+        var.set_value(float(value), skip_validation=True)
+        applied += 1
+
+    return applied
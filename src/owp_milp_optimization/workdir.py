@@ -0,0 +1,200 @@
+"""Isolated scratch directories for solves and exports."""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Marker file of directories that are still in use
+ACTIVE_MARKER = '.active'
+
+# Environment variable overriding the directory returned by `user_cache_dir`
+CACHE_DIR_VARIABLE = 'OWP_CACHE_DIR'
+
+
+def user_cache_dir(*parts):
+    """
+    Directory for caches and scratch files of the current user.
+
+    The directory is taken from the environment variable `OWP_CACHE_DIR`.
+    Otherwise it is the platform's cache directory of the user (e.g.
+    `~/.cache/owp_milp_optimization` on Linux) or, if that can not be
+    created, a directory in the temporary directory of the system. The
+    package directory is never used, as it may not be writable.
+
+    Parameters
+    ----------
+
+    parts : str
+        Subdirectories appended to the cache directory.
+
+    Returns
+    -------
+
+    str
+        Absolute path, which is not created for `parts`.
+    """
+    path = os.environ.get(CACHE_DIR_VARIABLE)
+    if not path:
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA')
+        elif sys.platform == 'darwin':
+            base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+                os.path.expanduser('~'), '.cache'
+                )
+        path = os.path.join(base or '~', 'owp_milp_optimization')
+        try:
+            # The home directory may be unknown or not writable
+            if path.startswith('~'):
+                raise OSError('Home directory is unknown.')
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            path = os.path.join(
+                tempfile.gettempdir(), f'owp_milp_optimization_{_user()}'
+                )
+
+    return os.path.abspath(os.path.join(path, *parts))
+
+
+def _user():
+    try:
+        return os.getlogin()
+    except OSError:
+        return str(os.getuid()) if hasattr(os, 'getuid') else 'user'
+
+
+class WorkDirs():
+    """
+    Size and age bounded scratch directories on the local disk.
+
+    Every solve or export gets its own directory, so that concurrent runs do
+    not share any files. Directories are removed once they were not modified
+    for `max_age` seconds. If the total size exceeds `max_size`, the least
+    recently modified directories that are not in use are removed first.
+
+    Parameters
+    ----------
+
+    path : str
+        Parent directory. Defaults to `workdirs` in the cache directory of the
+        user (see `user_cache_dir`).
+
+    max_size : int
+        Maximum total size of all directories in bytes.
+
+    max_age : float
+        Time in seconds after which unmodified directories are removed.
+    """
+
+    def __init__(self, path=None, max_size=1024**3, max_age=24*3600):
+        if path is None:
+            path = user_cache_dir('workdirs')
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def create(self, prefix='run', active=False):
+        """
+        Create a new directory and return its path.
+
+        Parameters
+        ----------
+
+        prefix : str
+            Prefix of the directory name.
+
+        active : bool
+            Protect the directory from the size quota until `release` is
+            called.
+        """
+        self.cleanup()
+        os.makedirs(self.path, exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix=f'{prefix}_', dir=self.path)
+        if active:
+            open(os.path.join(workdir, ACTIVE_MARKER), 'w').close()
+
+        return workdir
+
+    def release(self, workdir):
+        """Allow the cleanup of a directory created as active."""
+        try:
+            os.remove(os.path.join(workdir, ACTIVE_MARKER))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def session(self, prefix='run', keep=False):
+        """
+        Directory that is protected from cleanup while it is in use.
+
+        Parameters
+        ----------
+
+        prefix : str
+            Prefix of the directory name.
+
+        keep : bool
+            Keep the directory after leaving the context, so that it is only
+            removed by the cleanup policy.
+        """
+        workdir = self.create(prefix, active=True)
+        try:
+            yield workdir
+        finally:
+            if keep:
+                self.release(workdir)
+            else:
+                self.remove(workdir)
+
+    def remove(self, workdir):
+        """Remove a directory created by `create`."""
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def cleanup(self):
+        """Remove expired directories and enforce the size quota."""
+        if not os.path.isdir(self.path):
+            return
+
+        now = time.time()
+        workdirs = []
+        for name in os.listdir(self.path):
+            workdir = os.path.join(self.path, name)
+            if not os.path.isdir(workdir):
+                continue
+            mtime, size, active = _scan(workdir)
+            # Active directories that were abandoned also expire
+            if now - mtime > self.max_age:
+                self.remove(workdir)
+                continue
+            workdirs += [(mtime, size, active, workdir)]
+
+        total_size = sum(size for _, size, _, _ in workdirs)
+        for _, size, active, workdir in sorted(workdirs):
+            if total_size <= self.max_size:
+                break
+            if active:
+                continue
+            self.remove(workdir)
+            total_size -= size
+
+
+def _scan(workdir):
+    # Latest modification time, total size and whether the directory is in use
+    mtime = os.stat(workdir).st_mtime
+    size = 0
+    active = False
+    for root, _, files in os.walk(workdir):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            mtime = max(mtime, stat.st_mtime)
+            size += stat.st_size
+            active = active or name == ACTIVE_MARKER
+
+    return mtime, size, active
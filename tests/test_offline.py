@@ -0,0 +1,83 @@
+"""Tests of the export of models and the import of external solutions."""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from owp_milp_optimization.database import INPUT_PATH
+from owp_milp_optimization.model import EnergySystem
+from owp_milp_optimization.offline import export_model, import_solution
+from owp_milp_optimization.racing import solve_highs
+from owp_milp_optimization.solverlog import read_solution
+
+
+@pytest.fixture
+def exported_model(tmp_path):
+    """Exported model of a day with a gas boiler and a storage."""
+    index = pd.date_range('2020-01-01', periods=24, freq='h')
+    hours = np.arange(len(index))
+    data = pd.DataFrame({
+        'heat_demand': 80 + 40 * np.sin(hours / 24 * 2 * np.pi),
+        'el_spot_price': 60.0, 'ef_om': 400.0, 'gas_price': 40.0,
+        'co2_price': 80.0, 'solar_heat_flow': 0.0
+        }, index=index)
+
+    with open(os.path.join(INPUT_PATH, 'param_units.json'), 'r') as file:
+        defaults = json.load(file)
+    with open(os.path.join(INPUT_PATH, 'param_opt.json'), 'r') as file:
+        param_opt = json.load(file)
+    param_units = {
+        'gb1': {**defaults['gb'], 'cap_N': 150}, 'tes1': defaults['tes']
+        }
+    param_opt.update({'Solver': 'HiGHS', 'lp_bound': False})
+
+    path = str(tmp_path / 'model')
+    modelpath = export_model(
+        EnergySystem(data, param_units, param_opt), path
+        )
+    return path, modelpath
+
+
+def write_scip_solution(solution_file, objective, values):
+    # Format of SCIP's `write solution` without 'write/printzeros'
+    with open(solution_file, 'w', encoding='utf-8') as file:
+        file.write('solution status: optimal solution found\n')
+        file.write(f'objective value: {objective:>30}\n')
+        for column, value in values.items():
+            if value != 0:
+                file.write(f'{column:<30} {value:>20} \t(obj:0)\n')
+
+
+def test_import_scip_solution_without_zeros(exported_model, tmp_path):
+    path, modelpath = exported_model
+    highs_file = str(tmp_path / 'highs.sol')
+    assert solve_highs(
+        modelpath, highs_file, str(tmp_path / 'highs.log'), 0
+        ) == 0
+    objective, values = read_solution(highs_file)
+    assert any(value == 0 for value in values.values())
+
+    scip_file = str(tmp_path / 'scip.sol')
+    write_scip_solution(scip_file, objective, values)
+
+    expected = import_solution(path, highs_file)
+    energy_system = import_solution(path, scip_file)
+
+    assert energy_system.objective == pytest.approx(objective)
+    pd.testing.assert_frame_equal(
+        energy_system.data_caps, expected.data_caps
+        )
+    assert energy_system.key_params['LCOH'] == pytest.approx(
+        expected.key_params['LCOH']
+        )
+
+
+def test_read_scip_solution_without_solution(tmp_path):
+    solution_file = str(tmp_path / 'scip.sol')
+    with open(solution_file, 'w', encoding='utf-8') as file:
+        file.write('solution status: infeasible\nno solution available\n')
+
+    assert read_solution(solution_file, ['x1', 'x2']) == (None, {})